@@ -0,0 +1,245 @@
+import asyncio
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import chatlog
+import metrics
+
+QUEUE_SIZE = 1024  # empfangene, noch nicht verarbeitete Datagramme
+BATCH = 64  # Datagramme pro Aufwachen des Loops und pro Auftrag an den Executor
+MAX_DATAGRAM = 65535
+
+log = chatlog.get("aio_chat")
+
+
+class TransportSocket:
+    """
+    Stands in for chat.sock: sendto() goes through the asyncio transport, also
+    when called from the executor thread.
+    """
+
+    def __init__(self, loop, transport):
+        self.loop = loop
+        self.transport = transport
+        self.loop_thread = threading.get_ident()
+
+    def sendto(self, data, addr):
+        if threading.get_ident() == self.loop_thread:
+            self.transport.sendto(data, addr)
+        else:
+            self.loop.call_soon_threadsafe(self.transport.sendto, data, addr)
+
+
+class ChatProtocol(asyncio.DatagramProtocol):
+    def __init__(self, engine):
+        self.engine = engine
+
+    def datagram_received(self, data, addr):
+        self.engine.received(data, addr)
+        self.engine.drain()
+
+    def error_received(self, exc):
+        log.warning("Error receiving packet: %s", exc)
+
+
+class AsyncEngine:
+    """
+    Runs a chat on one asyncio event loop instead of its listen and broadcast
+    threads. asyncio reads one datagram per wake-up of the loop, so the
+    protocol callback reads up to BATCH more that are already waiting.
+    Without `blocking` every datagram is handled right in the callback; while it runs the loop reads nothing, so a backlog waits
+    in the kernel buffer. With `blocking=True` handlers run on a single
+    executor thread (git calls), so the loop keeps receiving while they work:
+    datagrams go into a bounded queue and are handed to the executor in
+    batches of up to BATCH. When the queue is full the transport stops reading
+    until it has drained to half. `timers` (background fetch, pruning and
+    gc) run on a second executor thread, so they never hold up packets.
+    """
+
+    def __init__(self, chat, handler, tick, interval, on_input,
+                 blocking=False, queue_size=QUEUE_SIZE, on_close=None, on_start=None, timers=()):
+        self.chat = chat
+        self.handler = handler
+        self.tick = tick
+        self.interval = interval
+        self.timers = list(timers)  # weitere (Intervall, Funktion), z.B. Hintergrund-Fetch
+        self.on_input = on_input
+        self.blocking = blocking
+        self.queue_size = queue_size
+        self.on_close = on_close
+        self.on_start = on_start  # nach dem Anbinden des Sockets, z.B. hello an die Peers
+        self.executor = ThreadPoolExecutor(max_workers=1) if blocking else None
+        self.maintenance = ThreadPoolExecutor(max_workers=1) if blocking else None
+        self.received = self.enqueue if blocking else self.handle
+        self.loop = None
+        self.queue = None
+        self.transport = None
+        self.paused = False
+        self.handled = 0
+        self.dropped = 0
+        self.tasks = []
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.loop = loop
+        self.queue = asyncio.Queue(self.queue_size)
+        self.sock = self.chat.sock
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: ChatProtocol(self), sock=self.chat.sock)
+        self.chat.sock = TransportSocket(loop, self.transport)
+        self.tasks = [asyncio.create_task(self.timer(self.interval, self.tick, self.executor))]
+        if self.blocking:
+            self.tasks.append(asyncio.create_task(self.receive_loop()))
+        for interval, fn in self.timers:
+            self.tasks.append(asyncio.create_task(self.timer(interval, fn, self.maintenance)))
+        if self.on_start is not None:
+            await self.call(self.on_start)
+
+    def drain(self):
+        recvfrom = self.sock.recvfrom
+        received = self.received
+        for _ in range(BATCH):
+            if self.paused:
+                return
+            try:
+                data, addr = recvfrom(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                log.warning("Error receiving packet: %s", e)
+                return
+            received(data, addr)
+
+    def enqueue(self, data, addr):
+        metrics.PACKETS_RECEIVED.inc()
+        metrics.BYTES_RECEIVED.inc(len(data))
+        try:
+            self.queue.put_nowait((data, addr))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            metrics.PACKETS_DROPPED.inc(1, "queue_full")
+            return
+        if self.queue.full() and not self.paused:
+            self.transport.pause_reading()
+            self.paused = True
+
+    def handle(self, data, addr):
+        metrics.PACKETS_RECEIVED.inc()
+        metrics.BYTES_RECEIVED.inc(len(data))
+        try:
+            for message in self.chat.reassembler.feed(data, addr):
+                self.handler(message, addr)
+            self.handled += 1
+        except Exception as e:
+            metrics.RECEIVE_ERRORS.inc()
+            log.warning("Error receiving packet: %s", e)
+
+    def handle_batch(self, batch):
+        for data, addr in batch:
+            try:
+                for message in self.chat.reassembler.feed(data, addr):
+                    self.handler(message, addr)
+                self.handled += 1
+            except Exception as e:
+                metrics.RECEIVE_ERRORS.inc()
+                log.warning("Error receiving packet: %s", e)
+
+    async def receive_loop(self):
+        loop = asyncio.get_running_loop()
+        queue = self.queue
+        while True:
+            batch = [await queue.get()]
+            # Was inzwischen angekommen ist, geht im selben Executor-Auftrag mit
+            while len(batch) < BATCH and not queue.empty():
+                batch.append(queue.get_nowait())
+            if self.paused and queue.qsize() <= self.queue_size // 2:
+                self.transport.resume_reading()
+                self.paused = False
+            await loop.run_in_executor(self.executor, self.handle_batch, batch)
+
+    async def call(self, fn, *args):
+        if self.blocking:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        return fn(*args)
+
+    async def timer(self, interval, fn, executor=None):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if executor is not None:
+                    await loop.run_in_executor(executor, fn)
+                else:
+                    fn()
+            except Exception as e:
+                log.warning("Error in timer: %s", e)
+
+    async def input_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                return
+            await self.call(self.on_input, line.rstrip("\n"))
+
+    async def main(self, interactive=True):
+        await self.start()
+        try:
+            if interactive:
+                await self.input_loop()
+            else:
+                await asyncio.gather(*self.tasks)
+        except asyncio.CancelledError:
+            pass  # shutdown()
+        finally:
+            self.stop()
+
+    def shutdown(self):
+        """
+        Stop a non-interactive engine from another thread.
+        """
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(lambda: [task.cancel() for task in self.tasks])
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.transport is not None:
+            self.transport.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.maintenance.shutdown(wait=True)
+
+    def run(self, interactive=True):
+        try:
+            asyncio.run(self.main(interactive))
+        except KeyboardInterrupt:
+            print("\nExiting...")
+        finally:
+            self.chat.running = False
+            if self.on_close is not None:
+                self.on_close()
+
+
+def frontier_engine(chat, interval, **kwargs):
+    """
+    Engine for FrontierChat (task1.py/task2.py): ENTER increments the own count.
+    """
+    return AsyncEngine(chat, chat.handle, chat.broadcast, interval,
+                       lambda line: chat.increment_own_count(), **kwargs)
+
+
+def git_engine(chat, interval=10, **kwargs):
+    """
+    Engine for GitbasedChat (task3.py): git work runs on the executor thread,
+    background fetch and pruning/gc on the maintenance thread.
+    """
+    def post(line):
+        if line.strip():
+            chat.post_message(line)
+    timers = [(chat.fetch_interval, chat.sync_refs)] if chat.fetch_interval else []
+    if chat.retention.policy:
+        timers.append((chat.gc_interval, chat.retention.run_once))
+    return AsyncEngine(chat, chat.handle_message, chat.broadcast, interval, post,
+                       blocking=True, on_close=chat.close, on_start=chat.hello, timers=timers, **kwargs)
@@ -0,0 +1,110 @@
+"""
+Flood one FrontierChat node from many local sender processes.
+
+Compares the thread engine (listen thread) with the asyncio engine (aio_chat.py)
+and reports datagrams handled per second and datagrams lost (kernel buffer or
+receive queue).
+
+Usage: python -m benchmarks.bench_aio [senders] [datagrams per sender]
+"""
+import contextlib
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+from aio_chat import frontier_engine
+from task1 import FrontierChat
+from wire import Packer
+
+PORT = 47123
+RCVBUF = 4 * 1024 * 1024  # großer Kernelpuffer, damit die Verarbeitung gemessen wird und nicht nur der Puffer
+
+
+def flood(index, count, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    packer = Packer()
+    for i in range(count):
+        record = {"type": "delta", "state": {f"sender{index:03d}": i + 1}}
+        for datagram in packer.pack([record]):
+            sock.sendto(datagram, ("127.0.0.1", port))
+
+
+class Counter:
+    """
+    Wraps chat.handle and records how many messages were handled and when.
+    """
+
+    def __init__(self, chat):
+        self.handle = chat.handle
+        self.count = 0
+        self.first = None
+        self.last = None
+        chat.handle = self
+
+    def __call__(self, message, addr):
+        self.handle(message, addr)
+        self.last = time.perf_counter()
+        if self.first is None:
+            self.first = self.last
+        self.count += 1
+
+    def wait_idle(self):
+        last = -1
+        while self.count != last:
+            last = self.count
+            time.sleep(0.5)
+
+    def rate(self):
+        return self.count / max(self.last - self.first, 1e-9) if self.count else 0.0
+
+
+def run_flood(senders, count, port):
+    procs = [multiprocessing.Process(target=flood, args=(i, count, port)) for i in range(senders)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+
+
+def bench_threads(senders, count, port):
+    chat = FrontierChat("node", port, "127.0.0.1", 3600, start=False)
+    chat.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+    counter = Counter(chat)
+    threading.Thread(target=chat.listen, daemon=True).start()
+    run_flood(senders, count, port)
+    counter.wait_idle()
+    chat.running = False
+    return counter, 0
+
+
+def bench_asyncio(senders, count, port):
+    chat = FrontierChat("node", port, "127.0.0.1", 3600, start=False)
+    chat.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+    counter = Counter(chat)
+    engine = frontier_engine(chat, 3600)
+    threading.Thread(target=engine.run, kwargs={"interactive": False}, daemon=True).start()
+    time.sleep(0.2)
+    run_flood(senders, count, port)
+    counter.wait_idle()
+    return counter, engine.dropped
+
+
+def main():
+    senders = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    sent = senders * count
+
+    print(f"{senders} senders x {count} datagrams = {sent}")
+    print(f"{'engine':<8} {'handled':>9} {'handled/s':>10} {'lost':>8} {'queue drops':>12}")
+    for offset, (name, bench) in enumerate([("threads", bench_threads), ("asyncio", bench_asyncio)]):
+        # Zustandsausgabe pro Paket würde die Messung dominieren
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            counter, dropped = bench(senders, count, PORT + offset)
+        print(f"{name:<8} {counter.count:>9} {counter.rate():>10.0f} {sent - counter.count:>8} {dropped:>12}")
+
+
+if __name__ == "__main__":
+    main()
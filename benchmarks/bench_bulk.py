@@ -0,0 +1,80 @@
+"""
+Time-to-sync of a fresh GitbasedChat node that is missing many commits.
+
+  udp   windowed UDP catch-up (catchup.py) on the virtual network of
+        benchmarks/simulate.py without loss, as in bench_catchup.py
+  bulk  one packfile over a localhost TCP stream (bulk.py): git pack-objects
+        on the sender, git index-pack, indexing and one ref update on the
+        receiver
+
+Both start when the serving node learns the fresh node's frontier and end when
+the fresh node's frontier has every commit.
+
+Usage: python -m benchmarks.bench_bulk [commits] [interval]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import bench_catchup
+
+TIMEOUT = 600
+
+
+def bulk(commits):
+    import task3
+    server = task3.GitbasedChat("server", True, start=False, headless=True, fetch_interval=None, bulk_threshold=1)
+    client = task3.GitbasedChat("client", True, start=False, headless=True, fetch_interval=None, bulk_threshold=1)
+    repo = server.repo
+    parent = repo.refs()["refs/heads/server"]
+    for i in range(commits):
+        sha = repo.create_commit([parent], f"history {i}", "server", bench_catchup.TIMESTAMP)
+        server.index.add(sha, "server", [parent])
+        parent = sha
+    repo.update_ref("refs/heads/server", parent)
+    target = commits + 1
+
+    # UDP-Records direkt zustellen; das Packfile geht über echtes TCP auf localhost
+    server.send = lambda records, addr: [client.handle_message(r, ("127.0.0.1", 6969)) for r in records]
+    start = time.time()
+    request = {"type": "frontier", "from": "client", "frontier": client.get_frontier_local(), "bulk": True}
+    server.handle_message(request, ("127.0.0.1", 6969))
+    done = None
+    while time.time() - start < TIMEOUT:
+        if client.get_frontier_local().get("server", 0) >= target:
+            done = time.time() - start
+            break
+        time.sleep(0.01)
+    stats = server.bulk.stats()
+    server.close()
+    client.close()
+    return done, stats
+
+
+def main():
+    commits = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+    cwd = os.getcwd()
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        sys.stdout = open(os.devnull, "w")
+        try:
+            udp, _, _ = bench_catchup.run("windowed", commits, 0.0, interval)
+            os.chdir(workdir)
+            packed, stats = bulk(commits)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+            os.chdir(cwd)
+
+    print(f"{commits} missing commits, pack {stats['bytes']} bytes")
+    print(f"{'path':<6} {'seconds':>8}")
+    for path, done in (("udp", udp), ("bulk", packed)):
+        print(f"{path:<6} {f'{done:.2f}' if done is not None else 'timeout':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Catch-up of a fresh GitbasedChat node from a peer with a long history.
+
+Modes:
+  inline   missing commits built and sent by the listener thread (old handle_message)
+  pool     catchup.CatchupServer workers, no acks (peer without acks support)
+  windowed CatchupServer with acks and retransmission
+
+Runs on the virtual network of benchmarks/simulate.py. Reports the time until the
+fresh node has the whole history, in seconds and broadcast intervals, and the
+longest time the serving node's listener was busy with one message.
+
+Usage: python -m benchmarks.bench_catchup [commits] [loss] [interval]
+"""
+import os
+import queue
+import sys
+import tempfile
+import time
+
+from benchmarks.simulate import Impairment, Link, NodeRunner, Scheduler, SimNode
+
+TIMESTAMP = "1715058000 +0000"
+TIMEOUT = 120
+
+
+def seed(node, commits):
+    chat = node.chat
+    parent = chat.repo.refs()[f"refs/heads/{node.name}"]
+    for i in range(commits):
+        sha = chat.repo.create_commit([parent], f"history {i}", node.name, TIMESTAMP)
+        chat.index.add(sha, node.name, [parent])
+        parent = sha
+    chat.repo.update_ref(f"refs/heads/{node.name}", parent)
+
+
+def inline(chat):
+    # Verhalten vor catchup.py: alles sofort im aufrufenden Thread senden
+    def request(addr, hashes, windowed=False):
+        chat.send([chat.create_commit_packet(sha) for sha in hashes], addr)
+    chat.catchup.request = request
+
+
+def run(mode, commits, loss, interval):
+    scheduler = Scheduler()
+    scheduler.start()
+    addrs = [("10.0.0.1", 6969), ("10.0.0.2", 6969)]
+    inboxes = {addr: queue.Queue() for addr in addrs}
+
+    def deliver(data, src, dst):
+        inboxes[dst].put((data, src))
+
+    def take(inbox):
+        try:
+            return inbox.get(timeout=0.2)
+        except queue.Empty:
+            return None
+
+    nodes = []
+    for i, addr in enumerate(addrs):
+        node = SimNode("task3", f"node{i:03d}", "digest", 1400)
+        node.attach(Link(addr, addrs, Impairment(loss, 0.0005, seed=i), scheduler, deliver))
+        nodes.append(node)
+    server, client = nodes
+    seed(server, commits)
+    if mode == "inline":
+        inline(server.chat)
+    client.chat.request_acks = mode == "windowed"
+    runners = [NodeRunner(node, [], interval, lambda inbox=inboxes[addr]: take(inbox))
+               for node, addr in zip(nodes, addrs)]
+    start = time.time()
+    for runner in runners:
+        runner.start(start)
+    server.tick()  # der neue Knoten hört den ersten Broadcast sofort
+    target = commits + 1
+    done = None
+    while time.time() - start < TIMEOUT:
+        time.sleep(0.05)
+        if client.view().get(server.name, 0) >= target:
+            done = time.time() - start
+            break
+    for runner in runners:
+        runner.stop()
+    scheduler.stop()
+    listener_max = server.timings["handle_message"][2]
+    stats = server.chat.catchup.stats()
+    for node in nodes:
+        node.close()
+    return done, listener_max, stats
+
+
+def main():
+    commits = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    loss = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    interval = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+
+    cwd = os.getcwd()
+    stdout = sys.stdout
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in ("inline", "pool", "windowed"):
+            os.chdir(workdir)
+            sys.stdout = open(os.devnull, "w")
+            try:
+                results.append((mode, *run(mode, commits, loss, interval)))
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+                os.chdir(cwd)
+
+    print(f"{commits} commits to catch up, loss {loss}, broadcast interval {interval}s")
+    print(f"{'mode':<10} {'seconds':>8} {'intervals':>10} {'max listener ms':>16} {'resent':>7}")
+    for mode, done, listener_max, stats in results:
+        seconds = f"{done:.2f}" if done is not None else "timeout"
+        intervals = f"{done / interval:.1f}" if done is not None else "-"
+        print(f"{mode:<10} {seconds:>8} {intervals:>10} {listener_max * 1000:>16.1f} {stats['resent']:>7}")
+
+
+if __name__ == "__main__":
+    main()
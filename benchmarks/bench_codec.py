@@ -0,0 +1,49 @@
+"""
+Encode/decode throughput and size of JSON versus the binary codec.
+
+Usage: python -m benchmarks.bench_codec
+"""
+import json
+import time
+
+import codec
+from benchmarks.bench_wire import commit_records
+
+
+def frontier(peers):
+    # 16-Zeichen-Namen wie im schlimmsten Fall erlaubt
+    counts = {f"peer{i:012d}": 1000 + i for i in range(peers)}
+    return {"type": "frontier", "from": "peer000000000000", "frontier": counts}
+
+
+def throughput(fn, seconds=0.3):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def report(label, records):
+    as_json = [json.dumps(r).encode("utf-8") for r in records]
+    as_binary = codec.encode_packet(records)
+    json_size = sum(len(d) for d in as_json)
+    enc_json = throughput(lambda: [json.dumps(r).encode("utf-8") for r in records])
+    dec_json = throughput(lambda: [json.loads(d) for d in as_json])
+    enc_bin = throughput(lambda: codec.encode_packet(records))
+    dec_bin = throughput(lambda: codec.decode_packet(as_binary))
+    print(f"{label:<22} {json_size:>10} {len(as_binary):>10} "
+          f"{enc_json:>10.0f} {enc_bin:>10.0f} {dec_json:>10.0f} {dec_bin:>10.0f}")
+
+
+def main():
+    print(f"{'payload':<22} {'json B':>10} {'binary B':>10} "
+          f"{'json enc/s':>10} {'bin enc/s':>10} {'json dec/s':>10} {'bin dec/s':>10}")
+    for peers in (10, 100, 1000):
+        report(f"frontier {peers} peers", [frontier(peers)])
+    report("100 commit packets", commit_records(100))
+
+
+if __name__ == "__main__":
+    main()
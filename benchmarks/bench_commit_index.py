@@ -0,0 +1,62 @@
+"""
+Frontier computation with `git rev-list --count` per branch versus the commit index.
+
+Usage: python -m benchmarks.bench_commit_index [commits] [branches]
+"""
+import os
+import sys
+import time
+
+from benchmarks.bench_gitstore import ingest
+from commit_index import CommitIndex
+from gitstore import open_backend
+
+
+def timed(fn, rounds=5):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return (time.perf_counter() - start) / rounds, result
+
+
+def main():
+    commits = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    branches = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    tmp, _, _ = ingest("batch", commits, branches)
+    subprocess_repo = open_backend("subprocess", cwd=tmp.name)
+    batch_repo = open_backend("batch", cwd=tmp.name)
+
+    def rev_list():
+        refs = subprocess_repo.refs()
+        return {ref: subprocess_repo.count(ref) for ref in refs}
+
+    start = time.perf_counter()
+    index = CommitIndex(batch_repo)
+    cold = time.perf_counter() - start
+    index.close()
+
+    start = time.perf_counter()
+    index = CommitIndex(batch_repo)
+    warm = time.perf_counter() - start
+
+    def indexed():
+        return {ref: index.seq(sha) for ref, sha in batch_repo.refs().items()}
+
+    revlist_latency, _ = timed(rev_list)
+    index_latency, _ = timed(indexed)
+
+    print(f"{commits} commits over {branches} branches")
+    print(f"rev-list --count frontier: {revlist_latency * 1000:8.2f} ms")
+    print(f"commit index frontier:     {index_latency * 1000:8.2f} ms")
+    print(f"index build (cold start):  {cold * 1000:8.2f} ms")
+    print(f"index load (restart):      {warm * 1000:8.2f} ms")
+    print(f"index size:                {os.path.getsize(index.path)} bytes")
+
+    index.close()
+    batch_repo.close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Frontier merge: dict loop (old FrontierChat.merge) versus frontier.Frontier.
+
+A full state from a peer is merged into the local one, as in --gossip full.
+"repeat" scenarios follow an earlier full state from the same sender (the
+normal case, Frontier compares against it); "first" is the first full state
+from that sender in a different user order. "deltas" merges many small
+deltas (16 entries, one of which grew) as in the default digest gossip.
+
+Usage: python -m benchmarks.bench_frontier [peers ...]
+"""
+import random
+import sys
+import time
+
+from frontier import Frontier
+
+SOURCE = ("10.0.0.2", 9999)
+REPEAT = 3
+
+
+def dict_merge(state, incoming, source=None):
+    # FrontierChat.merge vor frontier.py
+    changed = {}
+    for user, count in incoming.items():
+        if user not in state or state[user] < count:
+            state[user] = count
+            changed[user] = count
+    return changed
+
+
+def scenarios(peers):
+    base = {f"peer{i:06d}": i % 1000 for i in range(peers)}
+    grown = {u: c + 1 if i % 100 == 0 else c for i, (u, c) in enumerate(base.items())}
+    shuffled = list(grown.items())
+    random.Random(1).shuffle(shuffled)
+    yield "repeat, unchanged", base, base, dict(base)
+    yield "repeat, 1% grew", base, base, grown
+    yield "repeat, all grew", base, base, {u: c + 1 for u, c in base.items()}
+    yield "first, 1% grew", base, None, dict(shuffled)
+
+
+def rate(make, merge, base, previous, incoming, rounds):
+    states = []
+    for _ in range(rounds):
+        state = make(base)
+        if previous is not None:
+            merge(state, previous, SOURCE)  # früherer Zustand desselben Senders
+        states.append(state)
+    start = time.perf_counter()
+    for state in states:
+        merge(state, incoming, SOURCE)
+    elapsed = time.perf_counter() - start
+    return len(incoming) * rounds / elapsed
+
+
+def delta_rate(make, merge, base, deltas):
+    state = make(base)
+    start = time.perf_counter()
+    for delta in deltas:
+        merge(state, delta, SOURCE)
+    elapsed = time.perf_counter() - start
+    return sum(map(len, deltas)) / elapsed
+
+
+def make_deltas(base, count=20000, size=16):
+    rng = random.Random(2)
+    users = list(base)
+    deltas = []
+    for _ in range(count):
+        delta = {user: base[user] for user in rng.sample(users, size)}
+        grown = next(iter(delta))
+        delta[grown] += 1
+        deltas.append(delta)
+    return deltas
+
+
+def frontier(state):
+    # Ohne --idle: keine Zeiten, wie in den Chats
+    return Frontier(state, track=False)
+
+
+def best(measure, *args):
+    # Beste von REPEAT Messungen, gegen Störungen auf ausgelasteten Maschinen
+    return max(measure(*args) for _ in range(REPEAT))
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000]
+    print(f"{'peers':>7} {'scenario':<18} {'dict entries/s':>15} {'Frontier entries/s':>19} {'speedup':>8}")
+    for peers in sizes:
+        rounds = max(3, 300_000 // peers)
+        for name, base, previous, incoming in scenarios(peers):
+            old = best(rate, dict, dict_merge, base, previous, incoming, rounds)
+            new = best(rate, frontier, Frontier.merge, base, previous, incoming, rounds)
+            print(f"{peers:>7} {name:<18} {old:>15,.0f} {new:>19,.0f} {new / old:>7.1f}x")
+        base = dict(next(scenarios(peers))[1])
+        deltas = make_deltas(base)
+        old = best(delta_rate, dict, dict_merge, base, deltas)
+        new = best(delta_rate, frontier, Frontier.merge, base, deltas)
+        print(f"{peers:>7} {'deltas':<18} {old:>15,.0f} {new:>19,.0f} {new / old:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Frontier persistence: one file per peer (old save_state) versus FrontierStore.
+
+Each event raises the count of one random peer and persists the frontier, as
+merge/increment_own_count do.
+
+Usage: python -m benchmarks.bench_frontier_store [peers] [events]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from frontier_store import FrontierStore
+
+
+def legacy_save(path, state):
+    # Verhalten von task2.FrontierChat.save_state vor dem FrontierStore
+    os.makedirs(path, exist_ok=True)
+    for peer, count in state.items():
+        with open(os.path.join(path, f"{peer}.txt"), "w") as f:
+            f.write(str(count))
+
+
+def legacy_load(path):
+    state = {}
+    for fname in os.listdir(path):
+        with open(os.path.join(path, fname), "r") as f:
+            state[fname.replace(".txt", "")] = int(f.read().strip())
+    return state
+
+
+def events(peers, count, seed=1):
+    rng = random.Random(seed)
+    names = [f"peer{i:04d}" for i in range(peers)]
+    state = dict.fromkeys(names, 0)
+    for _ in range(count):
+        peer = rng.choice(names)
+        state[peer] += 1
+        yield state, {peer: state[peer]}
+
+
+def bench_legacy(peers, count):
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        for state, _ in events(peers, count):
+            legacy_save(tmp, state)
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        legacy_load(tmp)
+        return elapsed, time.perf_counter() - start
+
+
+def bench_store(peers, count, group_commit, fsync):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FrontierStore(tmp, group_commit=group_commit, fsync=fsync)
+        store.load()
+        start = time.perf_counter()
+        for _, changed in events(peers, count):
+            store.update(changed)
+        store.close()
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        FrontierStore(tmp).load()
+        return elapsed, time.perf_counter() - start
+
+
+def main():
+    peers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    print(f"{peers} peers, {count} update events")
+    print(f"{'layout':<34} {'events/s':>10} {'recovery ms':>12}")
+    cases = [
+        ("per-peer .txt files (no fsync)", lambda: bench_legacy(peers, count)),
+        ("FrontierStore, fsync per update", lambda: bench_store(peers, count, 0, True)),
+        ("FrontierStore, group commit 50 ms", lambda: bench_store(peers, count, 0.05, True)),
+        ("FrontierStore, no fsync", lambda: bench_store(peers, count, 0, False)),
+    ]
+    for label, fn in cases:
+        elapsed, recovery = fn()
+        print(f"{label:<34} {count / elapsed:>10.0f} {recovery * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare the per-call subprocess backend with the persistent-pipe backend.
+
+Usage: python -m benchmarks.bench_gitstore [commits] [branches]
+"""
+import sys
+import tempfile
+import time
+
+from gitstore import BACKENDS, open_backend
+from utils import run
+
+TIMESTAMP = "1715058000 +0000"
+
+
+def fresh_repo():
+    tmp = tempfile.TemporaryDirectory()
+    run(["git", "init", "-q", "-b", "bench"], cwd=tmp.name)
+    return tmp
+
+
+def ingest(kind, commits, authors):
+    tmp = fresh_repo()
+    repo = open_backend(kind, cwd=tmp.name)
+    tips = {}
+    start = time.perf_counter()
+    for i in range(commits):
+        author = f"user{i % authors}"
+        parents = list(tips.values())
+        sha = repo.create_commit(parents, f"message {i}", author, TIMESTAMP)
+        repo.update_ref(f"refs/heads/{author}", sha)
+        tips[author] = sha
+    elapsed = time.perf_counter() - start
+    spawned = repo.spawned
+    repo.close()
+    return tmp, commits / elapsed, spawned
+
+
+def frontier(repo):
+    # Frontier-Berechnung wie vor dem Commit-Index: ein Zähl-Walk pro Branch
+    return {ref.split("/")[-1]: repo.count(sha) for ref, sha in repo.refs().items()}
+
+
+def frontier_latency(kind, cwd, rounds=5):
+    repo = open_backend(kind, cwd=cwd)
+    frontier(repo)  # Warm-up (Prozesse starten)
+    before = repo.spawned
+    start = time.perf_counter()
+    for _ in range(rounds):
+        frontier(repo)
+    elapsed = (time.perf_counter() - start) / rounds
+    spawned = (repo.spawned - before) / rounds
+    repo.close()
+    return elapsed, spawned
+
+
+def main():
+    commits = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    branches = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    print(f"{commits} commits over {branches} branches")
+    print(f"{'backend':<12} {'commits/s':>10} {'git procs':>10} {'frontier ms':>12} {'procs/frontier':>15}")
+    for kind in BACKENDS:
+        tmp, rate, spawned = ingest(kind, commits, branches)
+        latency, per_frontier = frontier_latency(kind, tmp.name)
+        print(f"{kind:<12} {rate:>10.0f} {spawned:>10} {latency * 1000:>12.2f} {per_frontier:>15.1f}")
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
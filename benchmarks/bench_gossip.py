@@ -0,0 +1,140 @@
+"""
+Discrete-event simulation of frontier gossip: full-state broadcast versus digest/delta.
+
+Nodes follow the FrontierChat protocol from task1.py/task2.py (broadcast every
+interval; in digest mode: digest per tick, delta replies for differing buckets,
+immediate delta on increment). Packets are sized with the real wire.Packer.
+
+Usage: python -m benchmarks.bench_gossip [peers] [messages] [loss]
+"""
+import heapq
+import random
+import sys
+
+from gossip import differing_buckets, digest, newer_entries, select
+from wire import Packer
+
+INTERVAL = 10.0
+LATENCY = 0.002
+BROADCAST = None
+
+
+class Network:
+    def __init__(self, loss, seed):
+        self.rng = random.Random(seed)
+        self.loss = loss
+        self.packer = Packer(1400)
+        self.events = []
+        self.seq = 0
+        self.nodes = {}
+        self.bytes = 0
+        self.datagrams = 0
+
+    def schedule(self, when, action):
+        heapq.heappush(self.events, (when, self.seq, action))
+        self.seq += 1
+
+    def send(self, now, src, dst, records):
+        datagrams = self.packer.pack(records)
+        targets = [n for n in self.nodes if n != src] if dst is BROADCAST else [dst]
+        # Broadcast zählt einmal auf dem Draht
+        self.bytes += sum(len(d) for d in datagrams)
+        self.datagrams += len(datagrams)
+        for target in targets:
+            if any(self.rng.random() < self.loss for _ in datagrams):
+                continue
+            node = self.nodes[target]
+            delay = LATENCY * (1 + self.rng.random())
+            self.schedule(now + delay, lambda t, n=node, r=records: n.receive(t, r, src))
+
+
+class Node:
+    def __init__(self, name, mode, net):
+        self.name = name
+        self.mode = mode
+        self.net = net
+        self.state = {name: 0}
+        net.nodes[name] = self
+
+    def tick(self, now):
+        record = digest(self.state) if self.mode == "digest" else dict(self.state)
+        self.net.send(now, self.name, BROADCAST, [record])
+        self.net.schedule(now + INTERVAL, self.tick)
+
+    def increment(self, now):
+        self.state[self.name] += 1
+        if self.mode == "digest":
+            self.net.send(now, self.name, BROADCAST, [{"type": "delta", "state": {self.name: self.state[self.name]}}])
+
+    def merge(self, incoming):
+        for user, count in incoming.items():
+            if self.state.get(user, -1) < count:
+                self.state[user] = count
+
+    def receive(self, now, records, src):
+        for message in records:
+            kind = message.get("type")
+            if kind == "digest":
+                buckets = differing_buckets(self.state, message)
+                if buckets:
+                    delta = {"type": "delta", "state": select(self.state, buckets), "buckets": buckets}
+                    self.net.send(now, self.name, src, [delta])
+            elif kind == "delta":
+                self.merge(message["state"])
+                newer = newer_entries(self.state, message["state"], message.get("buckets"))
+                if newer:
+                    self.net.send(now, self.name, src, [{"type": "delta", "state": newer}])
+            else:
+                self.merge(message)
+
+
+def simulate(mode, peers, messages, loss, seed=1, horizon=120.0):
+    net = Network(loss, seed)
+    rng = random.Random(seed)
+    nodes = [Node(f"peer{i:04d}", mode, net) for i in range(peers)]
+    for node in nodes:
+        net.schedule(rng.random() * INTERVAL, node.tick)
+    # Erst einschwingen lassen, dann Nachrichten innerhalb von 5 s verschicken
+    burst = 3 * INTERVAL
+    for _ in range(messages):
+        net.schedule(burst + rng.random() * 5, rng.choice(nodes).increment)
+
+    target = None
+    converged = None
+    steady_start = None
+    steady_bytes = 0
+    while net.events:
+        now, _, action = heapq.heappop(net.events)
+        if now > horizon:
+            break
+        if now >= burst and steady_start is None:
+            steady_start = net.bytes
+            target = None
+        action(now)
+        if now >= burst + 5 and converged is None:
+            if target is None:
+                target = {n.name: n.state[n.name] for n in nodes}
+            if all(n.state == target for n in nodes):
+                converged = now - burst
+                steady_bytes = net.bytes
+        if converged is not None and now >= burst + converged + 3 * INTERVAL:
+            break
+    steady = (net.bytes - steady_bytes) / 3 if converged is not None else float("nan")
+    return converged, net.bytes, steady
+
+
+def main():
+    peers = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    loss = float(sys.argv[3]) if len(sys.argv) > 3 else 0.01
+
+    print(f"{peers} peers, {messages} messages in 5 s, {loss:.0%} loss, interval {INTERVAL:.0f} s")
+    print(f"{'mode':<8} {'converged s':>12} {'total kB':>10} {'steady B/interval':>18}")
+    for mode in ("full", "digest"):
+        converged, total, steady = simulate(mode, peers, messages, loss)
+        shown = f"{converged:.2f}" if converged is not None else "no"
+        print(f"{mode:<8} {shown:>12} {total / 1024:>10.0f} {steady:>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
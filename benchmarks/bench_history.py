@@ -0,0 +1,123 @@
+"""
+Message history queries (history.py) on a large synthetic history.
+
+Appends `messages` messages (random words from a Zipf-like vocabulary,
+`authors` authors, one minute apart) to a HistoryIndex in a temp directory,
+reopens it, and times pages of 20 results for typical queries against a full
+scan of the history file, which is what `git log --all` piped into a filter
+amounts to (without git's own cost of walking and formatting the commits).
+
+Usage: python -m benchmarks.bench_history [messages] [authors]
+"""
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from history import HistoryIndex, tokens
+
+START = 1715058000
+VOCABULARY = 20000
+
+
+def build(history, messages, authors, seed=1):
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(VOCABULARY)]
+    weights = [1 / (i + 1) for i in range(VOCABULARY)]
+    names = [f"user{i:03d}" for i in range(authors)]
+    batch = 10000
+    for first in range(0, messages, batch):
+        count = min(batch, messages - first)
+        text = rng.choices(words, weights, k=8 * count)
+        for i in range(count):
+            n = first + i
+            sha = hashlib.sha1(str(n).encode()).hexdigest()
+            message = " ".join(text[8 * i:8 * i + 8])
+            history.add(sha, names[n % authors], f"{START + 60 * n} +0000", message, [])
+
+
+def scan(path, author=None, words=(), since=None, until=None, before=None, limit=20):
+    # Alles lesen und filtern, neueste zuerst
+    matches = []
+    wanted = set(words)
+    with open(path, encoding="utf-8") as f:
+        for row, line in enumerate(f):
+            if before is not None and row >= before:
+                break
+            sha, name, epoch, message = line.split(" ", 3)
+            message = json.loads(message)
+            if author is not None and name != author:
+                continue
+            if since is not None and int(epoch) < since:
+                continue
+            if until is not None and int(epoch) > until:
+                continue
+            if wanted and not wanted <= tokens(message):
+                continue
+            matches.append(message)
+    return matches[::-1][:limit]
+
+
+def timed(function, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    authors = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    middle = START + 60 * (messages // 2)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "chat-history")
+        history = HistoryIndex(None, None, path)
+        start = time.perf_counter()
+        build(history, messages, authors)
+        append = time.perf_counter() - start
+        history.close()
+
+        start = time.perf_counter()
+        history = HistoryIndex(None, None, path)
+        load = time.perf_counter() - start
+        arrays = [history.hashes, history.offsets, history.times]
+        for lists in (history.authors, history.words, history.days):
+            arrays.extend(lists.values())
+        memory = sum(memoryview(values).nbytes for values in arrays)
+
+        _, cursor = history.page(20, before=messages // 2 + 20)
+        queries = {
+            "newest": {},
+            "author": {"author": "user007"},
+            "common word": {"words": ["w0"]},
+            "rare word": {"words": ["w19999"]},
+            "author + word": {"author": "user007", "words": ["w3"]},
+            "two words": {"words": ["w1", "w2"]},
+            "time range": {"since": middle, "until": middle + 3600},
+            "deep page": {"before": cursor},
+        }
+        rows = []
+        for name, conditions in queries.items():
+            indexed, (page, _) = timed(lambda: history.page(20, **conditions))
+            scanned, expected = timed(lambda: scan(path, **conditions), repeat=1)
+            same = [message["message"] for message in page] == expected
+            rows.append((name, indexed, scanned, len(page), same))
+        size = history.stats()["bytes"]
+        history.close()
+
+    print(f"{messages} messages, {authors} authors, index file {size / 2**20:.1f} MiB")
+    print(f"append {messages / append:.0f} messages/s, reopen {load:.2f}s, arrays {memory / 2**20:.1f} MiB")
+    print(f"{'page of 20':<15} {'index ms':>9} {'scan ms':>9} {'results':>8} {'same':>5}")
+    for name, indexed, scanned, count, same in rows:
+        print(f"{name:<15} {indexed:>9.2f} {scanned:>9.0f} {count:>8} {str(same):>5}")
+
+
+if __name__ == "__main__":
+    main()
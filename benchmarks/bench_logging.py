@@ -0,0 +1,65 @@
+"""
+Cost of the per-commit log lines on the receive path of task3.py.
+
+  print     the old synchronous prints (three lines per received commit)
+  warning   chatlog at the default level: the debug/info calls return at once
+  info      chatlog at info: one line per commit, written by the queue thread
+  debug     chatlog at debug, rate limit off
+
+Output goes to a line-buffered temporary file (like a terminal); times cover
+the calling thread only.
+
+Usage: python -m benchmarks.bench_logging [commits]
+"""
+import sys
+import tempfile
+import time
+
+import chatlog
+
+USER = "bench"
+AUTHOR = "peer001"
+MESSAGE = "a chat message that is a little longer than forty characters"
+SHA = "0123456789abcdef0123456789abcdef01234567"
+
+
+def old(commits, out):
+    stdout = sys.stdout
+    sys.stdout = out
+    try:
+        start = time.perf_counter()
+        for _ in range(commits):
+            print(f"[{USER}] Received commit packet: {MESSAGE[:40]} ({AUTHOR})")
+            print(f"[{USER}] Applied commit from {AUTHOR}: {MESSAGE[:40]}")
+            print(f"[{USER}] Created commit hash: {SHA}")
+        return time.perf_counter() - start
+    finally:
+        sys.stdout = stdout
+
+
+def new(commits, out, level):
+    log = chatlog.get("task3")
+    chatlog.setup(level, rate=0, stream=out)
+    start = time.perf_counter()
+    for _ in range(commits):
+        log.debug("[%s] Received commit packet: %.40s (%s)", USER, MESSAGE, AUTHOR)
+        log.info("[%s] Applied commit from %s: %.40s (%s)", USER, AUTHOR, MESSAGE, SHA)
+    elapsed = time.perf_counter() - start
+    chatlog.shutdown()
+    return elapsed
+
+
+def main():
+    commits = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"{commits} received commits")
+    print(f"{'mode':<8} {'us/commit':>10} {'lines':>8}")
+    for mode in ("print", "warning", "info", "debug"):
+        with tempfile.TemporaryFile("w+", buffering=1) as out:
+            elapsed = old(commits, out) if mode == "print" else new(commits, out, mode)
+            out.seek(0)
+            lines = sum(1 for _ in out)
+        print(f"{mode:<8} {elapsed / commits * 1e6:>10.2f} {lines:>8}")
+
+
+if __name__ == "__main__":
+    main()
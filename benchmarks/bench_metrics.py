@@ -0,0 +1,44 @@
+"""
+Cost of the metrics layer on FrontierChat.handle (task1.py) for delta records.
+
+  off  metrics disabled (default): counters return at once, nothing is wrapped
+  on   metrics enabled: handle/handle_digest/merge timed, counters updated
+
+Usage: python -m benchmarks.bench_metrics [messages]
+"""
+import sys
+import time
+
+import metrics
+from task1 import FrontierChat
+
+PEERS = 100
+ADDR = ("10.0.0.2", 9999)
+
+
+def run(messages):
+    chat = FrontierChat("bench", 0, "127.0.0.1", 3600, start=False, headless=True)
+    chat.sock.close()
+    chat.send = lambda records, addr: 0
+    records = [{"type": "delta", "state": {f"peer{i % PEERS:03d}": i // PEERS + 1}} for i in range(messages)]
+    start = time.perf_counter()
+    for record in records:
+        metrics.PACKETS_RECEIVED.inc()
+        metrics.BYTES_RECEIVED.inc(64)
+        chat.handle(record, ADDR)
+    return messages / (time.perf_counter() - start)
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    off = run(messages)
+    metrics.REGISTRY.enabled = True
+    on = run(messages)
+    print(f"{messages} delta records")
+    print(f"{'metrics':<8} {'records/s':>12} {'ns/record':>10}")
+    for name, rate in (("off", off), ("on", on)):
+        print(f"{name:<8} {rate:>12,.0f} {1e9 / rate:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Missing-commit computation on synthetic chat histories.
+
+Compares CommitGraph.missing with the previous approach (scan of the whole
+`git log --all --topo-order` output, gaps matched by author name). The log scan
+is replayed over an in-memory log, so its numbers exclude the git process itself.
+
+Usage: python -m benchmarks.bench_missing_commits [sizes] [authors]
+       e.g. python -m benchmarks.bench_missing_commits 10000,100000,1000000 128
+"""
+import random
+import sys
+import time
+
+from commit_index import CommitGraph
+
+
+def synthetic_history(commits, authors, seed=1):
+    """
+    Every commit references its author's previous commit plus up to three other tips.
+    """
+    rng = random.Random(seed)
+    names = [f"user{i:03d}" for i in range(authors)]
+    tips = {}
+    graph = CommitGraph()
+    log = []  # (author, hash) in Einfügereihenfolge
+    start = time.perf_counter()
+    for i in range(commits):
+        author = rng.choice(names)
+        parents = [tips[author]] if author in tips else []
+        for other in rng.sample(names, 3):
+            if other != author and other in tips:
+                parents.append(tips[other])
+        sha = f"{i:040x}"
+        graph.add(sha, author, parents)
+        tips[author] = sha
+        log.append((author, sha))
+    return graph, log, time.perf_counter() - start
+
+
+def log_scan(log, local, remote):
+    # Nachbau von get_missing_commits vor dem Commit-Graph
+    gaps = {}
+    for author, sha in reversed(log):
+        peer_count = remote.get(author, 0)
+        local_count = local.get(author, 0)
+        if author not in gaps and local_count > peer_count:
+            gaps[author] = {"count": local_count - peer_count, "commits": []}
+        if author in gaps and gaps[author]["count"] > 0:
+            gaps[author]["commits"].append(sha)
+            gaps[author]["count"] -= 1
+    missing = []
+    for info in gaps.values():
+        missing.extend(reversed(info["commits"]))
+    return missing
+
+
+def lagging_frontier(graph, lag):
+    return {author: max(0, head - lag) for author, head in graph.heads.items()}
+
+
+def timed(fn, rounds=3):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return (time.perf_counter() - start) / rounds, result
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1].split(",")] if len(sys.argv) > 1 else [10000, 100000]
+    authors = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+
+    print(f"{'commits':>9} {'authors':>8} {'build s':>8} {'lag':>6} {'missing':>8} {'graph ms':>9} {'log scan ms':>12}")
+    for size in sizes:
+        graph, log, build = synthetic_history(size, authors)
+        local = dict(graph.heads)
+        for lag in (0, 1, 10, 100):
+            remote = lagging_frontier(graph, lag)
+            graph_time, missing = timed(lambda: graph.missing(remote))
+            scan_time, _ = timed(lambda: log_scan(log, local, remote))
+            print(f"{size:>9} {authors:>8} {build:>8.2f} {lag:>6} {len(missing):>8} "
+                  f"{graph_time * 1000:>9.2f} {scan_time * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Serving the same missing commits to many peers, with and without the commit
+packet cache (packet_cache.py).
+
+A GitbasedChat holds `commits` commits; `peers` fresh peers ask for all of them
+one after another (each catch-up session ends before the next peer asks, so
+catchup.CatchupServer cannot share records between sessions). Datagrams are
+packed but not sent. Reports wall time, CPU time of this process and of
+finished git processes, git processes started, and cache hits/misses, for the
+batch backend (long-lived git cat-file) and the subprocess backend (one git
+process per read).
+
+Usage: python -m benchmarks.bench_packet_cache [peers] [commits] [backends]
+       e.g. python -m benchmarks.bench_packet_cache 50 1000 batch,subprocess
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+
+TIMESTAMP = "1715058000 +0000"
+
+
+def serve(backend, cached, peers, commits):
+    import task3
+    chat = task3.GitbasedChat("server", True, backend=backend, start=False, headless=True,
+                              fetch_interval=None, bulk_threshold=0)
+    repo = chat.repo
+    parent = repo.refs()["refs/heads/server"]
+    for i in range(commits):
+        sha = repo.create_commit([parent], f"history message {i}", "server", TIMESTAMP)
+        chat.index.add(sha, "server", [parent])
+        parent = sha
+    repo.update_ref("refs/heads/server", parent)
+    if not cached:
+        chat.packets.max_entries = 0
+    chat.catchup.rate = 1e9  # CPU messen, nicht die Ratenbegrenzung
+    sent = [0]
+
+    def send(records, addr):
+        for datagram in chat.packer.pack(records):
+            sent[0] += len(datagram)
+        return sent[0]
+
+    chat.send = send
+    spawned = repo.spawned
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = time.process_time()
+    start = time.perf_counter()
+    for peer in range(peers):
+        request = {"type": "frontier", "from": f"peer{peer}", "frontier": {}}
+        chat.handle_message(request, (f"10.0.{peer // 250}.{peer % 250 + 1}", 6969))
+        while chat.catchup.stats()["sessions"]:
+            time.sleep(0.001)
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    git_cpu = max(0.0, after.ru_utime + after.ru_stime - children.ru_utime - children.ru_stime)
+    stats = chat.packets.stats()
+    result = (wall, cpu, git_cpu, repo.spawned - spawned, stats["hits"], stats["misses"], sent[0])
+    chat.close()
+    return result
+
+
+def main():
+    peers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    commits = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    backends = sys.argv[3].split(",") if len(sys.argv) > 3 else ["batch", "subprocess"]
+
+    cwd = os.getcwd()
+    stdout = sys.stdout
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend in backends:
+            for cached in (False, True):
+                os.chdir(workdir)
+                sys.stdout = open(os.devnull, "w")
+                try:
+                    results.append((backend, cached, *serve(backend, cached, peers, commits)))
+                finally:
+                    sys.stdout.close()
+                    sys.stdout = stdout
+                    os.chdir(cwd)
+
+    print(f"{peers} peers x {commits} commits")
+    print(f"{'backend':<11} {'cache':<6} {'wall s':>7} {'cpu s':>7} {'git cpu s':>10} {'git procs':>10} "
+          f"{'hits':>7} {'misses':>7}")
+    for backend, cached, wall, cpu, git_cpu, spawned, hits, misses, _ in results:
+        print(f"{backend:<11} {'on' if cached else 'off':<6} {wall:>7.2f} {cpu:>7.2f} {git_cpu:>10.2f} "
+              f"{spawned:>10} {hits:>7} {misses:>7}")
+
+
+if __name__ == "__main__":
+    main()
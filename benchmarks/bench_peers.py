@@ -0,0 +1,104 @@
+"""
+Memory and broadcast size of the peer table (frontier.py) with many idle peers.
+
+Builds a frontier of `peers` users of which `live` keep posting, as a plain
+dict of counts (the state before frontier.py), as a dict of per-peer objects
+with __slots__ (count, last seen, address), as a Frontier that keeps everyone
+and as a Frontier whose idle peers were evicted to its archive after `idle`
+seconds. Reports memory per peer (tracemalloc, without the name strings,
+which every variant needs) and what one node broadcasts per interval,
+packed into datagrams of `mtu` bytes: the full state (task2.py --gossip
+full), the full frontier record (task3.py --gossip full), a digest and the
+delta a peer gets for one differing bucket.
+
+Usage: python -m benchmarks.bench_peers [peers] [live] [idle] [mtu]
+"""
+import sys
+import time
+import tracemalloc
+
+from frontier import Frontier
+from gossip import digest, select
+from wire import Packer
+
+
+class PeerRecord:
+    __slots__ = ("count", "seen", "source")
+
+    def __init__(self, count, seen, source=None):
+        self.count = count
+        self.seen = seen
+        self.source = source
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    table = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return table, used
+
+
+def populate(names, live, idle, evict):
+    clock = [0.0]
+    table = Frontier(clock=lambda: clock[0])
+    table.merge({name: 1 for name in names})
+    # Nur die ersten `live` Peers posten weiter, die anderen werden still
+    clock[0] = idle * 2
+    table.merge({name: 2 for name in names[:live]})
+    if evict:
+        table.evict(idle)
+    return table
+
+
+def packed(packer, record):
+    datagrams = packer.pack([record])
+    return len(datagrams), sum(map(len, datagrams))
+
+
+def main():
+    peers = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    live = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    idle = float(sys.argv[3]) if len(sys.argv) > 3 else 600
+    mtu = int(sys.argv[4]) if len(sys.argv) > 4 else 576
+
+    names = [f"user{i:05d}" for i in range(peers)]
+    variants = [
+        ("dict", lambda: {name: 2 if i < live else 1 for i, name in enumerate(names)}),
+        ("dict+slots", lambda: {name: PeerRecord(2 if i < live else 1, time.time()) for i, name in enumerate(names)}),
+        ("Frontier", lambda: populate(names, live, idle, False)),
+        ("Frontier+evict", lambda: populate(names, live, idle, True)),
+    ]
+    packer = Packer(mtu)
+    rows = []
+    for name, build in variants:
+        table, used = measure(build)
+        state = {user: getattr(value, "count", value) for user, value in table.items()}
+        rows.append((name, len(state), used / peers,
+                     packed(packer, state),
+                     packed(packer, {"type": "frontier", "from": "me", "frontier": state}),
+                     packed(packer, digest(state)),
+                     packed(packer, {"type": "delta", "state": select(state, [0]), "buckets": [0]})))
+
+    table = populate(names, live, idle, False)
+    start = time.perf_counter()
+    table.clock = lambda: idle * 2
+    evicted = table.evict(idle)
+    evict_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    recovered = [table.restore(name) for name in evicted[:100]]
+    restore_us = (time.perf_counter() - start) * 1e6 / max(1, len(recovered))
+
+    print(f"{peers} peers, {live} live, idle after {idle:.0f}s, datagrams of {mtu} bytes")
+    print(f"{'table':<15} {'in bcast':>8} {'B/peer':>7} {'full state':>14} {'task3 full':>14} "
+          f"{'digest':>10} {'1 bucket':>14}")
+    for name, size, per_peer, *sizes in rows:
+        cells = " ".join(f"{f'{count}x / {total}B':>14}" if i != 2 else f"{f'{count}x / {total}B':>10}"
+                         for i, (count, total) in enumerate(sizes))
+        print(f"{name:<15} {size:>8} {per_peer:>7.1f} {cells}")
+    print(f"evict() of {len(evicted)} peers {evict_ms:.1f} ms, restore() {restore_us:.1f} us per peer")
+
+
+if __name__ == "__main__":
+    main()
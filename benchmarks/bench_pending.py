@@ -0,0 +1,105 @@
+"""
+Out-of-order commit delivery: polling retry list (old retry_pending_commits)
+versus the dependency-indexed PendingBuffer.
+
+A history is built in a source repo and its commit packets are delivered to a
+GitbasedChat in reverse order, the worst case for the retry list. The polling
+numbers are reported as retry passes; with a 5 s interval each pass adds 5 s
+until the last commit is applied.
+
+Usage: python -m benchmarks.bench_pending [commits] [authors]
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+from benchmarks.bench_gitstore import ingest
+from gitstore import open_backend
+from task3 import GitbasedChat
+
+RETRY_INTERVAL = 5  # Sekunden, Intervall der alten Retry-Schleife
+
+
+def packets(commits, authors):
+    tmp, _, _ = ingest("batch", commits, authors)
+    repo = open_backend("batch", cwd=tmp.name)
+    # Nur neue Commits: die ersten Parents fehlen beim Empfänger ohnehin nie
+    shas = []
+    seen = set()
+    stack = list(repo.refs().values())
+    while stack:
+        sha = stack.pop()
+        if sha in seen:
+            continue
+        seen.add(sha)
+        shas.append(sha)
+        stack.extend(repo.read_commit(sha)["parents"])
+    result = []
+    for sha in shas:
+        commit = repo.read_commit(sha)
+        result.append({"type": "commit", "author": commit["author"], "author_time": commit["author_time"],
+                       "message": commit["message"], "parents": commit["parents"], "tree": commit["tree"]})
+    repo.close()
+    tmp.cleanup()
+    return result
+
+
+def chat():
+    cwd = os.getcwd()
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = GitbasedChat("bench", True, start=False)
+    os.chdir(cwd)
+    return app
+
+
+def polling(app, payloads):
+    # Alte Logik: alles zurückstellen, dann in Durchläufen erneut probieren
+    pending = []
+    for payload in payloads:
+        if all(app.repo.exists(p) for p in payload["parents"]):
+            app.apply_commit(payload)
+        else:
+            pending.append(payload)
+    passes = 0
+    while pending:
+        passes += 1
+        for payload in pending[:]:
+            if all(app.repo.exists(p) for p in payload["parents"]):
+                pending.remove(payload)
+                app.apply_commit(payload)
+    return passes
+
+
+def indexed(app, payloads):
+    for payload in payloads:
+        app.receive_commit(payload)
+    return 0
+
+
+def main():
+    commits = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    authors = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    payloads = packets(commits, authors)
+    print(f"{len(payloads)} commits from {authors} authors, delivered in reverse order")
+    print(f"{'mode':<10} {'apply s':>8} {'retry passes':>13} {'time to converge':>17}")
+    for name, fn in (("polling", polling), ("indexed", indexed)):
+        app = chat()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            passes = fn(app, list(reversed(payloads)))
+            elapsed = time.perf_counter() - start
+        assert len(app.index.entries) == len(payloads) + 1, "not all commits applied"
+        converge = elapsed + passes * RETRY_INTERVAL
+        print(f"{name:<10} {elapsed:>8.2f} {passes:>13} {converge:>16.2f}s")
+        if name == "indexed":
+            stats = app.pending.stats()
+            print(f"  max depth {stats['max_depth']}, released {stats['released']}, "
+                  f"avg wait {stats['wait_avg'] * 1000:.1f} ms, evicted {stats['evicted']}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            app.close()
+
+
+if __name__ == "__main__":
+    main()
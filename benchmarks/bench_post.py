@@ -0,0 +1,110 @@
+"""
+Send latency of GitbasedChat.post_message with many branches.
+
+  original  fetch --all, for-each-ref and one rev-parse per ref, commit-tree, update-ref
+  previous  fetch --all, refs read from the git dir, batch backend
+  cached    parents from the in-memory tip cache (current post_message)
+  chain     10 queued lines committed as one chain with one update-ref (per line)
+
+Usage: python -m benchmarks.bench_post [branches] [messages]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from gitstore import commit_env
+from task3 import GitbasedChat
+from utils import run
+
+TIMESTAMP = "1715058000 +0000"
+
+
+class NullSocket:
+    def sendto(self, data, addr):
+        pass
+
+
+def original(chat, msg):
+    cwd = chat.repo.cwd
+    run(["git", "fetch", "--all"], cwd=cwd)
+    refs = run(["git", "for-each-ref", "--format=%(refname)"], cwd=cwd).splitlines()
+    parents = [run(["git", "rev-parse", ref], cwd=cwd) for ref in refs if ref.startswith("refs/heads/")]
+    args = ["git", "commit-tree", "4b825dc642cb6eb9a060e54bf8d69288fbee4904"] + sum([["-p", p] for p in parents], [])
+    sha = run(args, input=msg, env=commit_env(chat.username, TIMESTAMP), cwd=cwd)
+    run(["git", "update-ref", f"refs/heads/{chat.username}", sha], cwd=cwd)
+
+
+def previous(chat, msg):
+    run(["git", "fetch", "--all"], cwd=chat.repo.cwd)
+    parents = list(chat.repo.refs().values())
+    sha = chat.repo.create_commit(parents, msg, chat.username, TIMESTAMP)
+    chat.index.add(sha, chat.username, parents)
+    chat.repo.update_ref(f"refs/heads/{chat.username}", sha)
+
+
+def cached(chat, msg):
+    chat.post_message(msg)
+
+
+def setup(branches):
+    chat = GitbasedChat("bench", True, start=False, fetch_interval=None)
+    chat.sock.close()
+    chat.sock = NullSocket()
+    for i in range(branches - 1):
+        author = f"peer{i:03d}"
+        sha = chat.repo.create_commit([], f"{author} joined", author, TIMESTAMP)
+        chat.index.add(sha, author, [])
+        chat.repo.update_ref(f"refs/heads/{author}", sha)
+    return chat
+
+
+def measure(chat, fn, messages, chain=1):
+    latencies = []
+    for i in range(0, messages, chain):
+        start = time.perf_counter()
+        if chain == 1:
+            fn(chat, f"message {i}")
+        else:
+            chat.post_messages([f"message {i + j}" for j in range(chain)])
+        elapsed = (time.perf_counter() - start) / chain
+        latencies.extend([elapsed] * chain)
+    return latencies
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    branches = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    cwd = os.getcwd()
+    stdout = sys.stdout
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        sys.stdout = open(os.devnull, "w")
+        try:
+            chat = setup(branches)
+            for name, fn, chain in (("original", original, 1), ("previous", previous, 1),
+                                    ("cached", cached, 1), ("chain", cached, 10)):
+                results.append((name, measure(chat, fn, messages, chain)))
+            chat.close()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+            os.chdir(cwd)
+
+    print(f"{messages} messages, {branches} branches")
+    print(f"{'mode':<10} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+    for name, latencies in results:
+        print(f"{name:<10} {percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f} "
+              f"{statistics.mean(latencies) * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
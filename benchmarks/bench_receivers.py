@@ -0,0 +1,81 @@
+"""
+Loopback flood of one FrontierChat (task1.py) with 1, 2, 4 and 8 receiver threads.
+
+With one receiver the frontier is a Frontier under the chat lock; with more,
+a ShardedFrontier and every receiver thread reads from the same socket. Each
+sender process sends delta records for its own user. Reports datagrams
+handled per second (first to last handled) and datagrams lost.
+
+Usage: python -m benchmarks.bench_receivers [senders] [datagrams per sender]
+"""
+import os
+import socket
+import sys
+import threading
+import time
+
+from benchmarks.bench_aio import RCVBUF, run_flood
+from task1 import FrontierChat
+
+PORT = 47140
+
+
+class Counter:
+    """
+    Thread-safe count of handled messages, wrapped around chat.handle.
+    """
+
+    def __init__(self, chat):
+        self.handle = chat.handle
+        self.lock = threading.Lock()
+        self.count = 0
+        self.first = None
+        self.last = None
+        chat.handle = self
+
+    def __call__(self, message, addr):
+        self.handle(message, addr)
+        now = time.perf_counter()
+        with self.lock:
+            self.count += 1
+            self.last = now
+            if self.first is None:
+                self.first = now
+
+    def wait_idle(self):
+        last = -1
+        while self.count != last:
+            last = self.count
+            time.sleep(0.5)
+
+    def rate(self):
+        return self.count / max(self.last - self.first, 1e-9) if self.count else 0.0
+
+
+def bench(receivers, senders, count, port):
+    chat = FrontierChat("node", port, "127.0.0.1", 3600, start=False, headless=True, receivers=receivers)
+    chat.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+    chat.send = lambda records, addr: 0  # nur Empfang messen
+    counter = Counter(chat)
+    for _ in range(receivers):
+        threading.Thread(target=chat.listen, daemon=True).start()
+    run_flood(senders, count, port)
+    counter.wait_idle()
+    chat.running = False
+    return counter
+
+
+def main():
+    senders = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    sent = senders * count
+
+    print(f"{senders} senders x {count} datagrams = {sent}, {os.cpu_count()} CPUs")
+    print(f"{'receivers':>9} {'handled':>9} {'handled/s':>10} {'lost':>8}")
+    for offset, receivers in enumerate((1, 2, 4, 8)):
+        counter = bench(receivers, senders, count, PORT + offset)
+        print(f"{receivers:>9} {counter.count:>9} {counter.rate():>10.0f} {sent - counter.count:>8}")
+
+
+if __name__ == "__main__":
+    main()
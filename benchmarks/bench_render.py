@@ -0,0 +1,75 @@
+"""
+Merge throughput of FrontierChat (task1.py) with and without terminal output.
+
+  inline    full sorted table printed inside the lock on every change (old print_state)
+  renderer  changes handed to render.Renderer, at most RENDER_RATE redraws per second
+  headless  no output at all
+
+Each merge is a delta that raises one peer's count, as received in --gossip
+digest. Output goes to a temporary file (a redirected terminal). merges/s
+counts the merge loop only; redraws and output include the renderer's
+redraws after it.
+
+Usage: python -m benchmarks.bench_render [peers] [merges]
+"""
+import sys
+import tempfile
+import time
+
+from render import Renderer
+from task1 import FrontierChat
+
+
+def print_state(chat, out):
+    # FrontierChat.print_state vor render.py
+    out.write("\nMessages sent:\n")
+    for user, count in sorted(chat.state.items()):
+        out.write(f"  {user}: {count}\n")
+    out.write("Press 'ENTER' to send message...\n")
+
+
+def inline(chat, out):
+    def merge(incoming_state, source=None):
+        with chat.lock:
+            if chat.state.merge(incoming_state, source):
+                print_state(chat, out)
+    chat.merge = merge
+
+
+def run(mode, peers, merges, out):
+    chat = FrontierChat("bench", 0, "127.0.0.1", 3600, start=False, headless=mode != "renderer")
+    chat.sock.close()
+    if mode == "renderer":
+        chat.renderer.close()
+        chat.renderer = Renderer("\nMessages sent:", "Press 'ENTER' to send message...", out=out)
+    elif mode == "inline":
+        inline(chat, out)
+    chat.merge({f"peer{i:05d}": 0 for i in range(peers)})
+    deltas = [{f"peer{i % peers:05d}": i // peers + 1} for i in range(merges)]
+    redraws = chat.renderer.redraws
+    start = time.perf_counter()
+    for delta in deltas:
+        chat.merge(delta)
+    merged = time.perf_counter() - start
+    if mode == "renderer":
+        while chat.renderer.changes or chat.renderer.wake.is_set():
+            time.sleep(0.01)
+        chat.renderer.close()
+    return merges / merged, chat.renderer.redraws - redraws, out.tell()
+
+
+def main():
+    peers = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    merges = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    print(f"{merges} delta merges, {peers} peers")
+    print(f"{'mode':<10} {'merges/s':>12} {'redraws':>8} {'output KB':>10}")
+    for mode in ("inline", "renderer", "headless"):
+        with tempfile.TemporaryFile("w+") as out:
+            rate, redraws, size = run(mode, peers, merges, out)
+        redraws = merges if mode == "inline" else redraws
+        print(f"{mode:<10} {rate:>12,.0f} {redraws:>8} {size / 1024:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Bounded history (retention.py) on a synthetic GitbasedChat history.
+
+Builds `commits` chat commits of `authors` authors in a temp repo (each on top
+of all branch tips, like post_messages), runs `git gc` once, then prunes to the
+newest `keep` commits per author and gc's again. Reports for both states: git
+objects and pack size, commit index lines, time to reload the commit index,
+get_missing_commits for a fresh peer, and what a fresh node is sent to
+bootstrap (records, datagrams, bytes).
+
+Usage: python -m benchmarks.bench_retention [commits] [authors] [keep]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from commit_index import CommitIndex
+from retention import RetentionPolicy
+from utils import run
+from wire import Packer
+
+TIMESTAMP = "1715058000 +0000"
+
+
+def build(chat, commits, authors, seed=1):
+    rng = random.Random(seed)
+    names = [f"user{i:03d}" for i in range(authors)]
+    repo = chat.repo
+    for i in range(commits):
+        author = rng.choice(names)
+        parents = list(repo.tips().values())
+        sha = repo.create_commit(parents, f"message {i}", author, TIMESTAMP)
+        chat.index.add(sha, author, parents)
+        repo.update_ref(f"refs/heads/{author}", sha)
+
+
+def measure(chat):
+    repo = chat.repo
+    counts = dict(line.split(": ") for line in run(["git", "count-objects", "-v"], cwd=repo.cwd).splitlines())
+    with open(chat.index.path) as f:
+        lines = sum(1 for _ in f)
+    start = time.perf_counter()
+    CommitIndex(repo).close()
+    reload = time.perf_counter() - start
+    start = time.perf_counter()
+    missing = chat.get_missing_commits({})
+    missing_time = time.perf_counter() - start
+    records = [chat.create_commit_packet(sha) for sha in missing]
+    if chat.retention.behind({}):
+        records.insert(0, chat.retention.snapshot())
+    datagrams = Packer(1400).pack(records)
+    return {
+        "objects": int(counts["count"]) + int(counts["in-pack"]),
+        "pack KiB": int(counts["size"]) + int(counts["size-pack"]),
+        "index lines": lines,
+        "reload ms": reload * 1000,
+        "missing ms": missing_time * 1000,
+        "bootstrap records": len(records),
+        "datagrams": len(datagrams),
+        "bootstrap KiB": sum(map(len, datagrams)) / 1024,
+    }
+
+
+def main():
+    commits = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    authors = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    keep = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+
+    import task3
+    cwd = os.getcwd()
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        sys.stdout = open(os.devnull, "w")
+        try:
+            chat = task3.GitbasedChat("bench", True, start=False, headless=True, fetch_interval=None,
+                                      retention=RetentionPolicy(max_per_author=keep))
+            chat.retention.gc_prune = "now"
+            build(chat, commits, authors)
+            frontier = chat.get_frontier_local()
+            run(["git", "gc", "--quiet", "--prune=now"], cwd=chat.repo.cwd)
+            full = measure(chat)
+            start = time.perf_counter()
+            chat.retention.run_once()
+            elapsed = time.perf_counter() - start
+            pruned = measure(chat)
+            same = chat.get_frontier_local() == frontier
+            chat.close()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+            os.chdir(cwd)
+
+    print(f"{commits} commits, {authors} authors, keep {keep} per author")
+    print(f"prune + gc: {elapsed:.2f}s, frontier unchanged: {same}")
+    print(f"{'':<18} {'full':>10} {'pruned':>10}")
+    for key in full:
+        print(f"{key:<18} {full[key]:>10.1f} {pruned[key]:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Startup of a cold --temp replica: repository setup and time until it has
+caught up with running peers.
+
+  repo     the six git commands task3.py ran in --temp mode against
+           gitstore.init_repo(), and the whole GitbasedChat constructor
+  join     a cold task3.py (or task2.py) node joins `peers` warm nodes that
+           hold `authors` x `commits` commits (task2: counts) on the virtual
+           network of benchmarks/simulate.py. "interval" waits for the peers'
+           next digest and answers every peer that sends one (the old start),
+           "seed" sends a hello and syncs from the first peer that answers
+           (gossip.Seed). Gaps from `bulk` commits on go over TCP (bulk.py),
+           so the nodes use addresses on 127.0.0.1.
+
+Reports time to the cold node's first datagram and time until its frontier
+equals the peers', both from the start of its constructor, plus what it sent
+and received until then.
+
+Usage: python -m benchmarks.bench_startup [peers] [authors] [commits] [interval] [bulk]
+"""
+import os
+import queue
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_catchup import TIMESTAMP
+from benchmarks.simulate import Impairment, Link, NodeRunner, Scheduler, SimNode
+from bulk import BulkServer
+from gitstore import EMPTY_TREE, init_repo
+from utils import run
+
+TIMEOUT = 120
+REPEAT = 20
+
+
+def legacy_init(name):
+    # Was task3.py im temp-Modus bisher ausführte
+    run(["git", "init", "-q", "-b", name])
+    run(["git", "config", "user.name", name])
+    run(["git", "config", "user.email", f"{name}@example.com"])
+    commit = run(["git", "commit-tree", EMPTY_TREE], input=f"{name} joined (temp mode)")
+    run(["git", "update-ref", f"refs/heads/{name}", commit])
+    run(["git", "symbolic-ref", "HEAD", f"refs/heads/{name}"])
+
+
+def timed_setup(name, setup, workdir, repeat=REPEAT):
+    times = []
+    for i in range(repeat):
+        path = os.path.join(workdir, f"{name}{i}")
+        os.mkdir(path)
+        os.chdir(path)
+        start = time.perf_counter()
+        setup(path)
+        times.append(time.perf_counter() - start)
+    os.chdir(workdir)
+    return statistics.median(times)
+
+
+def constructor(workdir, repeat=5):
+    import task3
+    times = []
+    for i in range(repeat):
+        os.chdir(workdir)
+        start = time.perf_counter()
+        chat = task3.GitbasedChat(f"cold{i}", True, start=False, headless=True, fetch_interval=None)
+        times.append(time.perf_counter() - start)
+        spawned = chat.repo.spawned
+        chat.close()
+    os.chdir(workdir)
+    return statistics.median(times), spawned
+
+
+class Network:
+    """
+    Virtual network where nodes can come online later; until then what is
+    sent to them is lost, as on a real LAN.
+    """
+
+    def __init__(self, addrs):
+        self.addrs = addrs
+        self.scheduler = Scheduler()
+        self.scheduler.start()
+        self.inboxes = {addr: queue.Queue() for addr in addrs}
+        self.online = set()
+        self.runners = []
+
+    def deliver(self, data, src, dst):
+        if dst in self.online:
+            self.inboxes[dst].put((data, src))
+
+    def take(self, inbox):
+        try:
+            return inbox.get(timeout=0.2)
+        except queue.Empty:
+            return None
+
+    def join(self, node, addr, interval):
+        node.attach(Link(addr, self.addrs, Impairment(), self.scheduler, self.deliver))
+        self.online.add(addr)
+        runner = NodeRunner(node, [], interval, lambda inbox=self.inboxes[addr]: self.take(inbox))
+        runner.start(time.time())
+        self.runners.append(runner)
+        return runner
+
+    def stop(self):
+        for runner in self.runners:
+            runner.stop()
+        self.scheduler.stop()
+        for runner in self.runners:
+            runner.node.close()
+
+
+def enable_bulk(node, threshold):
+    chat = node.chat
+    if node.impl == "task3" and threshold:
+        chat.bulk = BulkServer(chat.repo, chat.index)
+        chat.bulk_threshold = threshold
+
+
+def fill(node, authors, commits):
+    # Gleiche Commits (Inhalt, Zeit, Eltern) ergeben in allen Repos dieselben Hashes
+    chat = node.chat
+    if node.impl != "task3":
+        with chat.lock:
+            chat.state.merge({f"user{a:03d}": commits for a in range(authors)})
+        return
+    for a in range(authors):
+        author = f"user{a:03d}"
+        parents = []
+        for i in range(commits):
+            sha = chat.repo.create_commit(parents, f"{author} history {i}", author, TIMESTAMP)
+            chat.index.add(sha, author, parents)
+            parents = [sha]
+        chat.repo.update_ref(f"refs/heads/{author}", parents[0])
+
+
+def wait(condition, timeout=TIMEOUT, step=0.005):
+    start = time.time()
+    while time.time() - start < timeout:
+        if condition():
+            return True
+        time.sleep(step)
+    return False
+
+
+def join(impl, mode, peers, authors, commits, interval, bulk):
+    addrs = [("127.0.0.1", 50000 + i) for i in range(peers + 1)]
+    network = Network(addrs)
+    try:
+        warm = []
+        for i in range(peers):
+            node = SimNode(impl, f"warm{i:03d}", "digest", 1400)
+            enable_bulk(node, bulk)
+            fill(node, authors, commits)
+            warm.append(node)
+        t0 = time.perf_counter()
+        for node, addr in zip(warm, addrs):
+            network.join(node, addr, interval)
+        # Die Peers kennen sich gegenseitig, bevor der neue Knoten kommt
+        if not wait(lambda: all(node.view() == warm[0].view() for node in warm)):
+            return None
+        target = warm[0].view()
+        # Mitten zwischen zwei Broadcasts der Peers beitreten (mittlere Wartezeit)
+        ahead = (time.perf_counter() - t0) % interval
+        time.sleep((interval / 2 - ahead) % interval)
+
+        start = time.perf_counter()
+        cold = SimNode(impl, "cold", "digest", 1400)
+        if mode != "seed":
+            cold.chat.seed = None
+        enable_bulk(cold, bulk)
+        received = []
+        lock = threading.Lock()
+        receive = cold.receive
+
+        def counted(data, addr):
+            with lock:
+                received.append(len(data))
+            receive(data, addr)
+        cold.receive = counted
+        runner = network.join(cold, addrs[-1], interval)
+        if mode == "seed":
+            cold.chat.hello()
+        link = cold.link
+        times = {}
+
+        def progress():
+            now = time.perf_counter() - start
+            if link.datagrams:
+                times.setdefault("first", now)
+            if all(cold.view().get(user, -1) >= count for user, count in target.items()):
+                times.setdefault("converged", now)
+            return len(times) == 2
+        wait(progress)
+        first, converged = times.get("first"), times.get("converged")
+        runner.stop()
+        return first, converged, link.datagrams, link.bytes, len(received), sum(received)
+    finally:
+        network.stop()
+
+
+def main():
+    peers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    authors = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    commits = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    interval = float(sys.argv[4]) if len(sys.argv) > 4 else 2.0
+    bulk = int(sys.argv[5]) if len(sys.argv) > 5 else 500
+
+    cwd = os.getcwd()
+    stdout = sys.stdout
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        sys.stdout = open(os.devnull, "w")
+        try:
+            legacy = timed_setup("legacy", lambda path: legacy_init(os.path.basename(path)), workdir)
+            direct = timed_setup("direct", lambda path: init_repo(path, os.path.basename(path), "joined"), workdir)
+            built, spawned = constructor(workdir)
+            for impl in ("task3", "task2"):
+                for mode in ("interval", "seed"):
+                    os.chdir(workdir)
+                    rows.append((impl, mode, join(impl, mode, peers, authors, commits, interval, bulk)))
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+            os.chdir(cwd)
+
+    print(f"temp repo setup: six git commands {legacy * 1000:.1f} ms, init_repo {direct * 1000:.2f} ms")
+    print(f"GitbasedChat(--temp) constructor {built * 1000:.1f} ms, {spawned} git processes")
+    print(f"cold node joins {peers} peers, {authors} authors x {commits} commits, broadcast interval {interval}s")
+    print(f"{'chat':<6} {'start':<9} {'first s':>8} {'converged s':>12} {'sent':>6} {'sent KiB':>9} "
+          f"{'recv':>6} {'recv KiB':>9}")
+    for impl, mode, result in rows:
+        if result is None:
+            print(f"{impl:<6} {mode:<9} {'peers did not converge':>30}")
+            continue
+        first, converged, sent, sent_bytes, received, received_bytes = result
+        first = f"{first:.3f}" if first is not None else "-"
+        converged = f"{converged:.3f}" if converged is not None else "timeout"
+        print(f"{impl:<6} {mode:<9} {first:>8} {converged:>12} {sent:>6} {sent_bytes / 1024:>9.1f} "
+              f"{received:>6} {received_bytes / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
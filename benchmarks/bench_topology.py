@@ -0,0 +1,194 @@
+"""
+Frontier gossip of many peers under flat broadcast and relayed multicast
+(topology.py), simulated in rounds.
+
+Builds `nodes` task1.py chats (start=False) on an in-process network that
+knows broadcast, multicast group membership and unicast. Every round
+`posters` random members post once, then every node runs its periodic
+broadcast; after each step all queued datagrams are delivered until the
+network is quiet. After the last round, rounds without posts run until every
+node has every count. Reports per node and round: datagrams received and
+sent and CPU time in the chat's handlers and broadcast, for members and
+relays. With relays, members are spread over `groups` groups and the relays
+share the groups between them.
+
+Usage: python -m benchmarks.bench_topology [nodes] [groups] [relays] [rounds] [posters]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import deque
+
+from topology import Topology, group_for, is_multicast
+
+PORT = 6969
+BROADCAST_HOSTS = ("<broadcast>", "255.255.255.255")
+RELAY_GROUP = "239.255.69.254"
+
+
+class Peer:
+    """
+    Stands in for chat.sock and counts what the node sends, receives and spends.
+    """
+
+    def __init__(self, network, addr, chat, relay=False):
+        self.network = network
+        self.addr = addr
+        self.chat = chat
+        self.relay = relay
+        self.received = 0
+        self.sent = 0
+        self.cpu = 0.0
+
+    def sendto(self, data, addr):
+        self.sent += 1
+        self.network.send(self.addr, bytes(data), addr)
+
+    def call(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            fn(*args)
+        finally:
+            self.cpu += time.perf_counter() - start
+
+    def deliver(self, data, src):
+        self.received += 1
+        start = time.perf_counter()
+        for message in self.chat.reassembler.feed(data, src):
+            self.chat.handle(message, src)
+        self.cpu += time.perf_counter() - start
+
+
+class Network:
+    def __init__(self):
+        self.queue = deque()
+        self.peers = {}  # Adresse -> Peer
+        self.members = {}  # Gruppe -> Adressen
+
+    def add(self, addr, chat, relay=False):
+        chat.sock.close()
+        peer = chat.sock = Peer(self, addr, chat, relay)
+        self.peers[addr] = peer
+        for group in chat.topology.groups():
+            self.members.setdefault(group, []).append(addr)
+        return peer
+
+    def send(self, src, data, dst):
+        if dst[0] in BROADCAST_HOSTS:
+            targets = self.peers
+        elif is_multicast(dst[0]):
+            targets = self.members.get(dst[0], ())
+        else:
+            targets = [dst]
+        for target in targets:
+            if target != src:
+                self.queue.append((data, src, target))
+
+    def run(self):
+        queue = self.queue
+        peers = self.peers
+        while queue:
+            data, src, dst = queue.popleft()
+            peers[dst].deliver(data, src)
+
+
+def build(nodes, groups, relays):
+    import task1
+    network = Network()
+    names = [f"node{i:03d}" for i in range(nodes)]
+    addresses = [f"239.255.69.{i + 1}" for i in range(groups)]
+    for i, name in enumerate(names):
+        addr = (f"10.0.{i // 250}.{i % 250 + 1}", PORT)
+        relay = i < relays
+        if not groups:
+            topology = Topology(0)
+        elif relay:
+            topology = Topology(0, relay_group=RELAY_GROUP, relay=True, serve=addresses[i::relays],
+                                interface="127.0.0.1")
+        else:
+            topology = Topology(0, group=group_for(name, addresses), relay_group=RELAY_GROUP,
+                                interface="127.0.0.1")
+        topology.port = PORT
+        chat = task1.FrontierChat(name, 0, "<broadcast>", 3600, start=False, headless=True, topology=topology)
+        network.add(addr, chat, relay)
+    return network
+
+
+def simulate(nodes, groups, relays, rounds, posters, seed=1):
+    rng = random.Random(seed)
+    network = build(nodes, groups, relays)
+    peers = list(network.peers.values())
+    members = [peer for peer in peers if not peer.relay]
+    target = {peer.chat.username: 0 for peer in peers}
+    start = time.perf_counter()
+    steps = 0
+    settle = None
+    while True:
+        if steps < rounds:
+            for peer in rng.sample(members, posters):
+                peer.call(peer.chat.increment_own_count)
+                target[peer.chat.username] += 1
+            network.run()
+        for peer in peers:
+            peer.call(peer.chat.broadcast)
+        network.run()
+        steps += 1
+        if steps >= rounds:
+            done = all(peer.chat.state.get(name, -1) >= count for peer in peers for name, count in target.items())
+            if done:
+                settle = steps - rounds
+                break
+            if steps >= rounds + 10:
+                break
+    wall = time.perf_counter() - start
+    for peer in peers:
+        peer.chat.running = False
+        peer.chat.renderer.close()
+    return network, steps, settle, wall
+
+
+def summary(peers, steps):
+    if not peers:
+        return None
+    received = [peer.received / steps for peer in peers]
+    sent = [peer.sent / steps for peer in peers]
+    cpu = [peer.cpu * 1000 / steps for peer in peers]
+    return (len(peers), sum(received) / len(peers), max(received), sum(sent) / len(peers),
+            sum(cpu) / len(peers), max(cpu))
+
+
+def main():
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    groups = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    relays = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    rounds = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+    posters = int(sys.argv[5]) if len(sys.argv) > 5 else 50
+
+    cwd = os.getcwd()
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            for name, g, r in (("broadcast", 0, 0), (f"relay {groups}g/{relays}r", groups, relays)):
+                network, steps, settle, wall = simulate(nodes, g, r, rounds, posters)
+                peers = list(network.peers.values())
+                for role, subset in (("member", [p for p in peers if not p.relay]),
+                                     ("relay", [p for p in peers if p.relay])):
+                    row = summary(subset, steps)
+                    if row is not None:
+                        rows.append((name, role, *row, settle, wall))
+        finally:
+            os.chdir(cwd)
+
+    print(f"{nodes} nodes, {rounds} rounds with {posters} posts each, per node and round:")
+    print(f"{'topology':<16} {'role':<7} {'nodes':>5} {'recv':>8} {'recv max':>9} {'sent':>7} "
+          f"{'cpu ms':>8} {'cpu max':>8} {'settle':>7} {'wall s':>7}")
+    for name, role, count, received, received_max, sent, cpu, cpu_max, settle, wall in rows:
+        print(f"{name:<16} {role:<7} {count:>5} {received:>8.1f} {received_max:>9.1f} {sent:>7.1f} "
+              f"{cpu:>8.2f} {cpu_max:>8.2f} {str(settle):>7} {wall:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
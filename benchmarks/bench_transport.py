@@ -0,0 +1,136 @@
+"""
+Localhost receive throughput: plain recvfrom versus transport.Transport.
+
+  recvfrom       one recvfrom(RECV_BUFFER) per datagram, default SO_RCVBUF (old sockets)
+  transport/def  Transport.receive() batches, default SO_RCVBUF
+  transport      Transport.receive() batches, RCVBUF
+
+Sender processes flood pre-encoded delta datagrams in bursts; the receiver
+decodes every datagram with wire.Reassembler. Reports datagrams received per
+second, lost datagrams and the kernel's drop counter (SO_RXQ_OVFL).
+A second table gives the receive cost per datagram without competing
+senders: DRAIN datagrams are queued first and then read out.
+
+Usage: python -m benchmarks.bench_transport [senders] [datagrams per sender]
+"""
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+
+from transport import RCVBUF, Transport
+from wire import RECV_BUFFER, Packer, Reassembler
+
+PORT = 47160
+BURST = 64  # Datagramme am Stück, dann kurz abgeben
+DRAIN = 4000
+
+
+def flood(index, count, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    packer = Packer()
+    datagrams = [packer.pack([{"type": "delta", "state": {f"sender{index:03d}": i + 1}}])[0]
+                 for i in range(count)]
+    for start in range(0, count, BURST):
+        for datagram in datagrams[start:start + BURST]:
+            sock.sendto(datagram, ("127.0.0.1", port))
+        time.sleep(0)
+
+
+class Receiver:
+    def __init__(self, mode, port):
+        self.mode = mode
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.reassembler = Reassembler()
+        if mode == "recvfrom":
+            self.transport = None
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.bind(("127.0.0.1", port))
+        else:
+            self.transport = Transport(port, "127.0.0.1", rcvbuf=RCVBUF if mode == "transport" else 0)
+            self.sock = self.transport.sock
+        threading.Thread(target=self.loop, daemon=True).start()
+
+    def loop(self):
+        while True:
+            try:
+                if self.transport is None:
+                    data, addr = self.sock.recvfrom(RECV_BUFFER)
+                    batch = [(data, addr)]
+                else:
+                    batch = self.transport.receive()
+            except OSError:
+                return
+            for data, addr in batch:
+                self.reassembler.feed(data, addr)
+            self.last = time.perf_counter()
+            if self.first is None:
+                self.first = self.last
+            self.count += len(batch)
+
+    def wait_idle(self):
+        last = -1
+        while self.count != last:
+            last = self.count
+            time.sleep(0.5)
+
+    def rate(self):
+        return self.count / max(self.last - self.first, 1e-9) if self.count else 0.0
+
+
+def drain(mode, port):
+    datagram = Packer().pack([{"type": "delta", "state": {"sender000": 1}}])[0]
+    transport = Transport(port, "127.0.0.1", rcvbuf=RCVBUF)
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for _ in range(DRAIN):
+        tx.sendto(datagram, ("127.0.0.1", port))
+    received = 0
+    start = time.perf_counter()
+    while received < DRAIN:
+        if mode == "recvfrom":
+            transport.sock.recvfrom(RECV_BUFFER)
+            received += 1
+        else:
+            received += len(transport.receive())
+    elapsed = time.perf_counter() - start
+    transport.close()
+    return elapsed / DRAIN
+
+
+def main():
+    senders = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    sent = senders * count
+
+    print(f"{senders} senders x {count} datagrams = {sent}")
+    print(f"{'mode':<14} {'rcvbuf':>9} {'received/s':>11} {'lost':>7} {'kernel drops':>13} {'per batch':>10}")
+    for offset, mode in enumerate(("recvfrom", "transport/def", "transport")):
+        receiver = Receiver(mode, PORT + offset)
+        rcvbuf = receiver.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        procs = [multiprocessing.Process(target=flood, args=(i, count, PORT + offset)) for i in range(senders)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        receiver.wait_idle()
+        if receiver.transport is not None:
+            stats = receiver.transport.stats()
+            drops = stats["kernel_drops"]
+            per_batch = f"{stats['received'] / max(stats['batches'], 1):.1f}"
+        else:
+            drops, per_batch = "-", "1.0"
+        receiver.sock.close()
+        print(f"{mode:<14} {rcvbuf:>9} {receiver.rate():>11.0f} {sent - receiver.count:>7} {drops:>13} {per_batch:>10}")
+
+    print(f"\n{DRAIN} queued datagrams")
+    print(f"{'mode':<14} {'us/datagram':>12}")
+    for offset, mode in enumerate(("recvfrom", "transport")):
+        cost = min(drain(mode, PORT + 10 + offset) for _ in range(3))
+        print(f"{mode:<14} {cost * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Throughput and loss of commit transfer over localhost UDP.
+
+"legacy" sends one JSON datagram per commit and receives with the old 576-byte
+buffer (oversized commits arrive truncated). "batched" uses wire.Packer /
+wire.Reassembler. `loss` drops that share of datagrams before sendto.
+
+Usage: python -m benchmarks.bench_wire [commits] [mtu]
+"""
+import json
+import random
+import socket
+import sys
+import threading
+import time
+
+from wire import RECV_BUFFER, Packer, Reassembler
+
+LEGACY_LIMIT = 576
+
+
+def commit_records(count, seed=1):
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        # Meist kurze Chatzeilen, ab und zu ein langer Text
+        length = rng.choice([20, 40, 80, 200, 1500])
+        records.append({
+            "type": "commit",
+            "author": f"user{i % 16}",
+            "author_time": "1715058000 +0000",
+            "message": "x" * length,
+            "parents": [f"{rng.getrandbits(160):040x}" for _ in range(rng.randint(1, 4))],
+            "tree": "4b825dc642cb6eb9a060e54bf8d69288fbee4904",
+        })
+    return records
+
+
+def receive(sock, mode, received, done, last_seen):
+    reassembler = Reassembler()
+    bufsize = LEGACY_LIMIT if mode == "legacy" else RECV_BUFFER
+    sock.settimeout(0.5)
+    while not done.is_set():
+        try:
+            data, addr = sock.recvfrom(bufsize)
+        except socket.timeout:
+            continue
+        try:
+            if mode == "legacy":
+                received.append(json.loads(data.decode("utf-8")))
+            else:
+                received.extend(reassembler.feed(data, addr))
+        except ValueError:
+            pass  # abgeschnittenes Datagramm
+        last_seen[0] = time.perf_counter()
+
+
+def run_case(mode, records, mtu, loss, rng):
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    rx.bind(("127.0.0.1", 0))
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    received = []
+    done = threading.Event()
+    last_seen = [0.0]
+    thread = threading.Thread(target=receive, args=(rx, mode, received, done, last_seen))
+    thread.start()
+
+    start = time.perf_counter()
+    if mode == "legacy":
+        datagrams = [json.dumps(r).encode() for r in records]
+    else:
+        datagrams = Packer(mtu).pack(records)
+    sent_bytes = 0
+    for datagram in datagrams:
+        sent_bytes += len(datagram)
+        if rng.random() < loss:
+            continue
+        tx.sendto(datagram, rx.getsockname())
+    # Warten bis der Empfänger nichts mehr bekommt
+    last = -1
+    while len(received) != last:
+        last = len(received)
+        time.sleep(0.2)
+    elapsed = last_seen[0] - start
+    done.set()
+    thread.join()
+    rx.close()
+    tx.close()
+
+    intact = sum(1 for r in received if r in records)
+    return len(datagrams), sent_bytes, intact, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    mtu = int(sys.argv[2]) if len(sys.argv) > 2 else 1400
+    records = commit_records(count)
+    rng = random.Random(2)
+
+    print(f"{count} commit records, batched MTU {mtu}")
+    print(f"{'mode':<8} {'loss':>5} {'datagrams':>10} {'kbytes':>8} {'delivered':>10} {'commits/s':>10}")
+    for loss in (0.0, 0.01, 0.05):
+        for mode in ("legacy", "batched"):
+            datagrams, sent_bytes, intact, elapsed = run_case(mode, records, mtu, loss, rng)
+            print(f"{mode:<8} {loss:>5.2f} {datagrams:>10} {sent_bytes / 1024:>8.0f} "
+                  f"{intact / count:>9.1%} {intact / max(elapsed, 1e-9):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,546 @@
+"""
+Multi-node simulation of the three chats on one machine.
+
+Starts N nodes of task1.py, task2.py or task3.py (built with start=False) and
+replaces their sockets with a Link that counts traffic and applies loss, delay
+and reordering. In the default mode all nodes run as threads of this process
+on a virtual network; with --processes every node runs in its own process and
+talks real UDP on 127.0.0.1 (one port per node, broadcasts go to every port).
+
+Each node posts --messages messages at seeded random times within --duration
+seconds. The run ends when every node has seen every message (or --timeout).
+Reports convergence latency, traffic, CPU time, git subprocesses and time spent
+in the hot paths (merge, get_missing_commits, receive_commit, ...), as a table
+or with --json as JSON (to a file or "-" for stdout) for regression tracking.
+
+Usage: python -m benchmarks.simulate [--impl task3] [--nodes 5] [--messages 5]
+           [--loss 0.1] [--delay 0.005] [--jitter 0.005] [--reorder 0.1]
+           [--interval 1] [--gossip digest] [--processes] [--json -]
+"""
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import queue
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+BROADCAST_HOSTS = ("<broadcast>", "255.255.255.255")
+BASE_PORT = 47200  # --processes: Knoten i lauscht auf BASE_PORT + i
+RECV_BUFFER = 65535
+RCVBUF = 4 * 1024 * 1024
+POLL = 0.05
+
+HOT_PATHS = {
+    "task1": ["handle", "handle_digest", "merge"],
+    "task2": ["handle", "handle_digest", "merge"],
+    "task3": ["handle_message", "get_missing_commits", "create_commit_packet", "receive_commit", "post_messages"],
+}
+
+RUN_CALLS = [0]  # git-Prozesse über utils.run (task3), pro Prozess
+
+
+class Impairment:
+    """
+    Decides per datagram and receiver whether it is lost and when it arrives.
+    """
+
+    def __init__(self, loss=0.0, delay=0.0, jitter=0.0, reorder=0.0, seed=None):
+        self.loss = loss
+        self.delay = delay
+        self.jitter = jitter
+        self.reorder = reorder
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.delivered = 0
+        self.dropped = 0
+        self.reordered = 0
+
+    def delay_for(self):
+        """
+        Seconds until delivery, or None if the datagram is lost.
+        """
+        with self.lock:
+            if self.rng.random() < self.loss:
+                self.dropped += 1
+                return None
+            self.delivered += 1
+            delay = self.delay + self.rng.uniform(0, self.jitter)
+            if self.reorder and self.rng.random() < self.reorder:
+                # Überholt werden: deutlich später zustellen als die Datagramme danach
+                self.reordered += 1
+                delay += self.rng.uniform(0, 4 * (self.delay + self.jitter) + 0.002)
+            return delay
+
+
+class Scheduler(threading.Thread):
+    """
+    Runs callbacks after a delay, in order of their due time.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.events = []
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.running = True
+
+    def at(self, delay, fn, *args):
+        if delay <= 0:
+            fn(*args)
+            return
+        with self.cond:
+            heapq.heappush(self.events, (time.monotonic() + delay, self.seq, fn, args))
+            self.seq += 1
+            self.cond.notify()
+
+    def run(self):
+        while self.running:
+            with self.cond:
+                while self.running and (not self.events or self.events[0][0] > time.monotonic()):
+                    self.cond.wait(self.events[0][0] - time.monotonic() if self.events else None)
+                if not self.running:
+                    return
+                _, _, fn, args = heapq.heappop(self.events)
+            try:
+                fn(*args)
+            except Exception as e:
+                print("Error in scheduled delivery:", e)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+
+class Link:
+    """
+    Stands in for chat.sock: counts what the node sends and hands every copy
+    to `transmit(data, src, dst)` after the impairment's delay.
+    """
+
+    def __init__(self, addr, peers, impairment, scheduler, transmit):
+        self.addr = addr
+        self.peers = [peer for peer in peers if peer != addr]
+        self.impairment = impairment
+        self.scheduler = scheduler
+        self.transmit = transmit
+        self.datagrams = 0
+        self.bytes = 0
+
+    def sendto(self, data, addr):
+        self.datagrams += 1
+        self.bytes += len(data)
+        targets = self.peers if addr[0] in BROADCAST_HOSTS else [addr]
+        for target in targets:
+            delay = self.impairment.delay_for()
+            if delay is not None:
+                self.scheduler.at(delay, self.transmit, data, self.addr, target)
+
+    def close(self):
+        pass
+
+
+def counted_run(run):
+    def wrapper(*args, **kwargs):
+        RUN_CALLS[0] += 1
+        return run(*args, **kwargs)
+    return wrapper
+
+
+class SimNode:
+    """
+    One chat built with start=False plus the calls the harness needs.
+    """
+
+    def __init__(self, impl, name, gossip, mtu):
+        self.impl = impl
+        self.name = name
+        self.timings = {}  # Hot Path -> [Aufrufe, Sekunden, max Sekunden]
+        if impl == "task1":
+            import task1
+            self.chat = task1.FrontierChat(name, 0, "<broadcast>", 3600, mtu, gossip, start=False,
+                                            headless=True)
+        elif impl == "task2":
+            import task2
+            self.chat = task2.FrontierChat(name, True, mtu, gossip, start=False, headless=True)
+        else:
+            import task3
+            if not hasattr(task3.run, "counted"):
+                task3.run = counted_run(task3.run)
+                task3.run.counted = True
+            # Das virtuelle Netz kennt kein TCP: kein Packfile-Sync (bulk.py)
+            self.chat = task3.GitbasedChat(name, True, mtu=mtu, gossip=gossip, start=False, headless=True,
+                                           bulk_threshold=0)
+        for path in HOT_PATHS[impl]:
+            setattr(self.chat, path, self.timed(path, getattr(self.chat, path)))
+        self.handler = self.chat.handle_message if impl == "task3" else self.chat.handle
+        self.spawned_at_start = self.spawned()
+        self.posted = 0
+        self.last_post = None
+
+    def timed(self, path, fn):
+        entry = self.timings.setdefault(path, [0, 0.0, 0.0])
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                entry[0] += 1
+                entry[1] += elapsed
+                entry[2] = max(entry[2], elapsed)
+        return wrapper
+
+    def attach(self, link):
+        self.chat.sock.close()
+        self.chat.sock = link
+        self.link = link
+
+    def receive(self, data, addr):
+        for message in self.chat.reassembler.feed(data, addr):
+            self.handler(message, addr)
+
+    def post(self):
+        if self.impl == "task3":
+            self.chat.post_message(f"{self.name} message {self.posted + 1}")
+        else:
+            self.chat.increment_own_count()
+        self.posted += 1
+        self.last_post = time.time()
+
+    def tick(self):
+        self.chat.broadcast()
+
+    def view(self):
+        if self.impl == "task3":
+            return self.chat.get_frontier_local()
+        with self.chat.lock:
+            return dict(self.chat.state)
+
+    def own(self):
+        return self.view().get(self.name, 0)
+
+    def spawned(self):
+        return self.chat.repo.spawned if self.impl == "task3" else 0
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "posted": self.posted,
+            "datagrams": self.link.datagrams,
+            "bytes": self.link.bytes,
+            "delivered": self.link.impairment.delivered,
+            "dropped": self.link.impairment.dropped,
+            "reordered": self.link.impairment.reordered,
+            "git_procs": self.spawned() - self.spawned_at_start,
+            "hot_paths": {path: list(entry) for path, entry in self.timings.items()},
+        }
+
+    def close(self):
+        self.chat.running = False
+        if self.impl != "task1":
+            self.chat.close()
+
+
+class NodeRunner:
+    """
+    Drives one node like its threads in the real chat would: posts at the
+    scripted times, broadcasts every interval and handles received datagrams.
+    """
+
+    def __init__(self, node, schedule, interval, receive):
+        self.node = node
+        self.schedule = schedule  # Sekunden nach Start, zu denen gepostet wird
+        self.interval = interval
+        self.receive = receive  # blockierende Funktion -> (data, addr) oder None
+        self.stopped = threading.Event()
+        self.done = False
+        self.errors = 0
+
+    def start(self, t0):
+        self.t0 = t0
+        for target in (self.drive, self.broadcast_loop, self.listen):
+            threading.Thread(target=target, daemon=True).start()
+
+    def drive(self):
+        for at in self.schedule:
+            if self.stopped.wait(max(0.0, self.t0 + at - time.time())):
+                return
+            self.call(self.node.post)
+        self.done = True
+
+    def broadcast_loop(self):
+        while not self.stopped.wait(self.interval):
+            self.call(self.node.tick)
+
+    def listen(self):
+        while not self.stopped.is_set():
+            item = self.receive()
+            if item is not None:
+                self.call(self.node.receive, *item)
+
+    def call(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception:
+            self.errors += 1
+
+    def poll(self):
+        return self.node.view(), self.node.own(), self.done, self.node.last_post
+
+    def stop(self):
+        self.stopped.set()
+        stats = self.node.stats()
+        stats["errors"] = self.errors
+        return stats
+
+
+def post_times(config, index):
+    rng = random.Random(config["seed"] * 1000 + index)
+    return sorted(rng.uniform(0, config["duration"]) for _ in range(config["messages"]))
+
+
+def impairment(config, index):
+    return Impairment(config["loss"], config["delay"], config["jitter"], config["reorder"],
+                      seed=config["seed"] * 1000 + index)
+
+
+# --- Alle Knoten als Threads in diesem Prozess ---
+
+class LocalNetwork:
+    def __init__(self, config):
+        self.config = config
+        self.scheduler = Scheduler()
+        self.scheduler.start()
+        self.addrs = [(f"10.0.0.{i + 1}", 6969) for i in range(config["nodes"])]
+        self.inboxes = {addr: queue.Queue() for addr in self.addrs}
+        self.runners = []
+        for i, addr in enumerate(self.addrs):
+            node = SimNode(config["impl"], f"node{i:03d}", config["gossip"], config["mtu"])
+            node.attach(Link(addr, self.addrs, impairment(config, i), self.scheduler, self.deliver))
+            inbox = self.inboxes[addr]
+            self.runners.append(NodeRunner(node, post_times(config, i), config["interval"],
+                                           lambda inbox=inbox: self.take(inbox)))
+
+    def deliver(self, data, src, dst):
+        inbox = self.inboxes.get(dst)
+        if inbox is not None:
+            inbox.put((data, src))
+
+    @staticmethod
+    def take(inbox):
+        try:
+            return inbox.get(timeout=0.2)
+        except queue.Empty:
+            return None
+
+    def start(self, t0):
+        for runner in self.runners:
+            runner.start(t0)
+
+    def poll(self):
+        return [runner.poll() for runner in self.runners]
+
+    def stop(self):
+        stats = [runner.stop() for runner in self.runners]
+        self.scheduler.stop()
+        for runner in self.runners:
+            runner.node.close()
+        return stats, {"cpu_s": time.process_time(), "run_calls": RUN_CALLS[0]}
+
+
+# --- Ein Prozess pro Knoten, echtes UDP auf 127.0.0.1 ---
+
+def worker(conn, config, index, workdir):
+    sys.stdout = open(os.devnull, "w")
+    os.chdir(workdir)
+    addrs = [("127.0.0.1", BASE_PORT + i) for i in range(config["nodes"])]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+    sock.bind(addrs[index])
+    sock.settimeout(0.2)
+    scheduler = Scheduler()
+    scheduler.start()
+    node = SimNode(config["impl"], f"node{index:03d}", config["gossip"], config["mtu"])
+    node.attach(Link(addrs[index], addrs, impairment(config, index), scheduler,
+                     lambda data, src, dst: sock.sendto(data, dst)))
+
+    def receive():
+        try:
+            return sock.recvfrom(RECV_BUFFER)
+        except socket.timeout:
+            return None
+
+    runner = NodeRunner(node, post_times(config, index), config["interval"], receive)
+    conn.send("ready")
+    while True:
+        command, arg = conn.recv()
+        if command == "start":
+            runner.start(arg)
+        elif command == "poll":
+            conn.send(runner.poll())
+        elif command == "stop":
+            stats = runner.stop()
+            scheduler.stop()
+            node.close()
+            stats["cpu_s"] = time.process_time()
+            stats["run_calls"] = RUN_CALLS[0]
+            conn.send(stats)
+            return
+
+
+class ProcessNetwork:
+    def __init__(self, config, workdir):
+        self.conns = []
+        self.procs = []
+        for i in range(config["nodes"]):
+            parent, child = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=worker, args=(child, config, i, workdir), daemon=True)
+            proc.start()
+            self.conns.append(parent)
+            self.procs.append(proc)
+        for conn in self.conns:
+            conn.recv()  # "ready"
+
+    def start(self, t0):
+        for conn in self.conns:
+            conn.send(("start", t0))
+
+    def poll(self):
+        for conn in self.conns:
+            conn.send(("poll", None))
+        return [conn.recv() for conn in self.conns]
+
+    def stop(self):
+        for conn in self.conns:
+            conn.send(("stop", None))
+        stats = [conn.recv() for conn in self.conns]
+        for proc in self.procs:
+            proc.join()
+        return stats, {"cpu_s": sum(s.pop("cpu_s") for s in stats),
+                       "run_calls": sum(s.pop("run_calls") for s in stats)}
+
+
+def converged(views, target):
+    return all(view.get(name, 0) >= count for view, _, _, _ in views for name, count in target.items())
+
+
+def simulate(config):
+    """
+    Run one simulation and return the results as a dict.
+    """
+    cwd = os.getcwd()
+    stdout = sys.stdout
+    workdir = tempfile.TemporaryDirectory()
+    os.chdir(workdir.name)  # frontiers/ und Temp-Repos nicht im Arbeitsverzeichnis anlegen
+    sys.stdout = open(os.devnull, "w")  # Ausgaben der Knoten
+    try:
+        cpu_before = time.process_time()
+        if config["processes"]:
+            network = ProcessNetwork(config, workdir.name)
+            cpu_before = 0.0
+        else:
+            network = LocalNetwork(config)
+        runs_before = RUN_CALLS[0]
+        t0 = time.time() + 0.2
+        network.start(t0)
+        deadline = t0 + config["duration"] + config["timeout"]
+        done_at = None
+        while time.time() < deadline:
+            time.sleep(POLL)
+            views = network.poll()
+            if not all(done for _, _, done, _ in views):
+                continue
+            target = {f"node{i:03d}": own for i, (_, own, _, _) in enumerate(views)}
+            if converged(views, target):
+                done_at = time.time()
+                break
+        last_post = max((last or t0) for _, _, _, last in views)
+        stats, process = network.stop()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        os.chdir(cwd)
+        workdir.cleanup()
+
+    hot_paths = {}
+    for node in stats:
+        for path, (calls, total, worst) in node.pop("hot_paths").items():
+            entry = hot_paths.setdefault(path, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["calls"] += calls
+            entry["total_ms"] += total * 1000
+            entry["max_ms"] = max(entry["max_ms"], worst * 1000)
+    runs = process["run_calls"] - (0 if config["processes"] else runs_before)
+    return {
+        "config": config,
+        "converged": done_at is not None,
+        "converge_s": round(done_at - last_post, 4) if done_at is not None else None,
+        "wire": {key: sum(node[key] for node in stats)
+                 for key in ("datagrams", "bytes", "delivered", "dropped", "reordered")},
+        "cpu_s": round(process["cpu_s"] - cpu_before, 4),
+        "git_procs": sum(node["git_procs"] for node in stats) + runs,
+        "errors": sum(node["errors"] for node in stats),
+        "hot_paths": {path: {k: round(v, 3) if isinstance(v, float) else v for k, v in entry.items()}
+                      for path, entry in hot_paths.items()},
+        "nodes": stats,
+    }
+
+
+def report(result):
+    config = result["config"]
+    mode = "processes" if config["processes"] else "threads"
+    print(f"{config['impl']}: {config['nodes']} nodes ({mode}), {config['messages']} messages each, "
+          f"loss {config['loss']}, delay {config['delay']}+{config['jitter']}s, reorder {config['reorder']}")
+    if result["converged"]:
+        print(f"  converged {result['converge_s']:.3f}s after the last post")
+    else:
+        print(f"  NOT converged within {config['timeout']}s")
+    wire = result["wire"]
+    print(f"  sent {wire['datagrams']} datagrams / {wire['bytes']} bytes, delivered {wire['delivered']}, "
+          f"dropped {wire['dropped']}, reordered {wire['reordered']}")
+    print(f"  cpu {result['cpu_s']:.2f}s, git processes {result['git_procs']}, errors {result['errors']}")
+    print(f"  {'hot path':<22} {'calls':>7} {'total ms':>10} {'max ms':>8}")
+    for path, entry in result["hot_paths"].items():
+        print(f"  {path:<22} {entry['calls']:>7} {entry['total_ms']:>10.1f} {entry['max_ms']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate several chat nodes on one machine")
+    parser.add_argument("--impl", choices=sorted(HOT_PATHS), default="task3")
+    parser.add_argument("--nodes", type=int, default=5)
+    parser.add_argument("--messages", type=int, default=5, help="Messages posted per node")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds over which messages are posted")
+    parser.add_argument("--interval", type=float, default=1.0, help="Broadcast interval in seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="Probability a datagram is lost")
+    parser.add_argument("--delay", type=float, default=0.001, help="Base delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra delay in seconds")
+    parser.add_argument("--reorder", type=float, default=0.0, help="Probability a datagram is held back")
+    parser.add_argument("--gossip", choices=["digest", "full"], default="digest")
+    parser.add_argument("--mtu", type=int, default=576)
+    parser.add_argument("--processes", action="store_true", help="One process per node, UDP on 127.0.0.1")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for convergence")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the result as JSON to this file ('-' for stdout)")
+    config = vars(parser.parse_args())
+    output = config.pop("json")
+
+    result = simulate(config)
+    if output == "-":
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    else:
+        report(result)
+        if output:
+            with open(output, "w") as f:
+                json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
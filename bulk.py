@@ -0,0 +1,186 @@
+import json
+import secrets
+import socket
+import subprocess
+import threading
+import time
+
+from metrics import GIT_SECONDS
+import chatlog
+
+BULK_THRESHOLD = 500  # fehlende Commits, ab denen ein Packfile über TCP statt UDP-Paketen geht
+OFFER_TIMEOUT = 30  # Sekunden, die ein Angebot gültig ist
+CHUNK = 64 * 1024
+
+log = chatlog.get("bulk")
+
+
+def _git(command, cwd, stdin=None, stdout=None):
+    return subprocess.Popen(command, stdin=stdin, stdout=stdout, cwd=cwd)
+
+
+class BulkServer:
+    """
+    Sends large sets of missing commits as one packfile over TCP.
+
+    offer() registers the commits under a random token and returns a "bulk"
+    record for the peer, naming the TCP port. The peer connects, sends the
+    token and gets one JSON header line (newest commit per author, commits on
+    the shallow boundary, history snapshot if any) followed by the output of
+    `git pack-objects` for exactly these commits. Offers are single use and
+    only valid for the address they were made to; a peer that is busy with
+    another pack hands its offer back with release().
+    """
+
+    def __init__(self, repo, index, host="", port=0, timeout=OFFER_TIMEOUT):
+        self.repo = repo
+        self.index = index
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.offers = {}  # token -> (Adresse, Hashes, Snapshot, Ablaufzeit)
+        self.peers = {}  # Adresse -> token des offenen Angebots
+        self.server = socket.create_server((host, port))
+        self.port = self.server.getsockname()[1]
+        self.running = True
+        # Metriken
+        self.offered = 0
+        self.served = 0
+        self.commits = 0
+        self.bytes = 0
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def offer(self, addr, hashes, snapshot=None):
+        """
+        Offer `hashes` (parents before children) to the peer at `addr`. Returns
+        the record to send, or None while an earlier offer is still open.
+        """
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            if addr in self.peers:
+                return None
+            token = secrets.token_hex(16)
+            self.offers[token] = (addr, hashes, snapshot, now + self.timeout)
+            self.peers[addr] = token
+            self.offered += 1
+        return {"type": "bulk", "port": self.port, "token": token, "commits": len(hashes)}
+
+    def release(self, addr, token):
+        """
+        Withdraw an offer the peer at `addr` declined, so the next request
+        from it is answered right away.
+        """
+        with self.lock:
+            offer = self.offers.get(token)
+            if offer is None or offer[0] != addr:
+                return False
+            del self.offers[token]
+            self.peers.pop(addr, None)
+            return True
+
+    def _expire(self, now):
+        for token, (addr, _, _, expires) in list(self.offers.items()):
+            if expires < now:
+                del self.offers[token]
+                self.peers.pop(addr, None)
+
+    def accept_loop(self):
+        while self.running:
+            try:
+                conn, peer = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.serve, args=(conn, peer), daemon=True).start()
+
+    def serve(self, conn, peer):
+        with conn:
+            conn.settimeout(self.timeout)
+            try:
+                token = conn.makefile("rb").readline().decode("ascii").strip()
+                with self.lock:
+                    offer = self.offers.get(token)
+                    if offer is None or offer[0][0] != peer[0]:
+                        log.warning("Rejected bulk connection from %s", peer)
+                        return
+                    del self.offers[token]
+                    self.peers.pop(offer[0], None)
+                _, hashes, snapshot, _ = offer
+                conn.sendall(json.dumps(self.header(hashes, snapshot)).encode("utf-8") + b"\n")
+                sent = self.send_pack(conn, hashes)
+            except (OSError, RuntimeError) as e:
+                log.warning("Bulk transfer to %s failed: %s", peer, e)
+                return
+            self.served += 1
+            self.commits += len(hashes)
+            self.bytes += sent
+            log.info("Sent %d commits as a %d byte pack to %s", len(hashes), sent, peer)
+
+    def header(self, hashes, snapshot):
+        tips = {}
+        shallow = []
+        for sha in hashes:
+            tips[self.index.author(sha)] = sha  # Eltern vor Kindern: der letzte ist der neueste
+            if any(self.index.pruned(parent) for parent in self.index.parents(sha)):
+                shallow.append(sha)
+        header = {"tips": tips, "shallow": shallow, "commits": len(hashes)}
+        if snapshot is not None:
+            header["snapshot"] = snapshot
+        return header
+
+    def send_pack(self, conn, hashes):
+        start = time.perf_counter()
+        proc = _git(["git", "pack-objects", "--stdout", "-q"], self.repo.cwd,
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        try:
+            # pack-objects liest erst alle Namen und schreibt dann
+            proc.stdin.write("".join(f"{sha}\n" for sha in hashes).encode("ascii"))
+            proc.stdin.close()
+            sent = 0
+            while chunk := proc.stdout.read(CHUNK):
+                conn.sendall(chunk)
+                sent += len(chunk)
+        finally:
+            proc.stdout.close()
+            code = proc.wait()
+            GIT_SECONDS.observe(time.perf_counter() - start, "pack-objects")
+        if code:
+            raise RuntimeError(f"git pack-objects exited with {code}")
+        return sent
+
+    def stats(self):
+        return {
+            "offered": self.offered,
+            "served": self.served,
+            "commits": self.commits,
+            "bytes": self.bytes,
+        }
+
+    def close(self):
+        self.running = False
+        self.server.close()
+
+
+def fetch_pack(cwd, addr, port, token, timeout=OFFER_TIMEOUT):
+    """
+    Fetch an offered pack from the peer at (addr, port) into the repository
+    at `cwd` with `git index-pack`. Returns the header.
+    """
+    with socket.create_connection((addr, port), timeout=timeout) as conn:
+        conn.sendall(token.encode("ascii") + b"\n")
+        stream = conn.makefile("rb")
+        line = stream.readline()
+        if not line:
+            raise RuntimeError("peer closed the connection before the header")
+        header = json.loads(line)
+        start = time.perf_counter()
+        proc = _git(["git", "index-pack", "--stdin"], cwd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+        try:
+            while chunk := stream.read(CHUNK):
+                proc.stdin.write(chunk)
+        finally:
+            proc.stdin.close()
+            code = proc.wait()
+            GIT_SECONDS.observe(time.perf_counter() - start, "index-pack")
+        if code:
+            raise RuntimeError(f"git index-pack exited with {code}")
+    return header
@@ -0,0 +1,327 @@
+import heapq
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+import chatlog
+
+WORKERS = 4
+WINDOW = 64  # unbestätigte Commits pro Peer
+RATE = 1000  # Commits pro Sekunde und Peer
+RTO = 0.5  # Sekunden bis ein unbestätigter Commit erneut gesendet wird
+MAX_RETRIES = 5  # danach holt ihn der nächste Frontier-Abgleich
+ACK_DELAY = 0.02  # Sekunden, in denen Bestätigungen gesammelt werden
+
+log = chatlog.get("catchup")
+
+
+class Session:
+    """
+    Commits one peer is missing, sent in order. `windowed` sessions keep at most
+    `window` unacknowledged commits in flight and resend them after a timeout;
+    peers that do not send acks get every commit once.
+    """
+
+    def __init__(self, sid, addr, hashes, windowed, burst):
+        self.sid = sid
+        self.addr = addr
+        self.windowed = windowed
+        self.queue = deque(hashes)  # noch nicht gesendet
+        self.known = set(hashes)  # gesendet oder in der Queue, gegen doppelte Anfragen
+        self.inflight = OrderedDict()  # n -> [hash, gesendet um, Versuche]
+        self.next_n = 0
+        self.tokens = burst
+        self.stamp = time.monotonic()
+        self.due_at = None  # eingeplant für diesen Zeitpunkt
+        self.busy = False  # wird gerade von einem Worker bedient
+        self.again = False  # während busy angestoßen (Ack, neue Anfrage)
+
+    def extend(self, hashes):
+        new = [sha for sha in hashes if sha not in self.known]
+        self.known.update(new)
+        self.queue.extend(new)
+        return len(new)
+
+    def done(self):
+        return not self.queue and not self.inflight
+
+
+class CatchupServer:
+    """
+    Sends missing commits to requesting peers from a small worker pool, so the
+    listener thread only queues the request and goes back to receiving.
+
+    There is one session per peer address; a new request from a peer that is
+    still being served only adds the commits that are not in its session yet.
+    Commit packets are built once and shared while several sessions need them.
+    Each session is rate limited (token bucket) and, if the peer sends acks,
+    windowed with retransmission of commits that were not acknowledged.
+    """
+
+    def __init__(self, build, send, workers=WORKERS, window=WINDOW, rate=RATE,
+                 rto=RTO, max_retries=MAX_RETRIES):
+        self.build = build  # hash -> Commit-Record
+        self.send = send  # (records, addr)
+        self.window = window
+        self.rate = rate
+        self.rto = rto
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.sessions = {}  # addr -> Session
+        self.due = []  # (Zeitpunkt, seq, addr)
+        self.seq = 0
+        self.records = {}  # hash -> [Record, Anzahl Sessions, die ihn brauchen]
+        self.running = True
+        # Metriken
+        self.requests = 0
+        self.merged = 0
+        self.sent = 0
+        self.resent = 0
+        self.acked = 0
+        self.given_up = 0
+        self.threads = [threading.Thread(target=self.worker, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def request(self, addr, hashes, windowed=False):
+        """
+        Queue `hashes` (parents before children) for the peer at `addr`.
+        """
+        if not hashes:
+            return
+        with self.lock:
+            self.requests += 1
+            session = self.sessions.get(addr)
+            if session is not None:
+                self.merged += 1
+                before = len(session.queue)
+                session.extend(hashes)
+                self._hold(list(session.queue)[before:])
+            else:
+                session = Session(random.getrandbits(31), addr, hashes, windowed, self.window)
+                self.sessions[addr] = session
+                self._hold(hashes)
+            self._schedule(session, 0)
+
+    def ack(self, addr, sid, upto, ns):
+        with self.lock:
+            session = self.sessions.get(addr)
+            if session is None or session.sid != sid:
+                return
+            acked = [n for n in session.inflight if n < upto]
+            acked.extend(n for n in ns if n >= upto)
+            for n in acked:
+                entry = session.inflight.pop(n, None)
+                if entry is not None:
+                    self.acked += 1
+                    self._release(entry[0])
+            self._schedule(session, 0)
+
+    def _hold(self, hashes):
+        for sha in hashes:
+            entry = self.records.setdefault(sha, [None, 0])
+            entry[1] += 1
+
+    def _release(self, sha):
+        entry = self.records.get(sha)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self.records[sha]
+
+    def _schedule(self, session, delay):
+        if session.busy:
+            session.again = True
+            return
+        at = time.monotonic() + delay
+        if session.due_at is not None and session.due_at <= at:
+            return
+        session.due_at = at
+        heapq.heappush(self.due, (at, self.seq, session.addr))
+        self.seq += 1
+        self.cond.notify()
+
+    def worker(self):
+        while True:
+            with self.lock:
+                session = self._next_session()
+                if session is None:
+                    return
+                batch = self._take(session)
+            records = []
+            for n, sha in batch:
+                record = self._record(sha)
+                if record is not None:
+                    # | statt {**record}: behält die kodierten Felder (codec.EncodedCommit)
+                    records.append(record | {"session": session.sid, "n": n} if session.windowed else record)
+            if records:
+                self.send(records, session.addr)
+            with self.lock:
+                self._finish(session, batch)
+
+    def _next_session(self):
+        while self.running:
+            if self.due and self.due[0][0] <= time.monotonic():
+                at, _, addr = heapq.heappop(self.due)
+                session = self.sessions.get(addr)
+                if session is None or session.due_at != at:
+                    continue  # erledigt oder inzwischen früher eingeplant
+                session.due_at = None
+                session.busy = True
+                return session
+            self.cond.wait(self.due[0][0] - time.monotonic() if self.due else None)
+        return None
+
+    def _take(self, session):
+        """
+        Pick what to send now: timed out commits first, then new ones, limited by
+        window and tokens.
+        """
+        now = time.monotonic()
+        session.tokens = min(self.window, session.tokens + (now - session.stamp) * self.rate)
+        session.stamp = now
+        batch = []
+        for n, entry in list(session.inflight.items()):
+            if session.tokens < 1 or now - entry[1] < self.rto:
+                break
+            if entry[2] >= self.max_retries:
+                del session.inflight[n]
+                session.known.discard(entry[0])  # darf wieder angefragt werden
+                self.given_up += 1
+                self._release(entry[0])
+                continue
+            # Ans Ende, damit inflight nach Sendezeit sortiert bleibt
+            del session.inflight[n]
+            session.inflight[n] = [entry[0], now, entry[2] + 1]
+            batch.append((n, entry[0]))
+            session.tokens -= 1
+            self.resent += 1
+        while session.queue and session.tokens >= 1 and \
+                (not session.windowed or len(session.inflight) < self.window):
+            sha = session.queue.popleft()
+            n = session.next_n
+            session.next_n += 1
+            if session.windowed:
+                session.inflight[n] = [sha, now, 0]
+            batch.append((n, sha))
+            session.tokens -= 1
+            self.sent += 1
+        return batch
+
+    def _record(self, sha):
+        with self.lock:
+            entry = self.records.get(sha)
+            if entry is not None and entry[0] is not None:
+                return entry[0]
+        try:
+            record = self.build(sha)  # außerhalb des Locks: liest aus dem Repo
+        except Exception as e:
+            log.warning("Failed to read commit %s: %s", sha, e)
+            return None
+        with self.lock:
+            entry = self.records.get(sha)
+            if entry is not None:
+                entry[0] = record
+        return record
+
+    def _finish(self, session, batch):
+        session.busy = False
+        if not session.windowed:
+            # Ohne Acks ist ein gesendeter Commit erledigt
+            for _, sha in batch:
+                self._release(sha)
+        if session.done():
+            if self.sessions.get(session.addr) is session:
+                del self.sessions[session.addr]
+            return
+        now = time.monotonic()
+        waits = [0.0] if session.again else []
+        session.again = False
+        if session.queue and (not session.windowed or len(session.inflight) < self.window):
+            waits.append(max(0.0, (1 - session.tokens) / self.rate))
+        if session.inflight:
+            oldest = next(iter(session.inflight.values()))
+            waits.append(max(0.0, oldest[1] + self.rto - now, (1 - session.tokens) / self.rate))
+        if waits:
+            self._schedule(session, min(waits))
+
+    def stats(self):
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "requests": self.requests,
+                "merged": self.merged,
+                "sent": self.sent,
+                "resent": self.resent,
+                "acked": self.acked,
+                "given_up": self.given_up,
+            }
+
+    def close(self):
+        with self.lock:
+            self.running = False
+            self.cond.notify_all()
+
+
+class AckBatcher:
+    """
+    Acknowledges received session commits, collected for at most ACK_DELAY
+    seconds or until half a window has arrived. Every ack is cumulative
+    ("upto": all numbers below it arrived) plus the numbers received out of
+    order, so a lost ack is made good by the next one.
+    """
+
+    def __init__(self, send, delay=ACK_DELAY, batch=WINDOW // 2, sessions=64):
+        self.send = send  # (records, addr)
+        self.delay = delay
+        self.batch = batch
+        self.sessions = sessions
+        self.lock = threading.Lock()
+        self.state = OrderedDict()  # (addr, session) -> [upto, {n außer der Reihe}, neue seit letztem Ack]
+        self.timer = None
+
+    def received(self, addr, sid, n):
+        key = (addr, sid)
+        with self.lock:
+            entry = self.state.get(key)
+            if entry is None:
+                entry = self.state[key] = [0, set(), 0]
+                if len(self.state) > self.sessions:
+                    self.state.popitem(last=False)
+            self.state.move_to_end(key)
+            if n >= entry[0]:
+                entry[1].add(n)
+                while entry[0] in entry[1]:
+                    entry[1].remove(entry[0])
+                    entry[0] += 1
+            entry[2] += 1
+            if entry[2] >= self.batch:
+                record = self._ack(sid, entry)
+            else:
+                record = None
+                if self.timer is None:
+                    self.timer = threading.Timer(self.delay, self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+        if record is not None:
+            self.send([record], addr)
+
+    def _ack(self, sid, entry):
+        entry[2] = 0
+        # Höchstens ein paar Fenster voll, ältere Lücken holt die Retransmission
+        return {"type": "ack", "session": sid, "upto": entry[0], "ns": sorted(entry[1])[:4 * WINDOW]}
+
+    def flush(self):
+        with self.lock:
+            self.timer = None
+            acks = [(addr, self._ack(sid, entry)) for (addr, sid), entry in self.state.items() if entry[2]]
+        for addr, record in acks:
+            self.send([record], addr)
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
@@ -0,0 +1,163 @@
+import atexit
+import json
+import queue
+import sys
+import threading
+import time
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = ("debug", "info", "warning", "error")
+LOG_LEVEL = "warning"
+LOG_RATE = 20  # Zeilen pro Sekunde und Meldungstext, darüber wird zusammengefasst
+FORMATS = ("text", "json")
+
+_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+class Logger:
+    """
+    Named logger of the chat modules. Calls below the configured level return
+    after one comparison; the others put (time, level, name, template, args)
+    on the writer's queue, and %-formatting happens on the writer thread.
+    Arguments must therefore not be changed after logging (pass copies).
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def debug(self, msg, *args):
+        if _writer.level <= DEBUG:
+            _writer.emit(DEBUG, self.name, msg, args)
+
+    def info(self, msg, *args):
+        if _writer.level <= INFO:
+            _writer.emit(INFO, self.name, msg, args)
+
+    def warning(self, msg, *args):
+        if _writer.level <= WARNING:
+            _writer.emit(WARNING, self.name, msg, args)
+
+    def error(self, msg, *args):
+        _writer.emit(ERROR, self.name, msg, args)
+
+
+class _Writer:
+    """
+    Level, rate limit and writer thread shared by all loggers. Before setup()
+    warnings and errors are written directly to stderr, like the prints were.
+    """
+
+    def __init__(self):
+        self.level = WARNING
+        self.rate = 0
+        self.stream = sys.stderr
+        self.format = "text"
+        self.queue = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.buckets = {}  # (Logger, Vorlage) -> [Tokens, Zeitpunkt, unterdrückt]
+
+    def emit(self, level, name, msg, args):
+        suppressed = 0
+        if self.rate:
+            suppressed = self._admit(name, msg)
+            if suppressed is None:
+                return
+        record = (time.time(), level, name, msg, args, suppressed)
+        if self.queue is not None:
+            self.queue.put(record)
+        else:
+            self.write(record)
+            self.stream.flush()
+
+    def _admit(self, name, msg):
+        """
+        Token bucket per message template; None if the record is dropped, else
+        the number dropped since the last one that passed.
+        """
+        key = (name, msg)
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [self.rate, now, 0]
+            bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return None
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+            return suppressed
+
+    def write(self, record):
+        stamp, level, name, msg, args, suppressed = record
+        try:
+            text = msg % args if args else msg
+        except Exception as e:
+            text = f"{msg!r} {args!r} (bad log arguments: {e})"
+        if self.format == "json":
+            entry = {"ts": round(stamp, 6), "level": _NAMES[level].lower(), "logger": name, "msg": text}
+            if suppressed:
+                entry["suppressed"] = suppressed
+            line = json.dumps(entry)
+        else:
+            clock = time.strftime("%H:%M:%S", time.localtime(stamp))
+            line = f"{clock}.{int(stamp % 1 * 1000):03d} {_NAMES[level]:<7} {name}: {text}"
+            if suppressed:
+                line += f" ({suppressed} similar suppressed)"
+        self.stream.write(line + "\n")
+
+    def run(self):
+        records = self.queue
+        while True:
+            record = records.get()
+            # Alles Anstehende schreiben, dann einmal flushen
+            while record is not None:
+                self.write(record)
+                try:
+                    record = records.get_nowait()
+                except queue.Empty:
+                    break
+            self.stream.flush()
+            if record is None:
+                return
+
+
+_writer = _Writer()
+
+
+def get(name):
+    """
+    Logger for a chat module, e.g. get("task3").
+    """
+    return Logger(name)
+
+
+def setup(level=LOG_LEVEL, rate=LOG_RATE, stream=None, format="text"):
+    """
+    Set the level, the rate limit (lines per second and message template, 0
+    for none) and the output, and start the writer thread.
+    """
+    shutdown()
+    _writer.level = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}[level]
+    _writer.rate = rate
+    _writer.format = format
+    _writer.stream = stream if stream is not None else sys.stderr
+    _writer.buckets = {}
+    _writer.queue = queue.SimpleQueue()
+    _writer.thread = threading.Thread(target=_writer.run, daemon=True)
+    _writer.thread.start()
+    atexit.register(shutdown)
+
+
+def shutdown():
+    """
+    Write the queued records and stop the writer thread.
+    """
+    if _writer.queue is None:
+        return
+    _writer.queue.put(None)
+    _writer.thread.join()
+    _writer.queue = None
+    _writer.thread = None
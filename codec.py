@@ -0,0 +1,441 @@
+import json
+import re
+import struct
+
+MAGIC = 0xC5  # erstes Byte eines Binärpakets, JSON beginnt immer mit "{" oder "["
+VERSION = 3  # Version 2 ist das JSON-Protokoll aus wire.py
+
+# Paket-Arten (drittes Byte)
+RECORDS = 0
+FRAGMENT = 1
+
+# Record-Arten
+STATE = 1  # {user: count} aus task1/task2
+FRONTIER = 2  # {"type": "frontier", "from": ..., "frontier": {...}} aus task3
+COMMIT = 3  # {"type": "commit", ...} aus task3
+JSON = 4  # alles andere, als JSON eingebettet
+DIGEST = 5  # {"type": "digest", "version": ..., "buckets": [...]} aus gossip.py
+DELTA = 6  # {"type": "delta", "state": {...}, "buckets": [...]} aus gossip.py
+# Erweiterungen; ältere Decoder lehnen nur Pakete ab, die sie enthalten
+FRONTIER_EX = 7  # Frontier mit "buckets", "acks", "bulk" und/oder "partial" (Catch-up mit Bestätigungen, per TCP, ohne archivierte Autoren)
+SESSION_COMMIT = 8  # Commit mit "session" und "n" (catchup.py)
+ACK = 9  # {"type": "ack", "session": ..., "upto": ..., "ns": [...]}
+
+COMMIT_KEYS = {"type", "author", "author_time", "message", "parents", "tree"}
+RAW_DATE = re.compile(r"^(\d+) ([+-])(\d{2})(\d{2})$")
+
+# Feste Teile als vorkompilierte Layouts, Zahlenreihen als gepackte Arrays:
+# so läuft pro Record kaum eine Python-Schleife pro Feld
+COMMIT_HEAD = struct.Struct("<QH20sB")  # Epoch, Offset in Minuten * 2 + Vorzeichen, Tree, Anzahl Eltern
+LENGTH = struct.Struct("<I")
+WIDTHS = ((0xFF, "B"), (0xFFFF, "H"), (0xFFFFFFFF, "I"), (0xFFFFFFFFFFFFFFFF, "Q"))  # Breitencode -> Grenze, Format
+
+
+def put_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def get_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def put_bytes(out, value):
+    put_varint(out, len(value))
+    out += value
+
+
+def get_bytes(data, pos):
+    length, pos = get_varint(data, pos)
+    if pos + length > len(data):
+        raise ValueError("truncated packet")
+    return bytes(data[pos:pos + length]), pos + length
+
+
+def varint_size(value):
+    size = 1
+    while value > 0x7F:
+        value >>= 7
+        size += 1
+    return size
+
+
+class Names:
+    """
+    Username table of one packet: every name is written once, records refer to it by index.
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.size = 0  # Bytes der Tabelleneinträge
+
+    def ref(self, name):
+        if name not in self.index:
+            self.index[name] = len(self.index)
+            length = len(name.encode("utf-8"))
+            self.size += varint_size(length) + length
+        return self.index[name]
+
+    def truncate(self, count):
+        for name in list(self.index)[count:]:
+            del self.index[name]
+            length = len(name.encode("utf-8"))
+            self.size -= varint_size(length) + length
+
+
+class EncodedCommit(dict):
+    """
+    Commit record that carries its encoded fields (everything after the author),
+    so packing it again and again skips that part. `record | {...}` keeps them.
+    """
+
+    __slots__ = ("fields",)
+
+    def __init__(self, record, fields=None):
+        super().__init__(record)
+        self.fields = fields if fields is not None else commit_fields(record)
+
+    def __or__(self, other):
+        return EncodedCommit({**self, **other}, self.fields)
+
+
+def commit_fields(record):
+    """
+    Encoded author time, tree, parents and message of a commit record. Raises
+    ValueError if the hashes or the author time would not decode unchanged.
+    """
+    time = RAW_DATE.match(record["author_time"])
+    if time is None:
+        raise ValueError(f"not a raw git date: {record['author_time']!r}")
+    epoch, sign, hours, minutes = time.groups()
+    offset = int(hours) * 60 + int(minutes)
+    tree = bytes.fromhex(record["tree"])
+    parents = record["parents"]
+    joined = "".join(parents)
+    hashes = bytes.fromhex(joined)
+    # Nur 40 Zeichen lange Hashes in Kleinbuchstaben kommen unverändert zurück
+    if len(tree) != 20 or tree.hex() != record["tree"] or hashes.hex() != joined \
+            or set(map(len, parents)) - {40}:
+        raise ValueError("not a SHA-1 in lowercase hex")
+    message = record["message"].encode("utf-8")
+    # Vorzeichen im untersten Bit, damit "-0000" erhalten bleibt
+    head = COMMIT_HEAD.pack(int(epoch), offset * 2 + (sign == "-"), tree, len(parents))
+    return head + hashes + LENGTH.pack(len(message)) + message
+
+
+def _kind(record):
+    # Zahlen, Namen und Hashes prüft erst das Kodieren (siehe _encode_record)
+    kind = record.get("type")
+    if kind is None:
+        return STATE
+    if kind == "frontier" and {"type", "from", "frontier"} <= set(record) \
+            and set(record) <= {"type", "from", "frontier", "buckets", "acks", "bulk", "partial"}:
+        return FRONTIER if len(record) == 3 else FRONTIER_EX
+    if kind == "commit" and set(record) - {"session", "n"} == COMMIT_KEYS:
+        return COMMIT if len(record) == len(COMMIT_KEYS) else SESSION_COMMIT
+    if kind == "ack" and set(record) == {"type", "session", "upto", "ns"}:
+        return ACK
+    if kind == "digest" and set(record) <= {"type", "from", "version", "buckets"} \
+            and {"version", "buckets"} <= set(record):
+        return DIGEST
+    if kind == "delta" and set(record) <= {"type", "state", "buckets"} and "state" in record:
+        return DELTA
+    return JSON
+
+
+def _put_ints(out, values):
+    """
+    Non-negative integers as one little-endian array of the narrowest width
+    that holds the largest: count, width code, values.
+    """
+    values = list(values)
+    put_varint(out, len(values))
+    if not values:
+        return
+    top = max(values)
+    for code, (limit, fmt) in enumerate(WIDTHS):
+        if top <= limit:
+            break
+    else:
+        raise OverflowError("integer too large")
+    out.append(code)
+    out += struct.pack(f"<{len(values)}{fmt}", *values)
+
+
+def _get_ints(data, pos):
+    n, pos = get_varint(data, pos)
+    if not n:
+        return [], pos
+    fmt = WIDTHS[data[pos]][1]
+    values = struct.unpack_from(f"<{n}{fmt}", data, pos + 1)
+    return list(values), pos + 1 + struct.calcsize(fmt) * n
+
+
+def _put_counts(out, counts):
+    # Namen als ein Block, durch NUL getrennt (in Benutzernamen nicht erlaubt)
+    _put_ints(out, counts.values())
+    if counts:
+        names = "\0".join(counts).encode("utf-8")
+        if names.count(0) != len(counts) - 1:
+            raise ValueError("NUL in username")
+        put_bytes(out, names)
+
+
+def _get_counts(data, pos):
+    values, pos = _get_ints(data, pos)
+    if not values:
+        return {}, pos
+    names, pos = get_bytes(data, pos)
+    names = names.decode("utf-8").split("\0")
+    if len(names) != len(values):
+        raise ValueError("count map does not match its names")
+    return dict(zip(names, values)), pos
+
+
+def _encode_record(out, names, record):
+    mark = len(out)
+    known = len(names.index)
+    try:
+        _encode_fields(out, names, record, _kind(record))
+    except (struct.error, TypeError, ValueError, OverflowError):
+        # z.B. negative oder zu große Zahlen, Zahlen, die keine sind: als JSON einbetten
+        del out[mark:]
+        names.truncate(known)
+        _encode_fields(out, names, record, JSON)
+
+
+def _encode_fields(out, names, record, kind):
+    out.append(kind)
+    if kind == STATE:
+        _put_counts(out, record)
+    elif kind == FRONTIER:
+        put_varint(out, names.ref(record["from"]))
+        _put_counts(out, record["frontier"])
+    elif kind == FRONTIER_EX:
+        put_varint(out, names.ref(record["from"]))
+        _put_counts(out, record["frontier"])
+        out.append(("buckets" in record) | bool(record.get("acks")) << 1 | bool(record.get("bulk")) << 2
+                   | bool(record.get("partial")) << 3)
+        if "buckets" in record:
+            _put_ints(out, record["buckets"])
+    elif kind == ACK:
+        put_varint(out, record["session"])
+        put_varint(out, record["upto"])
+        _put_ints(out, record["ns"])
+    elif kind in (COMMIT, SESSION_COMMIT):
+        if kind == SESSION_COMMIT:
+            put_varint(out, record["session"])
+            put_varint(out, record["n"])
+        put_varint(out, names.ref(record["author"]))
+        # Leere Felder: nicht binär kodierbar (packet_cache.py), commit_fields() wirft
+        out += getattr(record, "fields", None) or commit_fields(record)
+    elif kind == DIGEST:
+        has_from = "from" in record
+        out.append(has_from)
+        if has_from:
+            put_varint(out, names.ref(record["from"]))
+        put_varint(out, record["version"])
+        buckets = record["buckets"]
+        put_varint(out, len(buckets))
+        out += struct.pack(f">{len(buckets)}I", *buckets)
+    elif kind == DELTA:
+        has_buckets = "buckets" in record
+        out.append(has_buckets)
+        _put_counts(out, record["state"])
+        if has_buckets:
+            _put_ints(out, record["buckets"])
+    else:
+        put_bytes(out, json.dumps(record, separators=(",", ":")).encode("utf-8"))
+
+
+def _decode_record(data, pos, table):
+    kind = data[pos]
+    pos += 1
+    if kind == STATE:
+        return _get_counts(data, pos)
+    if kind == FRONTIER:
+        idx, pos = get_varint(data, pos)
+        frontier, pos = _get_counts(data, pos)
+        return {"type": "frontier", "from": table[idx], "frontier": frontier}, pos
+    if kind == FRONTIER_EX:
+        idx, pos = get_varint(data, pos)
+        frontier, pos = _get_counts(data, pos)
+        record = {"type": "frontier", "from": table[idx], "frontier": frontier}
+        flags = data[pos]
+        pos += 1
+        if flags & 1:
+            record["buckets"], pos = _get_ints(data, pos)
+        if flags & 2:
+            record["acks"] = True
+        if flags & 4:
+            record["bulk"] = True
+        if flags & 8:
+            record["partial"] = True
+        return record, pos
+    if kind == ACK:
+        session, pos = get_varint(data, pos)
+        upto, pos = get_varint(data, pos)
+        ns, pos = _get_ints(data, pos)
+        return {"type": "ack", "session": session, "upto": upto, "ns": ns}, pos
+    if kind in (COMMIT, SESSION_COMMIT):
+        session = None
+        if kind == SESSION_COMMIT:
+            session, pos = get_varint(data, pos)
+            number, pos = get_varint(data, pos)
+        idx, pos = get_varint(data, pos)
+        epoch, offset, tree, n = COMMIT_HEAD.unpack_from(data, pos)
+        pos += COMMIT_HEAD.size
+        sign = "-" if offset & 1 else "+"
+        offset >>= 1
+        hexed = data[pos:pos + 20 * n].hex()
+        parents = [hexed[i:i + 40] for i in range(0, 40 * n, 40)]
+        pos += 20 * n
+        length, = LENGTH.unpack_from(data, pos)
+        pos += LENGTH.size
+        message = bytes(data[pos:pos + length])
+        if len(message) != length:
+            raise ValueError("truncated packet")
+        pos += length
+        record = {
+            "type": "commit",
+            "author": table[idx],
+            "author_time": f"{epoch} {sign}{offset // 60:02d}{offset % 60:02d}",
+            "message": message.decode("utf-8"),
+            "parents": parents,
+            "tree": tree.hex(),
+        }
+        if session is not None:
+            record["session"] = session
+            record["n"] = number
+        return record, pos
+    if kind == DIGEST:
+        record = {"type": "digest"}
+        has_from = data[pos]
+        pos += 1
+        if has_from:
+            idx, pos = get_varint(data, pos)
+            record["from"] = table[idx]
+        record["version"], pos = get_varint(data, pos)
+        n, pos = get_varint(data, pos)
+        record["buckets"] = list(struct.unpack_from(f">{n}I", data, pos))
+        return record, pos + 4 * n
+    if kind == DELTA:
+        has_buckets = data[pos]
+        state, pos = _get_counts(data, pos + 1)
+        record = {"type": "delta", "state": state}
+        if has_buckets:
+            record["buckets"], pos = _get_ints(data, pos)
+        return record, pos
+    if kind == JSON:
+        raw, pos = get_bytes(data, pos)
+        return json.loads(raw.decode("utf-8")), pos
+    raise ValueError(f"unknown record kind {kind}")
+
+
+def encode_packet(records):
+    """
+    Encode records into one binary packet: header, username table, records.
+    """
+    names = Names()
+    body = bytearray()
+    put_varint(body, len(records))
+    for record in records:
+        _encode_record(body, names, record)
+    out = bytearray([MAGIC, VERSION, RECORDS])
+    put_varint(out, len(names.index))
+    for name in names.index:
+        put_bytes(out, name.encode("utf-8"))
+    return bytes(out + body)
+
+
+class PacketBuilder:
+    """
+    One packet that records are added to while its encoded size is tracked, so
+    datagrams can be filled up to the MTU without encoding a record twice.
+    Produces the same bytes as encode_packet.
+    """
+
+    def __init__(self):
+        self.names = Names()
+        self.body = bytearray()
+        self.count = 0
+
+    def size(self, count=None):
+        count = self.count if count is None else count
+        return 3 + varint_size(len(self.names.index)) + self.names.size + varint_size(count) + len(self.body)
+
+    def add(self, record, limit):
+        """
+        Add `record` unless the packet already has records and would exceed `limit`.
+        """
+        mark = len(self.body)
+        known = len(self.names.index)
+        _encode_record(self.body, self.names, record)
+        if self.count and self.size(self.count + 1) > limit:
+            del self.body[mark:]
+            self.names.truncate(known)
+            return False
+        self.count += 1
+        return True
+
+    def packet(self):
+        out = bytearray([MAGIC, VERSION, RECORDS])
+        put_varint(out, len(self.names.index))
+        for name in self.names.index:
+            put_bytes(out, name.encode("utf-8"))
+        put_varint(out, self.count)
+        return bytes(out + self.body)
+
+
+def encode_fragment(msg_id, seq, total, chunk):
+    out = bytearray([MAGIC, VERSION, FRAGMENT])
+    out += msg_id.to_bytes(8, "big")
+    put_varint(out, seq)
+    put_varint(out, total)
+    return bytes(out) + chunk
+
+
+FRAGMENT_HEADER = 3 + 8 + 2 * 5  # Header + id + zwei varints (maximal 5 Bytes)
+
+
+def is_binary(data):
+    return len(data) > 2 and data[0] == MAGIC
+
+
+def decode_packet(data):
+    """
+    Decode a binary packet into a list of records. A fragment comes back as a
+    {"type": "frag"} record with raw bytes in "data", like the JSON fragments.
+    """
+    if not is_binary(data):
+        raise ValueError("not a binary packet")
+    if data[1] != VERSION:
+        raise ValueError(f"unsupported packet version {data[1]}")
+    if data[2] == FRAGMENT:
+        msg_id = int.from_bytes(data[3:11], "big")
+        seq, pos = get_varint(data, 11)
+        total, pos = get_varint(data, pos)
+        return [{"type": "frag", "id": msg_id, "seq": seq, "total": total, "data": bytes(data[pos:])}]
+    if data[2] != RECORDS:
+        raise ValueError(f"unknown packet kind {data[2]}")
+    n, pos = get_varint(data, 3)
+    table = []
+    for _ in range(n):
+        name, pos = get_bytes(data, pos)
+        table.append(name.decode("utf-8"))
+    n, pos = get_varint(data, pos)
+    records = []
+    for _ in range(n):
+        record, pos = _decode_record(data, pos, table)
+        records.append(record)
+    return records
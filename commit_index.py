@@ -0,0 +1,351 @@
+import os
+import threading
+import time
+
+from utils import quote_name, unquote_name
+
+INDEX_FILE = "chat-commit-index"
+PRUNED = "-"  # Elternfeld einer Indexzeile für einen gelöschten Commit
+
+
+class CommitGraph:
+    """
+    In-memory commit graph: hash -> parents, author, per-author sequence number.
+
+    Every chat commit has the previous commit of its author among its parents,
+    so its sequence number is one more than that parent's. Adding a commit is
+    O(parents). Commits must be added parent-before-child.
+
+    Commits removed by prune() stay behind as tombstones (parents None) where
+    other commits still refer to them, so sequence numbers keep counting from
+    the pruned history; `base` is the highest pruned seq per author.
+    """
+
+    def __init__(self):
+        self.entries = {}  # hash -> (author, seq, parents), parents None für Tombstones
+        self.generation = {}  # hash -> 1 + max(generation of parents)
+        self.chains = {}  # author -> {seq: hash}, ohne Tombstones
+        self.heads = {}  # author -> highest seq
+        self.base = {}  # author -> höchste gelöschte seq
+
+    def add(self, sha, author, parents):
+        if sha in self.entries:
+            return self.entries[sha][1]
+        seq = self._previous_seq(author, parents) + 1
+        self.entries[sha] = (author, seq, list(parents))
+        self.generation[sha] = 1 + max((self.generation.get(p, 0) for p in parents), default=0)
+        self.chains.setdefault(author, {})[seq] = sha
+        if seq > self.heads.get(author, 0):
+            self.heads[author] = seq
+        return seq
+
+    def _previous_seq(self, author, parents):
+        seq = 0
+        for parent in parents:
+            entry = self.entries.get(parent)
+            if entry and entry[0] == author:
+                seq = max(seq, entry[1])
+        if seq or not parents:
+            return seq
+        # Kein direkter Elternteil vom selben Autor: nächsten Vorgänger suchen
+        seen = set()
+        stack = list(parents)
+        while stack:
+            current = stack.pop()
+            if current in seen or current not in self.entries:
+                continue
+            seen.add(current)
+            entry_author, entry_seq, entry_parents = self.entries[current]
+            if entry_author == author:
+                seq = max(seq, entry_seq)
+            elif entry_parents:
+                stack.extend(entry_parents)
+        return seq
+
+    def tombstone(self, sha, author, seq):
+        """
+        Record a commit that was pruned (here or by a peer) by author and seq only.
+        """
+        if sha in self.entries:
+            return False
+        self.entries[sha] = (author, seq, None)
+        if seq > self.heads.get(author, 0):
+            self.heads[author] = seq
+        if seq > self.base.get(author, 0):
+            self.base[author] = seq
+        return True
+
+    def pruned(self, sha):
+        entry = self.entries.get(sha)
+        return entry is not None and entry[2] is None
+
+    def history(self):
+        """
+        Retained commits per author, oldest first: {author: [(seq, hash, generation), ...]}.
+        """
+        return {author: [(seq, sha, self.generation[sha]) for seq, sha in sorted(chain.items())]
+                for author, chain in self.chains.items() if chain}
+
+    def anchors(self, tips, shallow):
+        """
+        Retained commits git cannot reach from `tips` when the commits in
+        `shallow` count as having no parents, reduced to those that are not
+        reachable from each other (newest first).
+        """
+        seen = set()
+
+        def walk(start):
+            stack = [start]
+            while stack:
+                current = stack.pop()
+                if current in seen or current not in self.generation:
+                    continue
+                seen.add(current)
+                if current not in shallow:
+                    stack.extend(self.entries[current][2])
+
+        for tip in tips:
+            walk(tip)
+        anchors = []
+        for sha in sorted(self.generation, key=self.generation.__getitem__, reverse=True):
+            if sha not in seen:
+                anchors.append(sha)
+                walk(sha)
+        return anchors
+
+    def prune(self, cut, keep):
+        """
+        Drop every commit with seq <= cut[author]. Tombstones are kept for the
+        parents of retained commits, the last pruned commit of each author and
+        the `keep` newest pruned commits per author (parents of commits that
+        lagging peers may still post). Returns (pruned hashes, retained commits
+        that now have a pruned parent).
+        """
+        pruned = []
+        for author, upto in cut.items():
+            chain = self.chains.get(author, {})
+            for seq in [seq for seq in chain if seq <= upto]:
+                sha = chain.pop(seq)
+                self.entries[sha] = (author, seq, None)
+                del self.generation[sha]
+                pruned.append(sha)
+            if upto > self.base.get(author, 0):
+                self.base[author] = upto
+        boundary = set()
+        referenced = set()
+        for sha, (_, _, parents) in self.entries.items():
+            if parents is None:
+                continue
+            for parent in parents:
+                entry = self.entries.get(parent)
+                if entry is not None and entry[2] is None:
+                    boundary.add(sha)
+                    referenced.add(parent)
+        for sha, (author, seq, parents) in list(self.entries.items()):
+            if parents is None and sha not in referenced and seq <= self.base[author] - max(keep, 1):
+                del self.entries[sha]
+        return pruned, boundary
+
+    def boundary(self):
+        """
+        Tombstones a node needs to apply the retained commits: the pruned parents
+        of retained commits and the last pruned commit of each author.
+        """
+        needed = {}
+        for sha, (author, seq, parents) in self.entries.items():
+            if parents is None:
+                if seq == self.base.get(author):
+                    needed[sha] = (author, seq)
+                continue
+            for parent in parents:
+                entry = self.entries.get(parent)
+                if entry is not None and entry[2] is None:
+                    needed[parent] = entry[:2]
+        return needed
+
+    def missing(self, remote_frontier, include=None):
+        """
+        Commits a peer with the given frontier lacks, parents before children.
+
+        The peer only ever applies commits whose parents it has, so knowing how many
+        commits of each author it has is enough to tell exactly which ones it lacks.
+        `include` optionally restricts the authors that are looked at.
+        """
+        missing = []
+        for author, head in self.heads.items():
+            if include is not None and not include(author):
+                continue
+            chain = self.chains.get(author, {})
+            start = max(remote_frontier.get(author, 0), self.base.get(author, 0))
+            for seq in range(start + 1, head + 1):
+                if seq in chain:
+                    missing.append(chain[seq])
+        missing.sort(key=self.generation.__getitem__)
+        return missing
+
+
+class CommitIndex(CommitGraph):
+    """
+    CommitGraph that is kept in sync with a repository and persisted on disk.
+
+    The index is an append-only text file in the git dir with one line per commit:
+    "<hash> <author> <seq> <parent,parent,...> <indexed>", or "<hash> <author>
+    <seq> -" for a tombstone, with spaces in <author> percent-encoded
+    (utils.quote_name). <indexed> is the Unix time this node indexed (received
+    or created) the commit; author times are not reliable for that. On start it
+    is loaded from disk and only commits behind the current ref tips that are
+    not indexed yet are read. prune() rewrites it. With `readonly` (e.g. for a
+    second process next to a running chat) the file is only read and commits
+    indexed later are kept in memory.
+    """
+
+    def __init__(self, repo, path=None, readonly=False):
+        super().__init__()
+        self.repo = repo
+        self.path = path or os.path.join(repo.git_dir, INDEX_FILE)
+        self.readonly = readonly
+        self.lock = threading.Lock()
+        self.indexed = {}  # hash -> Unix-Zeit, zu der dieser Knoten den Commit indexiert hat
+        self.load()
+        self.file = open(os.devnull if readonly else self.path, "a", encoding="utf-8")
+        self.verify()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split(" ")
+                if len(parts) == 4 and parts[3] == PRUNED:
+                    sha, author, seq, _ = parts
+                    super().tombstone(sha, unquote_name(author), int(seq))
+                elif len(parts) == 5:
+                    sha, author, seq, parents, indexed = parts
+                    super().add(sha, unquote_name(author), parents.split(",") if parents else [])
+                    self.indexed[sha] = int(indexed)
+                # sonst z.B. halb geschriebene Zeile nach einem Absturz
+
+    def verify(self):
+        """
+        Make sure every ref tip is indexed, indexing only the commits that are new.
+        """
+        for sha in self.repo.refs().values():
+            self.ensure(sha)
+
+    def ensure(self, sha):
+        with self.lock:
+            if sha in self.entries:
+                return self.entries[sha][1]
+            # Iterativ, damit lange Historien nicht an der Rekursionsgrenze scheitern
+            stack = [sha]
+            while stack:
+                current = stack[-1]
+                if current in self.entries:
+                    stack.pop()
+                    continue
+                commit = self.repo.read_commit(current)
+                unknown = [p for p in commit["parents"] if p not in self.entries]
+                if unknown:
+                    stack.extend(unknown)
+                    continue
+                stack.pop()
+                self._add(current, commit["author"], commit["parents"])
+            self.file.flush()
+            return self.entries[sha][1]
+
+    def add(self, sha, author, parents):
+        """
+        Record a commit that was just created locally. All parents must be indexed.
+        """
+        with self.lock:
+            if sha not in self.entries:
+                self._add(sha, author, parents)
+                self.file.flush()
+            return self.entries[sha][1]
+
+    def _add(self, sha, author, parents):
+        seq = super().add(sha, author, parents)
+        indexed = self.indexed[sha] = int(time.time())
+        self.file.write(f"{sha} {quote_name(author)} {seq} {','.join(parents)} {indexed}\n")
+
+    def tombstones(self, entries):
+        """
+        Record pruned commits [(hash, author, seq), ...] received from a peer.
+        Returns the hashes that were new.
+        """
+        with self.lock:
+            added = []
+            for sha, author, seq in entries:
+                if super().tombstone(sha, author, seq):
+                    self.file.write(f"{sha} {quote_name(author)} {seq} {PRUNED}\n")
+                    added.append(sha)
+            self.file.flush()
+            return added
+
+    def prune(self, cut, keep):
+        with self.lock:
+            pruned, boundary = super().prune(cut, keep)
+            for sha in pruned:
+                del self.indexed[sha]
+            if pruned and not self.readonly:
+                self._rewrite()
+            return pruned, boundary
+
+    def _rewrite(self):
+        # Tombstones zuerst, dann Eltern vor Kindern; atomar ersetzen
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for sha, (author, seq, parents) in self.entries.items():
+                if parents is None:
+                    f.write(f"{sha} {quote_name(author)} {seq} {PRUNED}\n")
+            for sha in sorted(self.generation, key=self.generation.__getitem__):
+                author, seq, parents = self.entries[sha]
+                f.write(f"{sha} {quote_name(author)} {seq} {','.join(parents)} {self.indexed[sha]}\n")
+        self.file.close()
+        os.replace(tmp, self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def pruned(self, sha):
+        with self.lock:
+            return super().pruned(sha)
+
+    def history(self):
+        with self.lock:
+            return super().history()
+
+    def boundary(self):
+        with self.lock:
+            return super().boundary()
+
+    def anchors(self, tips, shallow):
+        with self.lock:
+            return super().anchors(tips, shallow)
+
+    def bases(self):
+        with self.lock:
+            return dict(self.base)
+
+    def missing(self, remote_frontier, include=None):
+        with self.lock:
+            return super().missing(remote_frontier, include)
+
+    def seq(self, sha):
+        return self.ensure(sha)
+
+    def indexed_at(self, sha):
+        """
+        Unix time this node indexed the commit (received or created it).
+        """
+        self.ensure(sha)
+        return self.indexed[sha]
+
+    def author(self, sha):
+        self.ensure(sha)
+        return self.entries[sha][0]
+
+    def parents(self, sha):
+        self.ensure(sha)
+        return self.entries[sha][2] or []
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,380 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from itertools import chain, compress, count
+from operator import ne
+
+MEMO_MIN = 256  # kleinere Zustände (Deltas) direkt mergen, wie ein Dict
+MEMO_SOURCES = 8  # so vielen Sendern wird der letzte volle Zustand gemerkt
+SAMPLE = 64  # so viele Einträge entscheiden, ob sich die Changed-Mask lohnt
+SHARDS = 16  # Teile von ShardedFrontier, jeweils mit eigenem Lock
+
+
+def _check(user, value):
+    # Nur Werte, die in den Zustand übernommen werden, müssen geprüft werden
+    if value.__class__ is not int or value < 0:
+        raise ValueError(f"frontier count of {user!r} must be a non-negative integer, got {value!r}")
+
+
+class Frontier(Mapping):
+    """
+    Grow-only frontier (user -> message count) for large peer sets.
+
+    The counts are a plain dict, so merge() of a delta is the same
+    element-wise maximum loop as before frontier.py and returns only the
+    entries that grew. Counts that are taken over must be non-negative ints.
+
+    Full states (at least MEMO_MIN entries) from the same sender usually come
+    with the same users in the same order, so for the last few senders the
+    previous state is kept as a list: the incoming values are compared position
+    by position with the previous ones (one C-level pass), and only the
+    positions that differ are merged. Everything else is already merged,
+    because counts only grow. Reads behave like a dict, so gossip.py, wire.py
+    and FrontierStore take it as is.
+
+    Each peer also has a last-seen time and the address it was last heard
+    from, in dicts like ShardedFrontier's. A peer counts as seen when it is
+    heard from directly (touch()) or when its count grows; all entries that
+    grow in one merge() share one time object, so a peer costs two dict slots
+    and an address only once it was heard from directly. With track=False
+    (no eviction configured) merge() notes no times and does nothing beyond
+    the dict loop; a first evict() then counts everyone as seen now and
+    turns tracking on. evict() moves peers idle for longer than a limit into
+    `archive` (user -> count): they drop out of iteration, digests and
+    broadcasts, but their counts are kept and come back with restore(), when
+    the peer is heard from again or when its count grows.
+    """
+
+    def __init__(self, state=None, clock=time.time, track=True):
+        self.state = {}  # user -> count
+        self.seen = {}  # user -> letzte Aktivität, auch für archivierte Peers
+        self.sources = {}  # user -> Adresse, nur nach direktem Kontakt
+        self.archive = {}  # user -> Zähler der verdrängten Peers
+        self.tracking = track  # gewachsene Zähler als Aktivität notieren
+        self.clock = clock
+        # source -> (users, values) des letzten vollen Zustands; Speicher ~ MEMO_SOURCES * Peers
+        self.memos = OrderedDict()
+        if state:
+            self.merge(state)
+
+    def merge(self, incoming, source=None):
+        """
+        Element-wise maximum with `incoming`; returns {user: count} of the entries
+        that changed. `source` (e.g. the sender's address) enables the vector path
+        for full states.
+        """
+        if source is not None and len(incoming) >= MEMO_MIN:
+            return self._merge_full(incoming, source)
+        changed = {}
+        state = self.state
+        for user, value in incoming.items():
+            if user not in state:
+                if self._add(user, value):
+                    changed[user] = value
+            elif state[user] < value:
+                if value.__class__ is not int:
+                    _check(user, value)
+                state[user] = value
+                changed[user] = value
+        if changed and self.tracking:
+            # Gewachsene Zähler gelten als Aktivität; ein Zeitobjekt für alle
+            self.seen.update(dict.fromkeys(changed, self.clock()))
+        return changed
+
+    def _merge_full(self, incoming, source):
+        users = list(incoming)
+        values = list(incoming.values())
+        memo = self.memos.get(source)
+        if memo is not None and memo[0] == users:
+            previous = memo[1]
+            if values == previous:
+                self.memos.move_to_end(source)
+                return {}
+            if 2 * sum(map(ne, values[:SAMPLE], previous)) > SAMPLE:
+                # Schon vorne ist fast alles neu: direkt mergen ist billiger als die Maske
+                changed = self.merge(incoming)
+            else:
+                # Changed-Mask: nur Positionen, die sich seit dem letzten Zustand geändert haben
+                positions = list(compress(count(), map(ne, values, previous)))
+                if 2 * len(positions) > len(users):
+                    changed = self.merge(incoming)
+                else:
+                    changed = self.merge({users[pos]: values[pos] for pos in positions})
+        else:
+            changed = self.merge(incoming)
+        self.memos[source] = (users, values)
+        self.memos.move_to_end(source)
+        if len(self.memos) > MEMO_SOURCES:
+            self.memos.popitem(last=False)
+        return changed
+
+    def _add(self, user, value):
+        """
+        Take over a user that is not in the frontier; False if it is archived with at least `value`.
+        """
+        _check(user, value)
+        archived = self.archive.get(user)
+        if archived is not None:
+            # Verdrängter Peer: nur zurückholen, wenn er seither aktiv war
+            if value <= archived:
+                return False
+            del self.archive[user]
+        self.state[user] = value
+        return True
+
+    def touch(self, user, address=None):
+        """
+        Note that `user` was heard from directly (from `address`); brings it
+        back from the archive. Unknown users are ignored.
+        """
+        if user not in self.state:
+            if user not in self.archive:
+                return
+            self.state[user] = self.archive.pop(user)
+        self.seen[user] = self.clock()
+        if address is not None:
+            self.sources[user] = address
+
+    def evict(self, idle, keep=()):
+        """
+        Move peers not seen for more than `idle` seconds (except those in
+        `keep`) to the archive. Returns their names.
+        """
+        now = self.clock()
+        if not self.tracking:
+            # Bisher hat merge() keine Zeiten notiert: alle gelten als jetzt gesehen
+            self.tracking = True
+            self.seen = {**dict.fromkeys(self.state, now), **self.seen}
+        cutoff = now - idle
+        seen = self.seen
+        evicted = [user for user in self.state if seen.get(user, 0) < cutoff and user not in keep]
+        for user in evicted:
+            self.archive[user] = self.state.pop(user)
+        if len(evicted) > len(self.state):
+            # Dicts schrumpfen beim Löschen nicht
+            self.state = dict(self.state)
+        return evicted
+
+    def restore(self, user):
+        """
+        Bring an archived peer back; returns its count, None if it is not archived.
+        """
+        value = self.archive.pop(user, None)
+        if value is not None:
+            self.state[user] = value
+        return value
+
+    def peer(self, user):
+        """
+        (count, last seen, address, archived) of a live or archived peer, None if unknown.
+        """
+        count = self.state.get(user)
+        archived = count is None
+        if archived:
+            count = self.archive.get(user)
+            if count is None:
+                return None
+        return count, self.seen.get(user), self.sources.get(user), archived
+
+    def increment(self, user):
+        """
+        Add one to the count of `user` and return the new count.
+        """
+        self[user] = self.state.get(user, self.archive.get(user, 0)) + 1
+        return self.state[user]
+
+    def snapshot(self):
+        """
+        The frontier itself; callers hold the chat lock while they read it.
+        """
+        return self
+
+    def __getitem__(self, user):
+        return self.state[user]
+
+    def __setitem__(self, user, value):
+        _check(user, value)
+        self.archive.pop(user, None)
+        self.state[user] = value
+        self.seen[user] = self.clock()
+
+    def __contains__(self, user):
+        return user in self.state
+
+    def __iter__(self):
+        return iter(self.state)
+
+    def __len__(self):
+        return len(self.state)
+
+    def get(self, user, default=None):
+        return self.state.get(user, default)
+
+    def keys(self):
+        return self.state.keys()
+
+    def values(self):
+        return self.state.values()
+
+    def items(self):
+        return self.state.items()
+
+    def __repr__(self):
+        return f"Frontier({self.state})"
+
+
+class FrontierSnapshot(Mapping):
+    """
+    Read-only view of a ShardedFrontier at one point in time.
+    """
+
+    def __init__(self, views):
+        self.views = views
+
+    def __getitem__(self, user):
+        return self.views[hash(user) % len(self.views)][user]
+
+    def __contains__(self, user):
+        return user in self.views[hash(user) % len(self.views)]
+
+    def __iter__(self):
+        return chain.from_iterable(self.views)
+
+    def __len__(self):
+        return sum(map(len, self.views))
+
+    def get(self, user, default=None):
+        return self.views[hash(user) % len(self.views)].get(user, default)
+
+    def items(self):
+        return chain.from_iterable(view.items() for view in self.views)
+
+    def values(self):
+        return chain.from_iterable(view.values() for view in self.views)
+
+    def __repr__(self):
+        return f"FrontierSnapshot({dict(self.items())})"
+
+
+class ShardedFrontier(FrontierSnapshot):
+    """
+    Grow-only frontier for several receiver threads.
+
+    Users are split into shards by hash; each shard has its own lock, so merges
+    of deltas for different users do not wait for each other. A shard's entries
+    are published as a dict that is never changed afterwards: a writer builds
+    the new dict under the shard lock and swaps it in. Readers (broadcast,
+    digest replies, rendering) take snapshot() and read it without locking.
+    Last-seen times, addresses and the archive of evicted peers are dicts as
+    in Frontier, and the methods behave like Frontier's.
+    """
+
+    def __init__(self, state=None, shards=SHARDS, clock=time.time):
+        super().__init__([{} for _ in range(shards)])
+        self.locks = [threading.Lock() for _ in range(shards)]
+        self.clock = clock
+        self.seen = {}  # user -> letzte Aktivität, auch für archivierte Peers
+        self.sources = {}  # user -> Adresse
+        self.archive = {}  # user -> Zähler der verdrängten Peers
+        if state:
+            self.merge(state)
+
+    def merge(self, incoming, source=None):
+        """
+        Element-wise maximum with `incoming`; returns {user: count} of the entries
+        that changed. `source` is accepted for compatibility with Frontier.
+        """
+        views = self.views
+        shards = len(views)
+        archive = self.archive
+        parts = {}
+        for user, value in incoming.items():
+            # Ohne Lock vorsortieren: was schon bekannt ist, braucht keinen Schreibzugriff;
+            # verdrängte Peers kommen nur mit höherem Zähler zurück
+            shard = hash(user) % shards
+            if value > views[shard].get(user, archive.get(user, -1)):
+                parts.setdefault(shard, {})[user] = value
+        changed = {}
+        now = self.clock()
+        for shard, part in parts.items():
+            with self.locks[shard]:
+                view = views[shard]
+                grown = {user: value for user, value in part.items()
+                         if value > view.get(user, archive.get(user, -1))}
+                if grown:
+                    for user, value in grown.items():
+                        _check(user, value)
+                    views[shard] = {**view, **grown}
+                    changed.update(grown)
+                    for user in grown:
+                        self.seen[user] = now
+                        archive.pop(user, None)
+        return changed
+
+    def increment(self, user):
+        shard = hash(user) % len(self.views)
+        with self.locks[shard]:
+            view = self.views[shard]
+            value = (view[user] if user in view else self.archive.pop(user, 0)) + 1
+            self.views[shard] = {**view, user: value}
+            self.seen[user] = self.clock()
+        return value
+
+    def __setitem__(self, user, value):
+        shard = hash(user) % len(self.views)
+        with self.locks[shard]:
+            self.views[shard] = {**self.views[shard], user: value}
+            self.archive.pop(user, None)
+            self.seen[user] = self.clock()
+
+    def touch(self, user, address=None):
+        shard = hash(user) % len(self.views)
+        with self.locks[shard]:
+            view = self.views[shard]
+            if user not in view:
+                if user not in self.archive:
+                    return
+                self.views[shard] = {**view, user: self.archive.pop(user)}
+            self.seen[user] = self.clock()
+            if address is not None:
+                self.sources[user] = address
+
+    def evict(self, idle, keep=()):
+        cutoff = self.clock() - idle
+        evicted = []
+        for shard, lock in enumerate(self.locks):
+            with lock:
+                view = self.views[shard]
+                idle_users = [user for user in view if self.seen[user] < cutoff and user not in keep]
+                if idle_users:
+                    for user in idle_users:
+                        self.archive[user] = view[user]
+                    gone = set(idle_users)
+                    self.views[shard] = {user: count for user, count in view.items() if user not in gone}
+                    evicted.extend(idle_users)
+        return evicted
+
+    def restore(self, user):
+        shard = hash(user) % len(self.views)
+        with self.locks[shard]:
+            if user not in self.archive:
+                return None
+            value = self.archive.pop(user)
+            self.views[shard] = {**self.views[shard], user: value}
+        return value
+
+    def peer(self, user):
+        count = self.views[hash(user) % len(self.views)].get(user)
+        archived = count is None
+        if archived:
+            count = self.archive.get(user)
+            if count is None:
+                return None
+        return count, self.seen.get(user), self.sources.get(user), archived
+
+    def snapshot(self):
+        return FrontierSnapshot(tuple(self.views))
+
+    def __repr__(self):
+        return f"ShardedFrontier({dict(self.items())})"
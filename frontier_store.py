@@ -0,0 +1,165 @@
+import os
+import threading
+import zlib
+
+from utils import quote_name, unquote_name
+
+LOG_FILE = "frontier.log"
+SNAPSHOT_FILE = "frontier.snapshot"
+COMPACT_EVERY = 1000  # Logzeilen seit dem letzten Snapshot, danach wird kompaktiert
+
+
+def _line(peer, count):
+    entry = f"{quote_name(peer)} {count}"
+    return f"{entry} {zlib.crc32(entry.encode('utf-8')):08x}\n"
+
+
+def _parse(line):
+    """
+    Returns (peer, count) or None for a torn or corrupted line.
+    """
+    parts = line.rstrip("\n").split(" ")
+    if len(parts) != 3:
+        return None
+    peer, count, crc = parts
+    if f"{zlib.crc32(f'{peer} {count}'.encode('utf-8')):08x}" != crc:
+        return None
+    return unquote_name(peer), int(count)
+
+
+class FrontierStore:
+    """
+    Crash-safe storage for a grow-only frontier (peer -> count).
+
+    Updates are appended to a write-ahead log; every line carries a CRC so a torn
+    last line after a crash is skipped. Because counts only grow, recovery is a
+    max-merge of snapshot and log, which also makes replaying a line twice harmless.
+    The log is compacted into an atomically replaced snapshot now and then.
+    With `group_commit` > 0, updates arriving within that many seconds are
+    written and fsynced together.
+    """
+
+    def __init__(self, directory, group_commit=0.0, compact_every=COMPACT_EVERY, fsync=True):
+        self.directory = directory
+        self.group_commit = group_commit
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.state = {}
+        self.pending = {}  # noch nicht geschriebene Updates (Group Commit)
+        self.timer = None
+        self.log_lines = 0
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, LOG_FILE)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.log = None
+
+    def load(self):
+        """
+        Recover the frontier from snapshot and log. Older per-peer files
+        (<peer> or <peer>.txt containing the count) are imported once.
+        """
+        with self.lock:
+            state = {}
+            legacy = False
+            if os.path.exists(self.snapshot_path):
+                self._replay(self.snapshot_path, state)
+            elif not os.path.exists(self.log_path):
+                self._import_legacy(state)
+                legacy = bool(state)
+            if os.path.exists(self.log_path):
+                self.log_lines = self._replay(self.log_path, state)
+            self.state = state
+            self.log = open(self.log_path, "a", encoding="utf-8")
+            if legacy:
+                self.pending = dict(state)
+                self._flush()
+            return dict(state)
+
+    def _replay(self, path, state):
+        lines = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                entry = _parse(line)
+                if entry is None:
+                    continue
+                peer, count = entry
+                if count > state.get(peer, -1):
+                    state[peer] = count
+                lines += 1
+        return lines
+
+    def _import_legacy(self, state):
+        for fname in os.listdir(self.directory):
+            path = os.path.join(self.directory, fname)
+            if not os.path.isfile(path):
+                continue
+            try:
+                with open(path, "r") as f:
+                    state[fname.replace(".txt", "")] = int(f.read().strip())
+            except ValueError:
+                continue
+
+    def update(self, frontier):
+        """
+        Persist the entries of `frontier` that are newer than what is stored.
+        """
+        with self.lock:
+            if self.log is None:
+                raise RuntimeError("FrontierStore.load() must be called first")
+            for peer, count in frontier.items():
+                if count > self.state.get(peer, -1):
+                    self.state[peer] = count
+                    self.pending[peer] = count
+            if not self.pending:
+                return
+            if self.group_commit <= 0:
+                self._flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.group_commit, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        self.timer = None
+        if not self.pending or self.log is None:
+            return
+        self.log.write("".join(_line(p, c) for p, c in self.pending.items()))
+        self.log.flush()
+        if self.fsync:
+            os.fsync(self.log.fileno())
+        self.log_lines += len(self.pending)
+        self.pending = {}
+        if self.log_lines >= max(self.compact_every, 2 * len(self.state)):
+            self._compact()
+
+    def compact(self):
+        with self.lock:
+            self._flush()
+            self._compact()
+
+    def _compact(self):
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(_line(p, c) for p, c in self.state.items()))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        # Erst nach dem Snapshot das Log leeren; ein Absturz dazwischen schadet nicht
+        self.log.close()
+        self.log = open(self.log_path, "w", encoding="utf-8")
+        self.log_lines = 0
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self._flush()
+            if self.log is not None:
+                self.log.close()
+                self.log = None
@@ -0,0 +1,354 @@
+import hashlib
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
+
+from utils import run
+
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+RAW_DATE = re.compile(r"^\d+ [+-]\d{4}$")
+# Ein Pfadteil unter refs/heads/ nach den Regeln von `git check-ref-format --branch`
+BRANCH_NAME = re.compile(r"(?![.-])(?!.*(?:\.\.|@\{))[^\x00-\x20\x7f~^:?*\[\\/]+(?<!\.lock)(?<!\.)")
+
+
+def valid_branch(name):
+    """
+    Whether `name` can be a chat branch (refs/heads/<name>) and so an author.
+    """
+    return name != "@" and BRANCH_NAME.fullmatch(name) is not None
+
+
+def parse_commit(raw):
+    """
+    Split the output of `git cat-file -p <commit>` into the fields the chat needs.
+    """
+    header, _, message = raw.partition("\n\n")
+    tree = None
+    parents = []
+    author = None
+    author_time = None
+    for line in header.splitlines():
+        key, _, value = line.partition(" ")
+        if key == "tree":
+            tree = value
+        elif key == "parent":
+            parents.append(value)
+        elif key == "author":
+            # "<name> <<email>> <epoch> <tz>"
+            name, _, rest = value.partition(" <")
+            author = name
+            author_time = rest.partition("> ")[2]
+    return {
+        "tree": tree,
+        "parents": parents,
+        "author": author,
+        "author_time": author_time,
+        "message": message,
+    }
+
+
+def commit_env(author, author_time):
+    return {
+        **os.environ,
+        "GIT_AUTHOR_NAME": author,
+        "GIT_AUTHOR_EMAIL": f"{author}@example.com",
+        "GIT_AUTHOR_DATE": author_time,
+        "GIT_COMMITTER_NAME": author,
+        "GIT_COMMITTER_EMAIL": f"{author}@example.com",
+        "GIT_COMMITTER_DATE": author_time
+    }
+
+
+def write_object(git_dir, kind, body):
+    """
+    Store an object as a loose object file, like `git hash-object -w`. Returns its hash.
+    """
+    data = f"{kind} {len(body)}\0".encode("ascii") + body
+    sha = hashlib.sha1(data).hexdigest()
+    directory = os.path.join(git_dir, "objects", sha[:2])
+    path = os.path.join(directory, sha[2:])
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(data, 1))
+        os.replace(tmp, path)
+    return sha
+
+
+def init_repo(path, branch, message, author_time=None):
+    """
+    Create a chat repository at `path` without running git: the files of
+    `git init` with user.name/user.email set to `branch`, the empty tree and a
+    first commit with `message` on refs/heads/<branch>, which HEAD points to.
+    Returns the git dir.
+    """
+    git_dir = os.path.join(os.path.abspath(path), ".git")
+    for directory in ("objects/info", "objects/pack", "refs/heads", "refs/tags"):
+        os.makedirs(os.path.join(git_dir, directory), exist_ok=True)
+    with open(os.path.join(git_dir, "config"), "w") as f:
+        f.write("[core]\n\trepositoryformatversion = 0\n\tfilemode = true\n\tbare = false\n"
+                "\tlogallrefupdates = true\n"
+                f"[user]\n\tname = {branch}\n\temail = {branch}@example.com\n")
+    with open(os.path.join(git_dir, "HEAD"), "w") as f:
+        f.write(f"ref: refs/heads/{branch}\n")
+    write_object(git_dir, "tree", b"")  # sonst nur virtuell vorhanden, fsck vermisst ihn
+    ident = f"{branch} <{branch}@example.com> {author_time or f'{int(time.time())} +0000'}"
+    body = f"tree {EMPTY_TREE}\nauthor {ident}\ncommitter {ident}\n\n{message}"
+    sha = write_object(git_dir, "commit", body.encode("utf-8"))
+    with open(os.path.join(git_dir, "refs", "heads", branch), "w") as f:
+        f.write(f"{sha}\n")
+    return git_dir
+
+
+class SubprocessBackend:
+    """
+    Repository access with one `git` process per operation (the original behaviour).
+    """
+
+    def __init__(self, cwd=None, git_dir=None):
+        self.cwd = cwd
+        self.spawned = 0  # Anzahl gestarteter git-Prozesse
+        self.git_dir = git_dir or self._run(["git", "rev-parse", "--absolute-git-dir"])
+        self.tips_lock = threading.Lock()
+        self._tips = None  # refs/heads/* im Speicher, siehe tips()
+
+    def _run(self, command, env=None, input=None):
+        self.spawned += 1
+        return run(command, env=env, input=input, cwd=self.cwd)
+
+    def refs(self, prefix="refs/heads/"):
+        out = self._run(["git", "for-each-ref", "--format=%(objectname) %(refname)", prefix])
+        refs = {}
+        for line in out.splitlines():
+            sha, ref = line.split(" ", 1)
+            refs[ref] = sha
+        return refs
+
+    def tips(self):
+        """
+        refs/heads/* from memory. Kept current by update_refs(); changes made
+        outside this backend (fetch, other git commands) need refresh_tips().
+        """
+        with self.tips_lock:
+            if self._tips is None:
+                self._tips = self.refs()
+            return dict(sorted(self._tips.items()))
+
+    def refresh_tips(self):
+        with self.tips_lock:
+            self._tips = self.refs()
+            return dict(self._tips)
+
+    def exists(self, sha):
+        try:
+            self._run(["git", "cat-file", "-e", sha])
+            return True
+        except Exception:
+            return False
+
+    def read_commit(self, sha):
+        return parse_commit(self._run(["git", "cat-file", "-p", sha]))
+
+    def size(self, sha):
+        return int(self._run(["git", "cat-file", "-s", sha]))
+
+    def count(self, rev):
+        return int(self._run(["git", "rev-list", "--count", rev]))
+
+    def create_commit(self, parents, message, author, author_time, tree=EMPTY_TREE):
+        args = ["git", "commit-tree", tree] + sum([["-p", p] for p in parents], [])
+        return self._run(args, env=commit_env(author, author_time), input=message)
+
+    def update_ref(self, ref, sha):
+        self.update_refs({ref: sha})
+
+    def update_refs(self, updates):
+        with self.tips_lock:
+            self._write_refs(updates)
+            if self._tips is not None:
+                for ref, sha in updates.items():
+                    if ref.startswith("refs/heads/"):
+                        self._tips[ref] = sha
+
+    def _write_refs(self, updates):
+        for ref, sha in updates.items():
+            self._run(["git", "update-ref", ref, sha])
+
+    def close(self):
+        pass
+
+
+class BatchBackend(SubprocessBackend):
+    """
+    Repository access over long-lived git processes.
+
+    Reads go through `git cat-file --batch` / `--batch-check`, new commit objects
+    through `git hash-object -w --stdin-paths` and ref updates through
+    `git update-ref --stdin` transactions. Refs are read straight from the git dir.
+    """
+
+    def __init__(self, cwd=None, git_dir=None):
+        super().__init__(cwd, git_dir)
+        self.lock = threading.Lock()
+        self.parents = {}  # Commits sind unveränderlich -> Eltern dürfen gecacht werden
+        self.procs = {}
+        fd, self.scratch = tempfile.mkstemp(prefix="chat-commit-")
+        os.close(fd)
+
+    def _proc(self, name, command):
+        proc = self.procs.get(name)
+        if proc is None or proc.poll() is not None:
+            self.spawned += 1
+            proc = subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                cwd=self.cwd,
+            )
+            self.procs[name] = proc
+        return proc
+
+    def _request(self, name, command, line):
+        proc = self._proc(name, command)
+        try:
+            proc.stdin.write(line.encode("utf-8") + b"\n")
+            proc.stdin.flush()
+            reply = proc.stdout.readline()
+        except (BrokenPipeError, OSError):
+            reply = b""
+        if not reply:
+            self._kill(name)
+            raise RuntimeError(f"{' '.join(command)} terminated unexpectedly")
+        return proc, reply.decode("utf-8").rstrip("\n")
+
+    def _kill(self, name):
+        proc = self.procs.pop(name, None)
+        if proc is not None:
+            proc.kill()
+            proc.wait()
+
+    def refs(self, prefix="refs/heads/"):
+        refs = {}
+        packed = os.path.join(self.git_dir, "packed-refs")
+        if os.path.exists(packed):
+            with open(packed, "r") as f:
+                for line in f:
+                    if line.startswith(("#", "^")):
+                        continue
+                    sha, _, ref = line.strip().partition(" ")
+                    if ref.startswith(prefix):
+                        refs[ref] = sha
+        root = os.path.join(self.git_dir, prefix)
+        for dirpath, _, filenames in os.walk(root):
+            for fname in filenames:
+                if fname.endswith(".lock"):
+                    continue  # update-ref schreibt gerade
+                path = os.path.join(dirpath, fname)
+                try:
+                    with open(path, "r") as f:
+                        sha = f.read().strip()
+                except OSError:
+                    continue
+                if len(sha) != 40:
+                    continue  # symbolische oder halb geschriebene Ref
+                ref = prefix + os.path.relpath(path, root).replace(os.sep, "/")
+                refs[ref] = sha
+        return dict(sorted(refs.items()))
+
+    def exists(self, sha):
+        with self.lock:
+            _, reply = self._request("check", ["git", "cat-file", "--batch-check"], sha)
+        return not reply.endswith(" missing")
+
+    def size(self, sha):
+        with self.lock:
+            _, reply = self._request("check", ["git", "cat-file", "--batch-check"], sha)
+        if reply.endswith(" missing"):
+            raise KeyError(sha)
+        return int(reply.split()[2])
+
+    def read_raw(self, sha):
+        with self.lock:
+            proc, reply = self._request("read", ["git", "cat-file", "--batch"], sha)
+            if reply.endswith(" missing"):
+                raise KeyError(sha)
+            size = int(reply.split()[2])
+            data = proc.stdout.read(size + 1)[:-1]
+        return data.decode("utf-8")
+
+    def read_commit(self, sha):
+        commit = parse_commit(self.read_raw(sha))
+        self.parents[sha] = commit["parents"]
+        return commit
+
+    def count(self, rev):
+        sha = self.refs().get(rev, rev)
+        seen = set()
+        stack = [sha]
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            parents = self.parents.get(current)
+            if parents is None:
+                parents = self.read_commit(current)["parents"]
+            stack.extend(parents)
+        return len(seen)
+
+    def create_commit(self, parents, message, author, author_time, tree=EMPTY_TREE):
+        if not RAW_DATE.match(author_time):
+            # Nur git selbst kann beliebige Datumsformate parsen
+            return super().create_commit(parents, message, author, author_time, tree)
+        # Wie commit-tree: doppelte Eltern (zwei Refs auf denselben Commit) nur einmal
+        parents = list(dict.fromkeys(parents))
+        ident = f"{author} <{author}@example.com> {author_time}"
+        body = f"tree {tree}\n"
+        body += "".join(f"parent {p}\n" for p in parents)
+        body += f"author {ident}\ncommitter {ident}\n\n{message}"
+        with self.lock:
+            with open(self.scratch, "w", encoding="utf-8", newline="") as f:
+                f.write(body)
+            _, sha = self._request(
+                "write",
+                ["git", "hash-object", "-w", "-t", "commit", "--stdin-paths"],
+                self.scratch,
+            )
+        self.parents[sha] = list(parents)
+        return sha
+
+    def _write_refs(self, updates):
+        command = ["git", "update-ref", "--stdin"]
+        with self.lock:
+            _, reply = self._request("refs", command, "start")
+            proc = self.procs["refs"]
+            for ref, sha in updates.items():
+                proc.stdin.write(f"update {ref} {sha}\n".encode("utf-8"))
+            _, reply = self._request("refs", command, "commit")
+            if reply != "commit: ok":
+                self._kill("refs")
+                raise RuntimeError(f"update-ref failed: {reply}")
+
+    def close(self):
+        with self.lock:
+            for name in list(self.procs):
+                proc = self.procs.pop(name)
+                proc.stdin.close()
+                proc.wait()
+        if os.path.exists(self.scratch):
+            os.remove(self.scratch)
+
+
+BACKENDS = {
+    "subprocess": SubprocessBackend,
+    "batch": BatchBackend,
+}
+
+
+def open_backend(kind="batch", cwd=None, git_dir=None):
+    return BACKENDS[kind](cwd, git_dir)
@@ -0,0 +1,84 @@
+import threading
+import time
+import zlib
+
+BUCKETS = 16  # Frontier wird für den Digest in so viele Teile zerlegt
+
+
+def bucket_of(user, buckets=BUCKETS):
+    return zlib.crc32(user.encode("utf-8")) % buckets
+
+
+def digest(state, buckets=BUCKETS):
+    """
+    Small summary of a frontier: one CRC per bucket of users plus the sum of all
+    counts as version (counts only grow, so a higher version means newer state).
+    """
+    parts = [[] for _ in range(buckets)]
+    for user, count in state.items():
+        parts[bucket_of(user, buckets)].append(f"{user}={count}")
+    hashes = [zlib.crc32(";".join(sorted(p)).encode("utf-8")) for p in parts]
+    return {"type": "digest", "version": sum(state.values()), "buckets": hashes}
+
+
+def differing_buckets(state, remote):
+    """
+    Buckets in which the local frontier differs from the peer's digest.
+    """
+    local = digest(state, len(remote["buckets"]))["buckets"]
+    return [i for i, (a, b) in enumerate(zip(local, remote["buckets"])) if a != b]
+
+
+def select(state, buckets, total=BUCKETS):
+    wanted = set(buckets)
+    return {user: count for user, count in state.items() if bucket_of(user, total) in wanted}
+
+
+def newer_entries(state, incoming, buckets=None, total=BUCKETS):
+    """
+    Local entries the sender of `incoming` is behind on. Without `buckets` only
+    users named in `incoming` are compared; with `buckets` every local user in
+    those buckets is, so users the sender has never heard of are included too.
+    """
+    if buckets is None:
+        users = incoming.keys()
+    else:
+        users = select(state, buckets, total).keys()
+    return {u: state[u] for u in users if u in state and state[u] > incoming.get(u, -1)}
+
+
+SEED_WINDOW = 5.0  # Sekunden, in denen ein neuer Knoten nur von seinem Seed-Peer synchronisiert
+
+
+class Seed:
+    """
+    Fast start of a new node: instead of waiting for the next periodic
+    broadcast it asks with a "hello" record, and peers answer right away with
+    their digest. The first peer that answers becomes the seed; for `window`
+    seconds only its digests are answered, so the state (and, in task3, the
+    commits) come from one peer instead of from every peer at once.
+    """
+
+    def __init__(self, window=SEED_WINDOW, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.peer = None
+        self.until = 0.0
+
+    def start(self, sender):
+        with self.lock:
+            self.peer = None
+            self.until = self.clock() + self.window
+        return {"type": "hello", "from": sender}
+
+    def accept(self, addr):
+        """
+        Whether a digest from `addr` should be answered.
+        """
+        with self.lock:
+            if self.clock() >= self.until:
+                return True
+            if self.peer is None:
+                self.peer = addr
+            return addr == self.peer
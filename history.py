@@ -0,0 +1,445 @@
+import argparse
+import heapq
+import json
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+
+from utils import quote_name, unquote_name
+import chatlog
+
+HISTORY_FILE = "chat-history"
+SNAPSHOT_SUFFIX = ".snapshot"
+COMPACT_EVERY = 10000  # neue Zeilen seit dem letzten Snapshot, danach wird er neu geschrieben
+PAGE_SIZE = 20
+TAIL = 4096  # letzte Zeilen, gegen die uptodate() die Tips zuerst prüft
+DAY = 86400  # Breite der Zeit-Buckets in Sekunden
+WORD = re.compile(r"\w+")
+
+log = chatlog.get("history")
+
+
+def tokens(message):
+    """
+    The search terms of a message: lower-case words, each once.
+    """
+    return set(WORD.findall(message.lower()))
+
+
+def _contains(rows, row):
+    i = bisect_left(rows, row)
+    return i < len(rows) and rows[i] == row
+
+
+class HistoryIndex:
+    """
+    Searchable message history of a chat repository.
+
+    The index is an append-only file in the git dir with one line per message,
+    "<hash> <author> <epoch> <message as JSON string>" (<author> without
+    spaces, see utils.quote_name), in the order the commits were indexed,
+    which is parents before children. A message's line number is its row. <epoch> is when this node received or created the commit
+    (CommitIndex.indexed_at), as task3.py writes every message with the same
+    author time; without a commit index it is the author time. In memory only
+    row numbers are kept: per author and per word a sorted array of rows, per
+    day the rows with that time, and the file offset of every row; messages are
+    read from the file when they are shown.
+    These arrays are written to a snapshot file now and then and on close(),
+    so opening the index only reads the snapshot and the lines after it.
+
+    query() walks the matching rows from the newest, so results come children
+    before parents (a topological order, like `git log --topo-order`) and a
+    page costs only the rows it returns. The row of the last result is the
+    cursor for the next page (`before`).
+
+    add() records a commit whose message is at hand (posted or received);
+    sync() indexes whatever else the repository got (packs, fetches, commits
+    from before the index existed) by walking back from the branch tips.
+
+    With `readonly` the files are only read, so a running chat can keep
+    writing them: rows that sync() or add() index are kept in memory only and
+    the snapshot is never written.
+    """
+
+    def __init__(self, repo, index, path=None, compact_every=COMPACT_EVERY, readonly=False):
+        self.repo = repo
+        self.index = index
+        self.path = path or os.path.join(repo.git_dir, HISTORY_FILE)
+        self.snapshot_path = self.path + SNAPSHOT_SUFFIX
+        self.compact_every = compact_every
+        self.readonly = readonly
+        self.lock = threading.Lock()
+        self.unsaved = {}  # Zeile -> Zeile der Datei, nur readonly: nicht geschrieben
+        self._reset()
+        self.load()
+        if readonly:
+            self.file = None
+            self.reader = os.open(self.path if os.path.exists(self.path) else os.devnull, os.O_RDONLY)
+        else:
+            # Ungepuffert: jede indizierte Zeile steht schon in der Datei und kann gelesen werden
+            self.file = open(self.path, "ab", buffering=0)
+            self.reader = os.open(self.path, os.O_RDONLY)
+
+    @property
+    def known(self):
+        if self._known is None:
+            hashes = bytes(self.hashes)
+            self._known = {hashes[i:i + 20] for i in range(0, len(hashes), 20)}
+        return self._known
+
+    def load(self):
+        """
+        Restore the arrays from the snapshot, if any, and index the lines
+        appended to the file after it.
+        """
+        if not os.path.exists(self.path):
+            return
+        if os.path.exists(self.snapshot_path):
+            try:
+                self._load_snapshot()
+            except (ValueError, KeyError) as e:
+                log.warning("Ignoring unreadable history snapshot: %s", e)
+                self._reset()
+        # Nur ein Schreiber hängt an, und nur Unbekanntes: Doppelte gibt es höchstens im Rest nach dem Snapshot
+        tail = set()
+        with open(self.path, "rb") as f:
+            f.seek(self.size)
+            offset = self.size
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # halb geschriebene Zeile nach einem Absturz
+                parts = line.decode("utf-8").split(" ", 3)
+                if len(parts) == 4 and parts[0] not in tail:
+                    tail.add(parts[0])
+                    sha, author, epoch, message = parts
+                    self._index(sha, unquote_name(author), int(epoch), json.loads(message), offset)
+                offset += len(line)
+        # Readonly schreibt der Chat vielleicht gerade die letzte Zeile: nicht abschneiden
+        if offset != os.path.getsize(self.path) and not self.readonly:
+            os.truncate(self.path, offset)
+        self.size = offset
+
+    def _reset(self):
+        self.hashes = bytearray()  # Zeile -> Hash, 20 Bytes pro Zeile
+        self._known = None  # Menge der Hashes, erst bei Bedarf aufgebaut
+        self.offsets = array("Q")  # Zeile -> Dateiposition
+        self.times = array("q")  # Zeile -> Autorzeit
+        self.authors = {}  # Autor -> Zeilen
+        self.words = {}  # Wort -> Zeilen
+        self.days = {}  # Tag -> Zeilen
+        self.size = 0  # indizierter Teil der Datei
+        self.snapshot_rows = 0
+
+    def _load_snapshot(self):
+        # Kopfzeile (JSON), dann Hashes, Offsets, Zeiten und alle Zeilenlisten roh
+        with open(self.snapshot_path, "rb") as f:
+            header = json.loads(f.readline())
+            data = memoryview(f.read())
+        if header["size"] > os.path.getsize(self.path):
+            raise ValueError("snapshot is newer than the history file")
+        rows = header["rows"]
+        position = 0
+
+        def take(typecode, count):
+            nonlocal position
+            values = array(typecode)
+            end = position + count * values.itemsize
+            if end > len(data):
+                raise ValueError("truncated snapshot")
+            values.frombytes(data[position:end])
+            position = end
+            return values
+
+        self.hashes = bytearray(take("B", 20 * rows))
+        self.offsets = take("Q", rows)
+        self.times = take("q", rows)
+        self.authors = {author: take("I", count) for author, count in header["authors"]}
+        self.words = {word: take("I", count) for word, count in header["words"]}
+        self.days = {day: take("I", count) for day, count in header["days"]}
+        self.size = header["size"]
+        self.snapshot_rows = rows
+
+    def compact(self):
+        with self.lock:
+            self._compact()
+
+    def _compact(self):
+        header = {
+            "rows": len(self.offsets),
+            "size": self.size,
+            "authors": [[author, len(rows)] for author, rows in self.authors.items()],
+            "words": [[word, len(rows)] for word, rows in self.words.items()],
+            "days": [[day, len(rows)] for day, rows in self.days.items()],
+        }
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n")
+            f.write(self.hashes)
+            f.write(self.offsets)
+            f.write(self.times)
+            for lists in (self.authors, self.words, self.days):
+                for rows in lists.values():
+                    f.write(rows)
+        os.replace(tmp, self.snapshot_path)
+        self.snapshot_rows = len(self.offsets)
+
+    def _index(self, sha, author, epoch, message, offset):
+        row = len(self.offsets)
+        digest = bytes.fromhex(sha)
+        self.hashes += digest
+        if self._known is not None:
+            self._known.add(digest)
+        self.offsets.append(offset)
+        self.times.append(epoch)
+        self.authors.setdefault(author, array("I")).append(row)
+        self.days.setdefault(epoch // DAY, array("I")).append(row)
+        for word in tokens(message):
+            self.words.setdefault(word, array("I")).append(row)
+
+    def _append(self, sha, author, author_time, message):
+        # Empfangszeit statt Autorzeit, sonst sind --since/--until nutzlos (siehe Klassendoku)
+        epoch = self.index.indexed_at(sha) if self.index is not None else int(author_time.split()[0])
+        line = f"{sha} {quote_name(author)} {epoch} {json.dumps(message, ensure_ascii=False)}\n".encode("utf-8")
+        if self.readonly:
+            self.unsaved[len(self.offsets)] = line
+            self._index(sha, author, epoch, message, 0)
+            return
+        self.file.write(line)
+        # Position nach dem Schreiben: mit O_APPEND auch richtig, wenn ein anderer Prozess anhängt
+        self.size = self.file.tell()
+        self._index(sha, author, epoch, message, self.size - len(line))
+        rows = len(self.offsets)
+        if rows - self.snapshot_rows >= max(self.compact_every, rows // 4):
+            self._compact()
+
+    def __contains__(self, sha):
+        return bytes.fromhex(sha) in self.known
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def add(self, sha, author, author_time, message, parents):
+        """
+        Index a commit that was just created or applied. Parents that are not
+        indexed yet are synced first, so rows stay parents before children.
+        """
+        with self.lock:
+            if bytes.fromhex(sha) in self.known:
+                return
+            unknown = [parent for parent in parents if bytes.fromhex(parent) not in self.known]
+            if unknown:
+                self._sync(unknown)
+            self._append(sha, author, author_time, message)
+
+    def sync(self, tips=None):
+        """
+        Index every commit reachable from `tips` (default: all branch tips)
+        that is not indexed yet. Returns the number of new rows.
+        """
+        with self.lock:
+            return self._sync(self.repo.tips().values() if tips is None else tips)
+
+    def _sync(self, tips):
+        new = []
+        seen = set()
+        stack = list(tips)
+        while stack:
+            sha = stack.pop()
+            if sha in seen or bytes.fromhex(sha) in self.known or self.index.pruned(sha):
+                continue
+            seen.add(sha)
+            new.append(sha)
+            stack.extend(self.index.parents(sha))
+        with self.index.lock:
+            # Der Chat-Thread ändert generation gleichzeitig
+            generation = {sha: self.index.generation.get(sha, 0) for sha in new}
+        new.sort(key=generation.__getitem__)
+        for sha in new:
+            commit = self.repo.read_commit(sha)
+            self._append(sha, commit["author"], commit["author_time"], commit["message"])
+        return len(new)
+
+    def uptodate(self, tips=None):
+        """
+        Whether all branch tips ({ref: hash}, default: the repository's) are
+        indexed, so sync() has nothing to do. Without building the set of
+        all hashes: a tip is usually the last row of its author (the branch
+        name) or among the last TAIL rows.
+        """
+        tips = self.repo.tips() if tips is None else tips
+        if self._known is not None:
+            return all(bytes.fromhex(sha) in self._known for sha in tips.values())
+        hashes = self.hashes
+        recent = bytes(hashes[-20 * TAIL:])
+        recent = {recent[i:i + 20] for i in range(0, len(recent), 20)}
+        for ref, sha in tips.items():
+            digest = bytes.fromhex(sha)
+            rows = self.authors.get(ref.rpartition("/")[2])
+            if rows and hashes[20 * rows[-1]:20 * rows[-1] + 20] == digest or digest in recent:
+                continue
+            position = hashes.find(digest)
+            while position > 0 and position % 20:  # nur an Zeilengrenzen
+                position = hashes.find(digest, position + 1)
+            if position < 0:
+                return False
+        return True
+
+    def read(self, row):
+        """
+        The message at `row`: {"row", "hash", "author", "time", "message"}.
+        """
+        data = self.unsaved.get(row)
+        if data is None:
+            data = self._pread(self.offsets[row])
+        sha, author, epoch, message = data.partition(b"\n")[0].decode("utf-8").split(" ", 3)
+        return {"row": row, "hash": sha, "author": unquote_name(author), "time": int(epoch),
+                "message": json.loads(message)}
+
+    def _pread(self, offset):
+        data = os.pread(self.reader, 512, offset)
+        while b"\n" not in data:
+            more = os.pread(self.reader, 4096, offset + len(data))
+            if not more:
+                break
+            data += more
+        return data
+
+    def rows(self, author=None, words=(), since=None, until=None, before=None):
+        """
+        Rows matching all given conditions, newest first: messages by `author`,
+        containing every word in `words`, received in [since, until] (see
+        HistoryIndex), below the row `before`.
+        """
+        end = len(self.offsets) if before is None else min(before, len(self.offsets))
+        lists = []
+        if author is not None:
+            lists.append(self.authors.get(author, array("I")))
+        for word in words:
+            for token in tokens(word):
+                lists.append(self.words.get(token, array("I")))
+        if lists:
+            lists.sort(key=len)
+            first, rest = lists[0], lists[1:]
+            candidates = (first[i] for i in range(bisect_left(first, end) - 1, -1, -1))
+        elif since is not None or until is not None:
+            # Nur Zeitraum: die betroffenen Tage, zusammengeführt nach Zeile
+            low = since // DAY if since is not None else min(self.days, default=0)
+            high = until // DAY if until is not None else max(self.days, default=0)
+            days = [self.days[day] for day in self.days if low <= day <= high]
+            rest = []
+            candidates = heapq.merge(*(reversed(rows[:bisect_left(rows, end)]) for rows in days), reverse=True)
+        else:
+            rest = []
+            candidates = range(end - 1, -1, -1)
+        times = self.times
+        for row in candidates:
+            if since is not None and times[row] < since:
+                continue
+            if until is not None and times[row] > until:
+                continue
+            if all(_contains(rows, row) for rows in rest):
+                yield row
+
+    def query(self, author=None, words=(), since=None, until=None, before=None):
+        """
+        Stream the matching messages, newest first (see rows()).
+        """
+        for row in self.rows(author, words, since, until, before):
+            yield self.read(row)
+
+    def page(self, limit=PAGE_SIZE, **conditions):
+        """
+        One page of query(): (messages, cursor for the next page or None).
+        """
+        messages = []
+        for row in self.rows(**conditions):
+            if len(messages) == limit:
+                return messages, messages[-1]["row"]
+            messages.append(self.read(row))
+        return messages, None
+
+    def stats(self):
+        return {
+            "messages": len(self.offsets),
+            "authors": len(self.authors),
+            "words": len(self.words),
+            "bytes": self.size,
+        }
+
+    def close(self):
+        if not self.readonly:
+            with self.lock:
+                if len(self.offsets) > self.snapshot_rows:
+                    self._compact()
+            self.file.close()
+        os.close(self.reader)
+
+
+def parse_time(value):
+    """
+    Epoch seconds or an ISO date/time (UTC unless it has an offset).
+    """
+    if value.isdigit():
+        return int(value)
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+def show(message):
+    moment = time.strftime("%Y-%m-%d %H:%M", time.gmtime(message["time"]))
+    return f"{message['author']} ({moment}): {message['message']}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Page through or search the chat history of a repository")
+    parser.add_argument("words", nargs="*", help="Only messages containing all of these words")
+    parser.add_argument("-C", "--repo", default=".", help="Chat repository (default: the current directory)")
+    parser.add_argument("-a", "--author", help="Only messages by this author")
+    parser.add_argument("--since", type=parse_time, help="Only messages received at or after this time (epoch or ISO)")
+    parser.add_argument("--until", type=parse_time, help="Only messages received at or before this time (epoch or ISO)")
+    parser.add_argument("-n", "--limit", type=int, help=f"Messages per page, e.g. {PAGE_SIZE}; all if not set")
+    parser.add_argument("--before", type=int, help="Cursor printed after the previous page")
+    parser.add_argument("--backend", choices=["batch", "subprocess"], default="batch")
+    args = parser.parse_args(argv)
+
+    from gitstore import open_backend
+    from commit_index import CommitIndex
+    repo = open_backend(args.backend, cwd=args.repo)
+    # Nur lesen: ein laufender Chat schreibt dieselben Dateien und hält ihre Größe im Speicher
+    history = HistoryIndex(repo, None, readonly=True)
+    index = None
+    try:
+        if not history.uptodate():
+            # Nur wenn der Chat nicht alles indiziert hat: Commit-Index laden und im Speicher nachziehen
+            index = history.index = CommitIndex(repo, readonly=True)
+            history.sync()
+        conditions = dict(author=args.author, words=args.words, since=args.since, until=args.until,
+                          before=args.before)
+        out = sys.stdout
+        if args.limit is None:
+            for message in history.query(**conditions):
+                out.write(show(message) + "\n")
+        else:
+            messages, cursor = history.page(args.limit, **conditions)
+            out.write("".join(show(message) + "\n" for message in messages))
+            if cursor is not None:
+                out.write(f"-- more: --before {cursor}\n")
+    except BrokenPipeError:
+        # z.B. | head: Rest verwerfen, ohne dass Python beim Beenden erneut schreibt
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        history.close()
+        if index is not None:
+            index.close()
+        repo.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import bisect
+import os
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+SIZE_BUCKETS = (64, 256, 576, 1024, 1500, 4096, 16384, 65536)
+DUMP_INTERVAL = 10  # Sekunden zwischen zwei Stats-Dateien
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    """
+    Monotonic counter, optionally per label values.
+    """
+
+    def __init__(self, registry, name, help, labels=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.values = {}  # Label-Werte -> Zählerstand
+
+    def inc(self, value=1, *labels):
+        if not self.registry.enabled:
+            return
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self.lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed bucket bounds, as in the Prometheus text format.
+    """
+
+    def __init__(self, registry, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {}  # Label-Werte -> [Zähler pro Bucket (+Inf zuletzt), Summe]
+
+    def observe(self, value, *labels):
+        if not self.registry.enabled:
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self.lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self.series.items())
+        for labels, counts, total in series:
+            running = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                running += count
+                yield f"{self.name}_bucket{_labels(self.labels + ('le',), labels + (bound,))} {running}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {running}"
+
+
+class Gauge:
+    """
+    Value read from a callback when the metrics are rendered (e.g. a queue depth).
+    """
+
+    def __init__(self, registry, name, help, fn):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        try:
+            yield f"{self.name} {self.fn()}"
+        except Exception as e:
+            yield f"# {self.name} unavailable: {e}"
+
+
+class Registry:
+    """
+    Process-wide metrics. While disabled (the default) counters and histograms
+    return right away and instrument() leaves methods untouched, so the chats
+    pay one attribute check per call site and nothing else.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.metrics = {}  # Name -> Metrik, in Registrierungsreihenfolge
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(self, name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get(Counter, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets)
+
+    def gauge(self, name, help, fn):
+        # Mehrere Chats in einem Prozess: der zuletzt registrierte liefert den Wert
+        gauge = self._get(Gauge, name, help, fn)
+        gauge.fn = fn
+        return gauge
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Gemeinsame Metriken aller Chats
+PACKETS_RECEIVED = REGISTRY.counter("chat_packets_received_total", "Datagrams received")
+BYTES_RECEIVED = REGISTRY.counter("chat_bytes_received_total", "Bytes received")
+PACKETS_DROPPED = REGISTRY.counter("chat_packets_dropped_total", "Datagrams dropped before handling", ("reason",))
+RECEIVE_ERRORS = REGISTRY.counter("chat_receive_errors_total", "Datagrams that failed to decode or handle")
+PACKETS_SENT = REGISTRY.counter("chat_packets_sent_total", "Datagrams sent")
+BYTES_SENT = REGISTRY.counter("chat_bytes_sent_total", "Bytes sent")
+BROADCAST_BYTES = REGISTRY.histogram("chat_broadcast_bytes", "Bytes sent per broadcast interval",
+                                     buckets=SIZE_BUCKETS)
+CALL_SECONDS = REGISTRY.histogram("chat_call_seconds", "Time spent in instrumented functions", ("function",))
+GIT_SECONDS = REGISTRY.histogram("chat_git_seconds", "Duration of git subprocesses", ("command",))
+PACKET_CACHE = REGISTRY.counter("chat_packet_cache_total", "Commit packet cache lookups", ("result",))
+PRUNED_COMMITS = REGISTRY.counter("chat_pruned_commits_total", "Commits removed by the history retention policy")
+
+
+def timed(fn, name=None):
+    """
+    Wrap `fn` so every call is observed in chat_call_seconds.
+    """
+    name = name or fn.__name__
+    observe = CALL_SECONDS.observe
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            observe(time.perf_counter() - start, name)
+    return wrapper
+
+
+def instrument(obj, names):
+    """
+    Replace the methods `names` of `obj` by timed versions, if metrics are on.
+    """
+    if not REGISTRY.enabled:
+        return
+    for name in names:
+        setattr(obj, name, timed(getattr(obj, name), name))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keine Zeile pro Abfrage auf der Konsole
+
+
+def serve(port, host="127.0.0.1"):
+    """
+    Serve the metrics as text on http://host:port/metrics from a daemon thread.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def dump(path):
+    # Atomar ersetzen, damit Leser nie eine halbe Datei sehen
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp, path)
+
+
+def dump_loop(path, interval=DUMP_INTERVAL):
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                dump(path)
+            except OSError as e:
+                print(f"Unable to write metrics to {path}: {e}")
+    threading.Thread(target=loop, daemon=True).start()
+
+
+def start(target):
+    """
+    Enable metrics and expose them: a port number serves HTTP on localhost,
+    anything else is a file rewritten every DUMP_INTERVAL seconds.
+    Must be called before the chat is built, so instrument() wraps its methods.
+    """
+    REGISTRY.enabled = True
+    if str(target).isdigit():
+        serve(int(target))
+        print(f"Metrics on http://127.0.0.1:{target}/metrics")
+    else:
+        dump_loop(os.path.abspath(target))
+        print(f"Metrics written to {target} every {DUMP_INTERVAL}s")
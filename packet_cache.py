@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+
+from codec import EncodedCommit
+from metrics import PACKET_CACHE
+
+CACHE_ENTRIES = 4096
+CACHE_BYTES = 8 * 1024 * 1024
+ENTRY_OVERHEAD = 400  # Dict und Strings eines Records, grob
+
+
+class PacketCache:
+    """
+    Bounded LRU cache of commit records ready to send, keyed by commit hash.
+
+    Commits never change, so a record built once (read from the repo, parsed,
+    its fields encoded for the binary codec, see codec.EncodedCommit) serves
+    every later catch-up request for that commit. put() pre-fills the cache
+    when a commit is created locally or received; get() builds on a miss.
+    """
+
+    def __init__(self, build, max_entries=CACHE_ENTRIES, max_bytes=CACHE_BYTES):
+        self.build = build  # hash -> Commit-Record
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # hash -> EncodedCommit
+        self.bytes = 0
+        # Metriken
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def get(self, sha):
+        with self.lock:
+            record = self.entries.get(sha)
+            if record is not None:
+                self.entries.move_to_end(sha)
+                self.hits += 1
+        if record is not None:
+            PACKET_CACHE.inc(1, "hit")
+            return record
+        PACKET_CACHE.inc(1, "miss")
+        # Außerhalb des Locks: liest aus dem Repo
+        record = self.put(sha, self.build(sha))
+        with self.lock:
+            self.misses += 1
+        return record
+
+    def put(self, sha, record):
+        """
+        Cache the record of commit `sha`; returns it as an EncodedCommit.
+        """
+        if not isinstance(record, EncodedCommit):
+            try:
+                record = EncodedCommit(record)
+            except (KeyError, AttributeError, ValueError):
+                record = EncodedCommit(record, b"")  # nicht binär kodierbar, geht als JSON
+        size = len(record.fields) + ENTRY_OVERHEAD
+        with self.lock:
+            old = self.entries.pop(sha, None)
+            if old is not None:
+                self.bytes -= len(old.fields) + ENTRY_OVERHEAD
+            self.entries[sha] = record
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= len(evicted.fields) + ENTRY_OVERHEAD
+                self.evicted += 1
+        return record
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evicted": self.evicted,
+            }
@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+
+MAX_PENDING = 10000  # Commits
+MAX_PENDING_BYTES = 16 * 1024 * 1024
+MAX_AGE = 300  # Sekunden; Peers schicken verworfene Commits beim nächsten Abgleich erneut
+
+
+def _size(payload):
+    return len(payload["message"]) + 41 * len(payload["parents"]) + 128
+
+
+class PendingBuffer:
+    """
+    Out-of-order commits indexed by the parent hashes they are still waiting for.
+
+    resolve(hash) is called whenever a commit is created and returns the waiting
+    commits whose last missing parent that was, so they can be applied straight
+    away. The buffer is bounded by count, bytes and age; the oldest entries are
+    evicted first.
+    """
+
+    def __init__(self, max_items=MAX_PENDING, max_bytes=MAX_PENDING_BYTES, max_age=MAX_AGE):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.items = OrderedDict()  # key -> (payload, missing parents, added at)
+        self.waiting = {}  # parent hash -> {keys}
+        self.bytes = 0
+        # Metriken
+        self.max_depth = 0
+        self.added = 0
+        self.released = 0
+        self.evicted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @staticmethod
+    def key(payload):
+        return (payload["author"], payload["author_time"], payload["message"], tuple(payload["parents"]))
+
+    def add(self, payload, missing):
+        with self.lock:
+            key = self.key(payload)
+            if key in self.items:
+                return
+            now = time.monotonic()
+            self.items[key] = (payload, set(missing), now)
+            for parent in missing:
+                self.waiting.setdefault(parent, set()).add(key)
+            self.bytes += _size(payload)
+            self.added += 1
+            self.max_depth = max(self.max_depth, len(self.items))
+            self._evict(now)
+
+    def _evict(self, now):
+        while self.items:
+            key, (payload, _, added_at) = next(iter(self.items.items()))
+            if len(self.items) <= self.max_items and self.bytes <= self.max_bytes \
+                    and now - added_at <= self.max_age:
+                return
+            self._remove(key)
+            self.evicted += 1
+
+    def _remove(self, key):
+        payload, missing, added_at = self.items.pop(key)
+        for parent in missing:
+            keys = self.waiting.get(parent)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.waiting[parent]
+        self.bytes -= _size(payload)
+        return payload, added_at
+
+    def resolve(self, sha):
+        """
+        Mark `sha` as present; returns the payloads that have no missing parents left.
+        """
+        with self.lock:
+            keys = self.waiting.pop(sha, ())
+            ready = []
+            now = time.monotonic()
+            for key in keys:
+                _, missing, _ = self.items[key]
+                missing.discard(sha)
+                if not missing:
+                    payload, added_at = self._remove(key)
+                    waited = now - added_at
+                    self.wait_total += waited
+                    self.wait_max = max(self.wait_max, waited)
+                    self.released += 1
+                    ready.append(payload)
+            self._evict(now)
+            return ready
+
+    def parents(self):
+        """
+        Hashes the buffered commits are still waiting for.
+        """
+        with self.lock:
+            return list(self.waiting)
+
+    def __len__(self):
+        return len(self.items)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "depth": len(self.items),
+                "max_depth": self.max_depth,
+                "bytes": self.bytes,
+                "added": self.added,
+                "released": self.released,
+                "evicted": self.evicted,
+                "wait_avg": self.wait_total / self.released if self.released else 0.0,
+                "wait_max": self.wait_max,
+            }
@@ -0,0 +1,86 @@
+import sys
+import threading
+import time
+
+RENDER_RATE = 4  # höchstens so viele Ausgaben pro Sekunde
+
+
+class Renderer:
+    """
+    Prints frontier changes from its own thread, so callers never wait on the
+    console while they hold the chat lock.
+
+    update() only records the new counts and wakes the thread. The thread
+    collects changes for at most 1/rate seconds and then writes one block
+    with the entries that differ from what was printed last (the whole table
+    on the first draw); with rate 0 it draws on every wake-up. Counts only
+    grow, so a late update with an older count is ignored. With
+    `headless=True` nothing is printed and update() returns immediately, for
+    servers without a terminal.
+    """
+
+    def __init__(self, title, footer, rate=RENDER_RATE, headless=False, extra=None, out=None):
+        self.title = title
+        self.footer = footer
+        self.rate = rate
+        self.headless = headless
+        self.extra = extra  # optional: liefert eine zusätzliche Zeile oder None
+        self.out = out if out is not None else sys.stdout
+        self.lock = threading.Lock()
+        self.changes = {}  # seit der letzten Ausgabe, user -> count
+        self.shown = {}  # zuletzt ausgegebene Werte
+        self.wake = threading.Event()
+        self.running = not headless
+        self.redraws = 0
+        if self.running:
+            threading.Thread(target=self.loop, daemon=True).start()
+
+    def update(self, entries):
+        if self.headless or not entries:
+            return
+        with self.lock:
+            changes = self.changes
+            for user, count in entries.items():
+                if count > changes.get(user, -1):
+                    changes[user] = count
+        self.wake.set()
+
+    def refresh(self):
+        """
+        Redraw even without changes (e.g. to show the extra line).
+        """
+        if not self.headless:
+            self.wake.set()
+
+    def loop(self):
+        while self.running:
+            self.wake.wait()
+            self.wake.clear()
+            if not self.running:
+                return
+            self.draw()
+            if self.rate:
+                time.sleep(1 / self.rate)  # in der Zwischenzeit wird nur gesammelt
+
+    def draw(self):
+        with self.lock:
+            changes, self.changes = self.changes, {}
+        first = not self.shown
+        changed = {user: count for user, count in changes.items() if count > self.shown.get(user, -1)}
+        self.shown.update(changed)
+        extra = self.extra() if self.extra is not None else None
+        if not changed and extra is None and not first:
+            return
+        lines = [self.title if first else "\nUpdated:"]
+        lines.extend(f"  {user}: {count}" for user, count in sorted((self.shown if first else changed).items()))
+        if extra is not None:
+            lines.append(extra)
+        lines.append(self.footer)
+        # Ein Schreibzugriff pro Ausgabe statt einer Zeile pro Eintrag
+        self.out.write("\n".join(lines) + "\n")
+        self.out.flush()
+        self.redraws += 1
+
+    def close(self):
+        self.running = False
+        self.wake.set()
@@ -0,0 +1,225 @@
+import heapq
+import json
+import os
+import threading
+import time
+
+from gossip import bucket_of
+from metrics import PRUNED_COMMITS
+from utils import run
+import chatlog
+
+SNAPSHOT_REF = "refs/chat/snapshot"
+SNAPSHOT_AUTHOR = "snapshot"
+TOMBSTONES = 64  # gelöschte Commits pro Autor, die als Eltern weiter aufgelöst werden
+GC_INTERVAL = 600  # Sekunden zwischen zwei Aufräumläufen
+GC_PRUNE = "10.minutes.ago"  # jüngere unerreichbare Objekte (gerade geschriebene Commits) lässt gc liegen
+
+log = chatlog.get("retention")
+
+
+class RetentionPolicy:
+    """
+    Which chat commits to keep: none older than `max_age` seconds (counted from
+    when this node received or created them, see CommitIndex.indexed_at),
+    at most the newest `max_per_author` per author, and at most `max_bytes` of
+    commit objects in total (the oldest go first). Every limit is optional; the
+    newest commit of each author, its branch tip, is always kept.
+    """
+
+    def __init__(self, max_age=None, max_per_author=None, max_bytes=None):
+        self.max_age = max_age
+        self.max_per_author = max_per_author
+        self.max_bytes = max_bytes
+
+    def __bool__(self):
+        return any(limit is not None for limit in (self.max_age, self.max_per_author, self.max_bytes))
+
+
+class Retention:
+    """
+    Bounded history for GitbasedChat.
+
+    prune() drops the oldest commits of each author from the commit index,
+    keeping tombstones (hash, author, seq) so sequence numbers and therefore
+    the frontier stay correct. Retained commits with a pruned parent are listed
+    in the git shallow file, like after a shallow clone, so git treats them as
+    roots. A snapshot commit at refs/chat/snapshot records the pruned history
+    in its message and has the retained commits git could no longer reach
+    through the shallow boundary as parents. gc() then expires the chat reflogs
+    and runs `git gc`, which deletes the pruned objects.
+
+    A node whose frontier is below the pruned base of an author cannot get the
+    pruned commits any more; it is sent snapshot() instead and adopt()s its
+    tombstones, after which the retained commits apply as usual.
+    """
+
+    def __init__(self, repo, index, policy=None, keep=TOMBSTONES, gc_prune=GC_PRUNE):
+        self.repo = repo
+        self.index = index
+        self.policy = policy or RetentionPolicy()
+        self.keep = keep
+        self.gc_prune = gc_prune
+        self.lock = threading.RLock()  # Shallow-Datei, Snapshot und gc
+        self.shallow_path = os.path.join(repo.git_dir, "shallow")
+        self.sizes = {}  # hash -> Objektgröße; Commits sind unveränderlich
+        # Metriken
+        self.runs = 0
+        self.pruned = 0
+        self.gc_seconds = 0.0
+
+    def select(self):
+        """
+        Per author the highest seq the policy prunes: {author: seq}.
+        """
+        policy = self.policy
+        # Nur Chat-Branches; andere Historie im Repo (main, master) bleibt unangetastet
+        branches = {ref.split("/")[-1] for ref in self.repo.tips()} - {"main", "master", "HEAD"}
+        history = {author: chain for author, chain in self.index.history().items() if author in branches}
+        counts = {}  # Autor -> Anzahl der ältesten Commits, die wegfallen
+        cutoff = time.time() - policy.max_age if policy.max_age is not None else None
+        for author, chain in history.items():
+            limit = len(chain) - 1  # Tip bleibt
+            drop = 0
+            if policy.max_per_author is not None:
+                drop = max(drop, len(chain) - policy.max_per_author)
+            if cutoff is not None:
+                while drop < limit and self._time(chain[drop][1]) < cutoff:
+                    drop += 1
+            counts[author] = min(drop, limit)
+        if policy.max_bytes is not None:
+            self._select_bytes(history, counts)
+        return {author: history[author][drop - 1][0] for author, drop in counts.items() if drop}
+
+    def _select_bytes(self, history, counts):
+        # Älteste Commits (kleinste Generation) zuerst, pro Autor immer von unten
+        total = sum(self._size(sha) for author, chain in history.items() for _, sha, _ in chain[counts[author]:])
+        heap = [(chain[counts[author]][2], author) for author, chain in history.items()
+                if counts[author] < len(chain) - 1]
+        heapq.heapify(heap)
+        while total > self.policy.max_bytes and heap:
+            _, author = heapq.heappop(heap)
+            chain = history[author]
+            total -= self._size(chain[counts[author]][1])
+            counts[author] += 1
+            if counts[author] < len(chain) - 1:
+                heapq.heappush(heap, (chain[counts[author]][2], author))
+
+    def _size(self, sha):
+        size = self.sizes.get(sha)
+        if size is None:
+            size = self.sizes[sha] = self.repo.size(sha)
+        return size
+
+    def _time(self, sha):
+        # Empfangszeit statt Autorzeit: task3 schreibt Nachrichten mit fester Autorzeit
+        return self.index.indexed_at(sha)
+
+    def prune(self):
+        """
+        Apply the policy. Returns the number of commits pruned.
+        """
+        cut = self.select()
+        if not cut:
+            return 0
+        with self.lock:
+            pruned, boundary = self.index.prune(cut, self.keep)
+            if not pruned:
+                return 0
+            for sha in pruned:
+                self.sizes.pop(sha, None)
+            self._write_shallow(boundary)
+            tips = self.repo.tips()
+            anchors = self.index.anchors(tips.values(), boundary)
+            snapshot = self.repo.create_commit(anchors, "Chat snapshot\n\n" + json.dumps(self.snapshot()),
+                                               SNAPSHOT_AUTHOR, f"{int(time.time())} +0000")
+            self.repo.update_ref(SNAPSHOT_REF, snapshot)
+        self.pruned += len(pruned)
+        PRUNED_COMMITS.inc(len(pruned))
+        log.info("Pruned %d commits, %d on the shallow boundary, %d anchors",
+                 len(pruned), len(boundary), len(anchors))
+        return len(pruned)
+
+    def _write_shallow(self, commits):
+        tmp = f"{self.shallow_path}.tmp"
+        with open(tmp, "w") as f:
+            f.writelines(f"{sha}\n" for sha in sorted(commits))
+        os.replace(tmp, self.shallow_path)
+
+    def mark_shallow(self, sha):
+        """
+        Add a commit whose parents include a pruned one to the shallow boundary.
+        """
+        with self.lock:
+            with open(self.shallow_path, "a") as f:
+                f.write(f"{sha}\n")
+
+    def gc(self):
+        """
+        Delete the pruned objects: expire the reflogs of the chat refs, which
+        still name old tips, and run `git gc`.
+        """
+        start = time.perf_counter()
+        with self.lock:
+            refs = [f"refs/heads/{author}" for author in self.index.bases()] + [SNAPSHOT_REF]
+            with open(os.path.join(self.repo.git_dir, "HEAD")) as f:
+                if f.read().strip().removeprefix("ref: ") in refs:
+                    refs.append("HEAD")  # HEAD protokolliert die Updates seines Branches mit
+            refs = [ref for ref in refs if os.path.exists(os.path.join(self.repo.git_dir, "logs", ref))]
+            if refs:
+                run(["git", "reflog", "expire", "--expire=now", "--expire-unreachable=now"] + refs,
+                    cwd=self.repo.cwd)
+            run(["git", "gc", "--quiet", f"--prune={self.gc_prune}"], cwd=self.repo.cwd)
+        self.gc_seconds += time.perf_counter() - start
+
+    def run_once(self):
+        # Ohne Unterbrechung: ein neuer Shallow-Commit zwischen Anker-Berechnung
+        # und gc könnte sonst seine Eltern unerreichbar machen
+        with self.lock:
+            self.runs += 1
+            if self.prune():
+                self.gc()
+
+    def loop(self, interval=GC_INTERVAL):
+        while True:
+            time.sleep(interval)
+            try:
+                self.run_once()
+            except Exception as e:
+                log.warning("History pruning failed: %s", e)
+
+    def snapshot(self):
+        """
+        The pruned history as a record: base seq per author and the tombstones
+        a node needs to apply the retained commits.
+        """
+        boundary = self.index.boundary()
+        return {
+            "type": "snapshot",
+            "base": self.index.bases(),
+            "tombstones": [[sha, author, seq] for sha, (author, seq) in sorted(boundary.items())],
+        }
+
+    def behind(self, remote_frontier, buckets=None, partial=False):
+        """
+        Whether a peer with this frontier lacks commits that were pruned here.
+        With `partial` only the authors it names count.
+        """
+        wanted = set(buckets) if buckets is not None else None
+        return any(remote_frontier.get(author, 0) < seq for author, seq in self.index.bases().items()
+                   if (wanted is None or bucket_of(author) in wanted)
+                   and (not partial or author in remote_frontier))
+
+    def adopt(self, record):
+        """
+        Take over the tombstones of a peer's snapshot. Returns the new hashes.
+        """
+        return self.index.tombstones(tuple(entry) for entry in record["tombstones"])
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "pruned": self.pruned,
+            "gc_seconds": self.gc_seconds,
+            "base": self.index.bases(),
+        }
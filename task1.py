@@ -1,50 +1,132 @@
-import json
+import contextlib
 import threading
 import time
 import sys
 
-from utils import cli, setup_socket
+from utils import cli
+from wire import Packer, Reassembler
+from transport import RCVBUF, SNDBUF, Transport
+from gossip import differing_buckets, digest, newer_entries, select
+from aio_chat import frontier_engine
+from frontier import Frontier, ShardedFrontier
+from topology import Topology
+import metrics
+import chatlog
+from render import RENDER_RATE, Renderer
 
 PACKET_SIZE_LIMIT = 576
 
+log = chatlog.get("task1")
+
 
 class FrontierChat:
-    def __init__(self, username, port, host, interval):
+    def __init__(self, username, port, host, interval, mtu=PACKET_SIZE_LIMIT, gossip="digest", start=True,
+                 headless=False, render_rate=RENDER_RATE, receivers=1, rcvbuf=RCVBUF, sndbuf=SNDBUF, topology=None,
+                 idle=None):
         self.username = username
-        self.state = {username: 0}  # eigene Nachrichtenzahl
-        self.lock = threading.Lock()
+        # Nachrichtenzahl pro Nutzer (siehe frontier.py); mehrere Empfänger-Threads
+        # schreiben in einen ShardedFrontier, der sich selbst synchronisiert
+        self.receivers = receivers
+        self.state = Frontier({username: 0}, track=bool(idle)) if receivers == 1 else ShardedFrontier({username: 0})
+        self.lock = threading.Lock() if receivers == 1 else contextlib.nullcontext()
         self.running = True
         self.port = port
         self.host = host
         self.interval = interval
-
-        # UDP Socket für Broadcast (aus utils.py)
-        self.sock = setup_socket('', self.port)
-
-        # Empfang starten
-        threading.Thread(target=self.listen, daemon=True).start()
-
-        # Broadcast starten (alle x Sekunden)
-        threading.Thread(target=self.broadcast_loop, daemon=True).start()
+        self.gossip = gossip  # "digest": nur Digest + Unterschiede, "full": ganzer Zustand
+        self.idle = idle  # Sekunden, nach denen stille Peers aus dem Broadcast fallen (siehe frontier.py)
+
+        # Zustand in Datagramme <= mtu verpacken bzw. wieder zusammensetzen
+        self.packer = Packer(mtu)
+        self.reassembler = Reassembler()
+
+        # Ausgabe im eigenen Thread, höchstens render_rate Mal pro Sekunde (siehe render.py)
+        self.renderer = Renderer("\nMessages sent:", "Press 'ENTER' to send message...",
+                                 rate=render_rate, headless=headless)
+        self.renderer.update(dict(self.state))
+
+        # Broadcast, Multicast-Gruppe oder Relays (siehe topology.py)
+        self.topology = topology or Topology(port, host)
+
+        # UDP Socket für Broadcast (siehe transport.py); send() geht über self.sock,
+        # das andere Engines (aio_chat.py, Simulation) ersetzen können
+        self.transport = Transport(self.port, rcvbuf=rcvbuf, sndbuf=sndbuf, groups=self.topology.groups(),
+                                   interface=self.topology.interface, ttl=self.topology.ttl)
+        self.sock = self.transport.sock
+
+        # Zeitmessung der Hot Paths, nur wenn Metriken eingeschaltet sind (siehe metrics.py)
+        metrics.instrument(self, ("handle", "handle_digest", "merge"))
+        metrics.REGISTRY.gauge("chat_frontier_peers", "Users in the frontier", lambda: len(self.state))
+        metrics.REGISTRY.gauge("chat_frontier_archived", "Idle users moved out of the frontier",
+                               lambda: len(self.state.archive))
+
+        # Ohne start übernimmt eine andere Engine (z.B. aio_chat.py) Empfang und Broadcast
+        if start:
+            # Empfang starten, bei receivers > 1 lesen mehrere Threads vom selben Socket
+            for _ in range(receivers):
+                threading.Thread(target=self.listen, daemon=True).start()
+
+            # Broadcast starten (alle x Sekunden)
+            threading.Thread(target=self.broadcast_loop, daemon=True).start()
 
     def listen(self):
         while self.running:
             try:
-                data, _ = self.sock.recvfrom(PACKET_SIZE_LIMIT)
-                message = json.loads(data.decode('utf-8'))
-                self.merge(message)
-            except Exception as e:
-                print("Fehler beim Empfang:", e)
+                batch = self.transport.receive()
+            except OSError as e:
+                metrics.RECEIVE_ERRORS.inc()
+                log.warning("Fehler beim Empfang: %s", e)
+                continue
+            for data, addr in batch:
+                metrics.PACKETS_RECEIVED.inc()
+                metrics.BYTES_RECEIVED.inc(len(data))
+                try:
+                    for message in self.reassembler.feed(data, addr):
+                        self.handle(message, addr)
+                except Exception as e:
+                    metrics.RECEIVE_ERRORS.inc()
+                    log.warning("Fehler beim Empfang: %s", e)
+
+    def handle(self, message, addr):
+        kind = message.get("type")
+        sender = message.get("from")
+        if sender is not None and sender != self.username:
+            with self.lock:
+                self.state.touch(sender, addr)  # Peer lebt, auch wenn er nichts sendet
+        if kind == "digest":
+            self.handle_digest(message, addr)
+        elif kind == "hello":
+            # Neuer Knoten (task2.py): sofort unser Digest an ihn
+            if message.get("from") != self.username:
+                with self.lock:
+                    record = {**digest(self.state.snapshot()), "from": self.username}
+                self.send([record], addr)
+        elif kind == "delta":
+            self.merge(message["state"])
+            # Hat der Sender ältere Einträge als wir, schicken wir ihm unsere
+            with self.lock:
+                newer = newer_entries(self.state.snapshot(), message["state"], message.get("buckets"))
+            if newer:
+                self.send([{"type": "delta", "state": newer}], addr)
+        else:
+            self.merge(message, addr)
+
+    def handle_digest(self, message, addr):
+        if message.get("from") == self.username:
+            return
+        with self.lock:
+            state = self.state.snapshot()
+            buckets = differing_buckets(state, message)
+            entries = select(state, buckets)
+        if buckets:
+            self.send([{"type": "delta", "state": entries, "buckets": buckets}], addr)
 
-    def merge(self, incoming_state):
+    def merge(self, incoming_state, source=None):
         with self.lock:
-            changed = False
-            for user, count in incoming_state.items():
-                if user not in self.state or self.state[user] < count:
-                    self.state[user] = count
-                    changed = True
-            if changed:
-                self.print_state()
+            changed = self.state.merge(incoming_state, source)
+            self.topology.note(changed)
+            # Nur vormerken; ausgegeben wird im Render-Thread
+            self.renderer.update(changed)
 
     def broadcast_loop(self):
         while self.running:
@@ -52,20 +134,40 @@ class FrontierChat:
             self.broadcast()
 
     def broadcast(self):
+        targets = self.topology.fanout()
+        if not targets:
+            return  # Mitglied mit Relays: deren Digest kommt über die eigene Gruppe
         with self.lock:
-            message = json.dumps(self.state)
-        self.sock.sendto(message.encode('utf-8'), (self.host, self.port))
+            if self.idle:
+                evicted = self.state.evict(self.idle, keep=(self.username,))
+                if evicted:
+                    log.debug("Archived %d idle peers", len(evicted))
+            state = self.state.snapshot()
+            records = [{**digest(state), "from": self.username} if self.gossip == "digest" else dict(state)]
+            if self.topology.relay and self.gossip == "digest":
+                # Ein zusammengeführtes Delta für alle Mitglieder statt eines pro Peer
+                changes = self.topology.take()
+                if changes:
+                    records.insert(0, {"type": "delta", "state": changes})
+        metrics.BROADCAST_BYTES.observe(sum(self.send(records, addr) for addr in targets))
+
+    def send(self, records, addr):
+        sent = 0
+        for datagram in self.packer.pack(records):
+            self.sock.sendto(datagram, addr)
+            sent += len(datagram)
+            metrics.PACKETS_SENT.inc()
+        metrics.BYTES_SENT.inc(sent)
+        return sent
 
     def increment_own_count(self):
         with self.lock:
-            self.state[self.username] += 1
-            self.print_state()
-
-    def print_state(self):
-        print("\nMessages sent:")
-        for user, count in sorted(self.state.items()):
-            print(f"  {user}: {count}")
-        print("Press 'ENTER' to send message...")
+            count = self.state.increment(self.username)
+            self.topology.note({self.username: count})
+            self.renderer.update({self.username: count})
+        if self.gossip == "digest":
+            # Änderung sofort verteilen statt auf das nächste Intervall zu warten
+            self.send([{"type": "delta", "state": {self.username: count}}], self.topology.destination())
 
     def run(self):
         print(f"Started chat as '{self.username}'. Press 'ENTER' to simulate sending a message.")
@@ -75,15 +177,30 @@ class FrontierChat:
                 self.increment_own_count()
         except KeyboardInterrupt:
             self.running = False
+            self.renderer.close()
             print("\nExiting...")
 
 
 if __name__ == "__main__":
-    username, port, host, interval, _ = cli()
+    args = cli()
 
-    if len(username) > 16:
+    if len(args.username) > 16:
         print("Username too long (max 16 characters)")
         sys.exit(1)
 
-    app = FrontierChat(username, port, host, interval)
-    app.run()
+    chatlog.setup(args.log_level, args.log_rate, format=args.log_format)
+    if args.metrics:
+        metrics.start(args.metrics)
+
+    topology = Topology.from_args(args, args.port, args.host)
+    if args.engine == "asyncio":
+        app = FrontierChat(args.username, args.port, args.host, args.interval, args.mtu, args.gossip, start=False,
+                           headless=args.headless, render_rate=args.render_rate,
+                           rcvbuf=args.rcvbuf, sndbuf=args.sndbuf, topology=topology, idle=args.idle)
+        print(f"Started chat as '{args.username}'. Press 'ENTER' to simulate sending a message.")
+        frontier_engine(app, args.interval).run()
+    else:
+        app = FrontierChat(args.username, args.port, args.host, args.interval, args.mtu, args.gossip,
+                           headless=args.headless, render_rate=args.render_rate, receivers=args.receivers,
+                           rcvbuf=args.rcvbuf, sndbuf=args.sndbuf, topology=topology, idle=args.idle)
+        app.run()
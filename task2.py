@@ -1,65 +1,152 @@
-import socket
-import json
+import contextlib
 import threading
 import time
 import sys
 import os
 
+from wire import Packer, Reassembler
+from transport import RCVBUF, SNDBUF, Transport
+from gossip import Seed, differing_buckets, digest, newer_entries, select
+from frontier_store import FrontierStore
+from aio_chat import frontier_engine
+from frontier import Frontier, ShardedFrontier
+from topology import Topology
+import metrics
+import chatlog
+from render import RENDER_RATE, Renderer
+from utils import options
 
 BROADCAST_PORT = 6969
 BROADCAST_INTERVAL = 10  # 10 sekunden
 PACKET_SIZE_LIMIT = 576 
 FRONTIER_DIR = "frontiers"
+GROUP_COMMIT = 0.05  # Sekunden, in denen Schreibzugriffe gesammelt werden
+
+log = chatlog.get("task2")
 
 class FrontierChat:
-    def __init__(self, username, temp):
+    def __init__(self, username, temp, mtu=PACKET_SIZE_LIMIT, gossip="digest", start=True,
+                 headless=False, render_rate=RENDER_RATE, receivers=1, rcvbuf=RCVBUF, sndbuf=SNDBUF, topology=None,
+                 seed=True, idle=None):
         self.username = username
         ##self.state = {username: 0}  # eigene Nachrichtenzahl
         self.temp = temp
-        self.lock = threading.Lock()
+        self.receivers = receivers
+        # Mehrere Empfänger-Threads schreiben in einen ShardedFrontier, der sich selbst synchronisiert
+        self.lock = threading.Lock() if receivers == 1 else contextlib.nullcontext()
         self.running = True
-
+        self.gossip = gossip  # "digest": nur Digest + Unterschiede, "full": ganzer Zustand
+        self.idle = idle  # Sekunden, nach denen stille Peers aus dem Broadcast fallen (siehe frontier.py)
+        # Beim Start Zustand von einem Peer holen statt aufs nächste Intervall zu warten (siehe gossip.py)
+        self.seed = Seed() if seed and gossip == "digest" else None
+
+        # Zustand in Datagramme <= mtu verpacken bzw. wieder zusammensetzen
+        self.packer = Packer(mtu)
+        self.reassembler = Reassembler()
         
-        self.state = self.load_state() if not temp else {username: 0}
+        # Nachrichtenzahl pro Nutzer (siehe frontier.py)
+        initial = self.load_state() if not temp else {username: 0}
+        self.state = Frontier(initial, track=bool(idle)) if receivers == 1 else ShardedFrontier(initial)
         if self.username not in self.state:
             self.state[self.username] = 0
 
-        # UDP Socket für Broadcast
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        try:
-            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-        except Exception:
-            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1) # Broadcast erlauben
-        self.sock.bind(('', BROADCAST_PORT)) # mit Broadcastport verbinden
+        # Ausgabe im eigenen Thread, höchstens render_rate Mal pro Sekunde (siehe render.py)
+        self.renderer = Renderer("\nMessages sent:", "Press 'ENTER' to send message...",
+                                 rate=render_rate, headless=headless)
+        self.renderer.update(dict(self.state))
+
+        # Broadcast, Multicast-Gruppe oder Relays (siehe topology.py)
+        self.topology = topology or Topology(BROADCAST_PORT)
+
+        # UDP Socket für Broadcast (siehe transport.py), mit Broadcastport verbinden
+        self.transport = Transport(BROADCAST_PORT, reuse_port=True, rcvbuf=rcvbuf, sndbuf=sndbuf,
+                                   groups=self.topology.groups(), interface=self.topology.interface,
+                                   ttl=self.topology.ttl)
+        self.sock = self.transport.sock
 
+        # Zeitmessung der Hot Paths, nur wenn Metriken eingeschaltet sind (siehe metrics.py)
+        metrics.instrument(self, ("handle", "handle_digest", "merge"))
+        metrics.REGISTRY.gauge("chat_frontier_peers", "Users in the frontier", lambda: len(self.state))
+        metrics.REGISTRY.gauge("chat_frontier_archived", "Idle users moved out of the frontier",
+                               lambda: len(self.state.archive))
 
-        # Empfangen starten
-        threading.Thread(target=self.listen, daemon=True).start()
+        # Ohne start übernimmt eine andere Engine (z.B. aio_chat.py) Empfang und Broadcast
+        if start:
+            # Empfangen starten, bei receivers > 1 lesen mehrere Threads vom selben Socket
+            for _ in range(receivers):
+                threading.Thread(target=self.listen, daemon=True).start()
 
-        # Broadcast starten (alle 10s wirds aktualisiert)
-        threading.Thread(target=self.broadcast_loop, daemon=True).start()
+            # Broadcast starten (alle 10s wirds aktualisiert)
+            threading.Thread(target=self.broadcast_loop, daemon=True).start()
+            self.hello()
 
     def listen(self):
         while self.running:
             try:
-                data, _ = self.sock.recvfrom(PACKET_SIZE_LIMIT)
-                message = json.loads(data.decode('utf-8'))
-                self.merge(message)
-            except Exception as e:
-                print("Error receiving packet:", e)
+                batch = self.transport.receive()
+            except OSError as e:
+                metrics.RECEIVE_ERRORS.inc()
+                log.warning("Error receiving packet: %s", e)
+                continue
+            for data, addr in batch:
+                metrics.PACKETS_RECEIVED.inc()
+                metrics.BYTES_RECEIVED.inc(len(data))
+                try:
+                    for message in self.reassembler.feed(data, addr):
+                        self.handle(message, addr)
+                except Exception as e:
+                    metrics.RECEIVE_ERRORS.inc()
+                    log.warning("Error receiving packet: %s", e)
+
+    def handle(self, message, addr):
+        kind = message.get("type")
+        sender = message.get("from")
+        if sender is not None and sender != self.username:
+            with self.lock:
+                self.state.touch(sender, addr)  # Peer lebt, auch wenn er nichts sendet
+        if kind == "digest":
+            self.handle_digest(message, addr)
+        elif kind == "hello":
+            # Neuer Knoten: sofort unser Digest an ihn, er fragt dann nach den Unterschieden
+            if message.get("from") != self.username:
+                with self.lock:
+                    record = {**digest(self.state.snapshot()), "from": self.username}
+                self.send([record], addr)
+        elif kind == "delta":
+            self.merge(message["state"])
+            # Hat der Sender ältere Einträge als wir, schicken wir ihm unsere
+            with self.lock:
+                newer = newer_entries(self.state.snapshot(), message["state"], message.get("buckets"))
+            if newer:
+                self.send([{"type": "delta", "state": newer}], addr)
+        else:
+            self.merge(message, addr)
+
+    def handle_digest(self, message, addr):
+        if message.get("from") == self.username or (self.seed is not None and not self.seed.accept(addr)):
+            return
+        with self.lock:
+            state = self.state.snapshot()
+            buckets = differing_buckets(state, message)
+            entries = select(state, buckets)
+        if buckets:
+            self.send([{"type": "delta", "state": entries, "buckets": buckets}], addr)
 
-    def merge(self, incoming_state):
+    def merge(self, incoming_state, source=None):
         with self.lock:
-            changed = False
-            for user, count in incoming_state.items():
-                if user not in self.state or self.state[user] < count:
-                    self.state[user] = count
-                    changed = True
+            changed = self.state.merge(incoming_state, source)
             if changed:
-                self.save_state()
-                self.print_state()
+                self.topology.note(changed)
+                self.save_state(changed)
+                # Nur vormerken; ausgegeben wird im Render-Thread
+                self.renderer.update(changed)
+
+    def hello(self):
+        """
+        Ask the peers for their digest right away (see gossip.Seed).
+        """
+        if self.seed is not None:
+            self.send([self.seed.start(self.username)], self.topology.destination())
 
     def broadcast_loop(self):
         while self.running:
@@ -67,50 +154,58 @@ class FrontierChat:
             self.broadcast()
 
     def broadcast(self):
+        targets = self.topology.fanout()
+        if not targets:
+            return  # Mitglied mit Relays: deren Digest kommt über die eigene Gruppe
         with self.lock:
-            message = json.dumps(self.state)
-        self.sock.sendto(message.encode('utf-8'), ('<broadcast>', BROADCAST_PORT))
+            if self.idle:
+                evicted = self.state.evict(self.idle, keep=(self.username,))
+                if evicted:
+                    log.debug("Archived %d idle peers", len(evicted))
+            state = self.state.snapshot()
+            records = [{**digest(state), "from": self.username} if self.gossip == "digest" else dict(state)]
+            if self.topology.relay and self.gossip == "digest":
+                # Ein zusammengeführtes Delta für alle Mitglieder statt eines pro Peer
+                changes = self.topology.take()
+                if changes:
+                    records.insert(0, {"type": "delta", "state": changes})
+        metrics.BROADCAST_BYTES.observe(sum(self.send(records, addr) for addr in targets))
+
+    def send(self, records, addr):
+        sent = 0
+        for datagram in self.packer.pack(records):
+            self.sock.sendto(datagram, addr)
+            sent += len(datagram)
+            metrics.PACKETS_SENT.inc()
+        metrics.BYTES_SENT.inc(sent)
+        return sent
 
     def increment_own_count(self):
         with self.lock:
-            self.state[self.username] += 1
-            self.save_state()
-            self.print_state()
-
-    def print_state(self):
-        print("\nMessages sent:")
-        for user, count in sorted(self.state.items()):
-            print(f"  {user}: {count}")
-        print("Press 'ENTER' to send message...")
+            count = self.state.increment(self.username)
+            self.save_state({self.username: count})
+            self.topology.note({self.username: count})
+            self.renderer.update({self.username: count})
+        if self.gossip == "digest":
+            # Änderung sofort verteilen statt auf das nächste Intervall zu warten
+            self.send([{"type": "delta", "state": {self.username: count}}], self.topology.destination())
 
     def load_state(self):
-        path = os.path.join(FRONTIER_DIR, self.username)
-        state = {}
-        if os.path.isdir(path):
-            for filename in os.listdir(path):
-                try:
-                    peer = filename.replace(".txt", "")
-                    with open(os.path.join(path, filename), "r") as f:
-                     count = int(f.read().strip())
-                     state[peer] = count
-                except Exception as e:
-                    print(f"Unable to load state for file {filename}: {e}" )
-        return state
-
-        
+        # Write-ahead-Log + Snapshot (siehe frontier_store.py), alte .txt-Dateien werden übernommen
+        self.store = FrontierStore(os.path.join(FRONTIER_DIR, self.username), group_commit=GROUP_COMMIT)
+        try:
+            return self.store.load()
+        except Exception as e:
+            log.error("Unable to load state: %s", e)
+            return {}
 
-    def save_state(self):
+    def save_state(self, changed=None):
         if self.temp:
             return
-        path = os.path.join(FRONTIER_DIR, self.username)
-        os.makedirs(path, exist_ok=True)
-        for peer, count in self.state.items():
-            try:
-                with open(os.path.join(path, f"{peer}.txt"), 'w') as f:
-                    f.write(str(count))
-            except Exception as e:
-             print(f"Unable to save the state for {peer}...: {e}")
-       
+        try:
+            self.store.update(self.state if changed is None else changed)
+        except Exception as e:
+            log.error("Unable to save the state: %s", e)
 
     def run(self):
         print(f"Started chat as '{self.username}'. Press 'ENTER' to simulate sending a message.")
@@ -120,15 +215,22 @@ class FrontierChat:
                 self.increment_own_count()
         except KeyboardInterrupt:
             self.running = False
+            self.close()
             print("\nExiting...")
 
+    def close(self):
+        self.renderer.close()
+        if not self.temp:
+            self.store.close()
+
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python task01.py <username> <--temp>")
+    if len(sys.argv) < 3:
+        print("Usage: python task01.py <username> <--temp> [--asyncio] [--headless] [options, see --help after --temp]")
         print("If you want to store frontiers replace --temp with store")
         sys.exit(1)
+    args = options(sys.argv[3:], receivers=True, relays=True)
 
     username = sys.argv[1]
     if len(username) > 16:
@@ -136,8 +238,17 @@ if __name__ == "__main__":
         sys.exit(1)
 
     temp = sys.argv[2] == "--temp"
+    topology = Topology.from_args(args, BROADCAST_PORT)
     
-    
-
-    app = FrontierChat(username, temp)
-    app.run()
\ No newline at end of file
+    chatlog.setup(args.log_level, args.log_rate, format=args.log_format)
+    if args.metrics:
+        metrics.start(args.metrics)
+    if args.asyncio:
+        app = FrontierChat(username, temp, start=False, headless=args.headless, receivers=args.receivers,
+                          render_rate=args.render_rate, rcvbuf=args.rcvbuf, sndbuf=args.sndbuf, topology=topology, idle=args.idle)
+        print(f"Started chat as '{username}'. Press 'ENTER' to simulate sending a message.")
+        frontier_engine(app, BROADCAST_INTERVAL, on_close=app.close, on_start=app.hello).run()
+    else:
+        app = FrontierChat(username, temp, headless=args.headless, receivers=args.receivers,
+                          render_rate=args.render_rate, rcvbuf=args.rcvbuf, sndbuf=args.sndbuf, topology=topology, idle=args.idle)
+        app.run()
\ No newline at end of file
@@ -1,310 +1,524 @@
-import socket
-import json
+import queue
 import threading
 import time
 import sys
 import os
 import tempfile
 import shutil
-from utils import run
+from utils import options, run
+from gitstore import EMPTY_TREE, init_repo, open_backend, valid_branch
+from commit_index import CommitIndex
+from wire import Packer, Reassembler
+from transport import RCVBUF, SNDBUF, Transport
+from gossip import Seed, bucket_of, differing_buckets, digest, select
+from frontier import Frontier
+from frontier_store import FrontierStore
+from aio_chat import git_engine
+from pending import PendingBuffer
+from catchup import AckBatcher, CatchupServer
+from retention import GC_INTERVAL, Retention, RetentionPolicy
+from bulk import BULK_THRESHOLD, BulkServer, fetch_pack
+from packet_cache import PacketCache
+from topology import Topology
+from history import HistoryIndex
+from render import RENDER_RATE, Renderer
+import metrics
+import chatlog
 
 
 BROADCAST_PORT = 6969
 PACKET_LIMIT = 576
+BROADCAST_INTERVAL = 10
 FRONTIER_DIR = "frontiers"
+GROUP_COMMIT = 0.05  # Sekunden, in denen Schreibzugriffe gesammelt werden
+FETCH_INTERVAL = 60  # Sekunden zwischen Hintergrund-Fetches, None schaltet sie ab
+MAX_CHAIN = 100  # höchstens so viele gesammelte Zeilen pro Commit-Kette
+
+log = chatlog.get("task3")
 
 class GitbasedChat:
-    def __init__(self, username, temp):
+    def __init__(self, username, temp, backend="batch", mtu=PACKET_LIMIT, gossip="digest",
+                 fetch_interval=FETCH_INTERVAL, start=True, headless=False, render_rate=RENDER_RATE,
+                 rcvbuf=RCVBUF, sndbuf=SNDBUF, retention=None, gc_interval=GC_INTERVAL,
+                 bulk_threshold=BULK_THRESHOLD, topology=None, seed=True, idle=None):
         self.username = username
-        self.frontier_path = os.path.join(FRONTIER_DIR, self.username)
-        os.makedirs(self.frontier_path, exist_ok=True)
+        # Absolut, weil im temp-Modus später das Arbeitsverzeichnis gewechselt wird
+        self.frontier_path = os.path.abspath(os.path.join(FRONTIER_DIR, self.username))
         self.frontier_cache = self.load_frontier_disk()
+        # Autoren mit letzter Aktivität; stille fallen nach idle Sekunden aus dem Broadcast (siehe frontier.py)
+        self.peers = Frontier(self.frontier_cache, track=bool(idle))
+        self.idle = idle
         self.temp = temp
+        self.gossip = gossip  # "digest": nur Digest broadcasten, "full": ganze Frontier
         self.running = True
         self.lock = threading.Lock()
-        self.pending_commits = []  # Queue for out-of-order commits
-
+        # Out-of-order Commits, nach fehlendem Parent indiziert (siehe pending.py)
+        self.pending = PendingBuffer()
+        self.packer = Packer(mtu)
+        # Fertige Commit-Records nach Hash, für wiederholte Catch-up-Anfragen (siehe packet_cache.py)
+        self.packets = PacketCache(self.read_commit_packet)
+        self.reassembler = Reassembler()
+        # Fehlende Commits bedienen Worker statt des Listener-Threads (siehe catchup.py)
+        self.catchup = CatchupServer(lambda sha: self.create_commit_packet(sha),
+                                     lambda records, addr: self.send(records, addr))
+        self.acks = AckBatcher(lambda records, addr: self.send(records, addr))
+        self.request_acks = True  # Peers sollen uns mit Bestätigungen und Retransmission bedienen
+        self.outbox = queue.Queue()  # eingegebene Zeilen, siehe send_loop
+        self.fetch_interval = fetch_interval
+        self.gc_interval = gc_interval
+        self.bulk_threshold = bulk_threshold
+        self.bulk_failed = set()  # Peers, deren Packfile nicht ankam: wieder per UDP
+        self.fetching = False
+        # Beim Start Commits von einem Peer holen statt aufs nächste Intervall zu warten (siehe gossip.py)
+        self.seed = Seed() if seed and gossip == "digest" else None
+
+        git_dir = None
         if self.temp:
             self.temp_dir = tempfile.TemporaryDirectory()
             os.chdir(self.temp_dir.name) #chdir changes the current working directory of the calling process to the directory specified in path
-            run(["git", "init", "-b", self.username])
-            run(["git", "config", "user.name", self.username])
-            run(["git", "config", "user.email", f"{self.username}@example.com"])
-            empty_tree = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
-            init_commit = run(["git", "commit-tree", empty_tree], input=f"{self.username} joined (temp mode)")
-            run(["git", "update-ref", f"refs/heads/{self.username}", init_commit])
-            run(["git", "symbolic-ref", "HEAD", f"refs/heads/{self.username}"])
+            # Repo, Config und ersten Commit direkt schreiben statt mit sechs git-Aufrufen
+            git_dir = init_repo(self.temp_dir.name, self.username, f"{self.username} joined (temp mode)")
         else:
             if not os.path.exists(".git"):
                 print("Error: Not inside a Git repository.")
                 sys.exit(1)
 
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        #self.sock.sendto(b'test', (('255.255.255.255', 6969)))
-
-        try:
-            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-        except Exception:
-            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
+        # Lese- und Schreibzugriffe auf das Repo (siehe gitstore.py)
+        self.repo = open_backend(backend, cwd=os.getcwd(), git_dir=git_dir)
+        # Nachrichtenzahl pro Autor, inkrementell nachgeführt (siehe commit_index.py)
+        self.index = CommitIndex(self.repo)
+        # Durchsuchbare Nachrichten-Historie, python history.py liest sie (siehe history.py)
+        self.history = HistoryIndex(self.repo, self.index)
+        self.history.sync()
+        # Begrenzte Historie: Pruning, Snapshot für neue Knoten, gc (siehe retention.py)
+        self.retention = Retention(self.repo, self.index, retention)
+        # Große Lücken als ein Packfile über TCP statt einzelner UDP-Pakete (siehe bulk.py)
+        self.bulk = BulkServer(self.repo, self.index) if bulk_threshold else None
+        # Ausgabe im eigenen Thread, höchstens render_rate Mal pro Sekunde (siehe render.py)
+        self.renderer = Renderer("\nMessages from other Users:", "Press Enter to send message.",
+                                 rate=render_rate, headless=headless, extra=self.pending_line)
+        self.renderer.update(self.get_frontier_local())
+
+        # Broadcast oder Multicast-Gruppe (siehe topology.py); Relays gibt es nur für Frontiers
+        self.topology = topology or Topology(BROADCAST_PORT, "255.255.255.255")
+        if self.topology.relay_group is not None:
+            raise ValueError("the git-based chat has no relay topology, only multicast groups")
+
+        # UDP Socket (siehe transport.py)
         try:
-            self.sock.bind(('', BROADCAST_PORT))
+            self.transport = Transport(BROADCAST_PORT, reuse_port=True, rcvbuf=rcvbuf, sndbuf=sndbuf,
+                                       groups=self.topology.groups(), interface=self.topology.interface,
+                                       ttl=self.topology.ttl)
+            self.sock = self.transport.sock
         except Exception as e:
             print(f"Could not bind to port {BROADCAST_PORT}: {e}")
             sys.exit(1)
 
         print(f"[{self.username}] Listening on UDP port {BROADCAST_PORT}")
 
-        threading.Thread(target=self.listen, daemon=True).start()
-        threading.Thread(target=self.broadcast_loop, daemon=True).start()
-        threading.Thread(target=self.retry_pending_commits, daemon=True).start()
+        # Zeitmessung der Hot Paths, nur wenn Metriken eingeschaltet sind (siehe metrics.py)
+        metrics.instrument(self, ("handle_message", "get_missing_commits", "receive_commit", "post_messages"))
+        metrics.instrument(self.retention, ("run_once",))
+        metrics.REGISTRY.gauge("chat_pending_commits", "Commits waiting for their parents",
+                               lambda: self.pending.stats()["depth"])
+        metrics.REGISTRY.gauge("chat_frontier_archived", "Idle authors left out of full frontier broadcasts",
+                               lambda: len(self.peers.archive))
+        metrics.REGISTRY.gauge("chat_catchup_sessions", "Peers currently being served missing commits",
+                               lambda: self.catchup.stats()["sessions"])
+
+        # Ohne start übernimmt eine andere Engine (z.B. aio_chat.py) Empfang und Broadcast
+        if start:
+            threading.Thread(target=self.listen, daemon=True).start()
+            threading.Thread(target=self.broadcast_loop, daemon=True).start()
+            threading.Thread(target=self.send_loop, daemon=True).start()
+            if self.fetch_interval:
+                threading.Thread(target=self.sync_loop, daemon=True).start()
+            if self.retention.policy:
+                threading.Thread(target=self.retention.loop, args=(self.gc_interval,), daemon=True).start()
+            self.hello()
+
+    def hello(self):
+        """
+        Ask the peers for their digest right away (see gossip.Seed).
+        """
+        if self.seed is not None:
+            self.send([self.seed.start(self.username)], self.topology.destination())
 
     def broadcast_loop(self):
         while self.running:
-            time.sleep(10)
-            self.send_frontier()
-            self.print_frontier()
+            time.sleep(BROADCAST_INTERVAL)
+            self.broadcast()
+
+    def broadcast(self):
+        self.send_frontier()
+        self.renderer.refresh()
 
     def listen(self):
         while self.running:
             try:
-                data, addr = self.sock.recvfrom(PACKET_LIMIT)
-                msg = json.loads(data.decode('utf-8'))
-                self.handle_message(msg, addr)
-            except Exception as e:
-                print("Error receiving or handeling message: ", e)
+                batch = self.transport.receive()
+            except OSError as e:
+                metrics.RECEIVE_ERRORS.inc()
+                log.warning("Error receiving or handling message: %s", e)
+                continue
+            for data, addr in batch:
+                metrics.PACKETS_RECEIVED.inc()
+                metrics.BYTES_RECEIVED.inc(len(data))
+                try:
+                    for msg in self.reassembler.feed(data, addr):
+                        self.handle_message(msg, addr)
+                except Exception as e:
+                    metrics.RECEIVE_ERRORS.inc()
+                    log.warning("Error receiving or handling message: %s", e)
 
     def send_frontier(self):
         with self.lock:
             frontier = self.get_frontier_local()
             self.save_frontier_to_disk(frontier)  
             self.frontier_cache = frontier
-            msg = {
-                "type": "frontier",
-                "from": self.username,
-                "frontier": frontier
-            }
-        print(f"[{self.username}] Broadcasting frontier: {frontier}")  # DEBUG
-        print(f"[{self.username}] Broadcasting frontier: {frontier}")
-        try:
-            self.sock.sendto(json.dumps(msg).encode('utf-8'), ('255.255.255.255', BROADCAST_PORT))
-        except Exception as e:
-            print(f"Error sending broadcast: {e}")
+            self.peers.merge(frontier)
+            if self.idle:
+                self.peers.evict(self.idle, keep=(self.username,))
+            if self.gossip == "digest":
+                msg = {**digest(frontier), "from": self.username}
+            else:
+                live = {user: seq for user, seq in frontier.items() if user in self.peers}
+                msg = {
+                    "type": "frontier",
+                    "from": self.username,
+                    "frontier": live
+                }
+                if len(live) < len(frontier):
+                    # Fehlende Autoren sind archiviert, nicht unbekannt: nur Genanntes vergleichen
+                    msg["partial"] = True
+                if self.request_acks:
+                    msg["acks"] = True
+                if self.bulk is not None and not self.bulk_failed:
+                    msg["bulk"] = True
+        log.debug("[%s] Broadcasting frontier: %s", self.username, frontier)
+        metrics.BROADCAST_BYTES.observe(self.send([msg], self.topology.destination()))
+
+    def send(self, records, addr):
+        # Mehrere Records pro Datagramm, zu große fragmentiert
+        sent = 0
+        for datagram in self.packer.pack(records):
+            try:
+                self.sock.sendto(datagram, addr)
+                sent += len(datagram)
+                metrics.PACKETS_SENT.inc()
+            except Exception as e:
+                log.warning("[%s] Failed to send to %s: %s", self.username, addr, e)
+        metrics.BYTES_SENT.inc(sent)
+        return sent
 
     def get_frontier_local(self):
-        refs = run(["git", "for-each-ref", "--format=%(refname)"]).splitlines()
         frontier = {}
-        for ref in refs:
-            if ref.startswith("refs/heads/"):
-                user = ref.split("/")[-1]
-                if user in ["main", "master", "HEAD"]:
-                    continue
-                if user not in frontier:
-                    count = run(["git", "rev-list", "--count", ref])
-                    frontier[user] = int(count)
+        for ref, commit in self.repo.tips().items():
+            user = ref.split("/")[-1]
+            if user in ["main", "master", "HEAD"]:
+                continue
+            if user not in frontier:
+                frontier[user] = self.index.seq(commit)
         return frontier
                 
     def handle_message(self, msg, addr):
-        if msg["type"] == "frontier":
-            print(f"[{self.username}] Received frontier from {msg['from']}: {msg['frontier']}")
-            missing = self.get_missing_commits(msg["frontier"])
-            print(f"[{self.username}] Calculated missing commits: {missing}")
-            for commit_hash in missing:
-                print(f"[{self.username}] Sending commit {commit_hash} to {addr}")  # DEBUG
-                acket = self.create_commit_packet(commit_hash)
-                try:
-                    self.sock.sendto(json.dumps(packet).encode(), addr)
-                except Exception as e:
-                    print(f"[{self.username}] Failed to send commit {commit_hash}: {e}")
+        sender = msg.get("from")
+        if sender is not None and sender != self.username:
+            with self.lock:
+                self.peers.touch(sender, addr)  # Peer lebt, auch wenn er nichts schreibt
+        if msg["type"] == "digest":
+            # Weicht unsere Frontier ab, schicken wir dem Sender die betroffenen Einträge,
+            # damit er uns die fehlenden Commits schicken kann
+            if msg.get("from") == self.username or (self.seed is not None and not self.seed.accept(addr)):
+                return
+            frontier = self.get_frontier_local()
+            buckets = differing_buckets(frontier, msg)
+            if buckets:
+                request = {
+                    "type": "frontier",
+                    "from": self.username,
+                    "frontier": select(frontier, buckets),
+                    "buckets": buckets
+                }
+                if self.request_acks:
+                    request["acks"] = True
+                if self.bulk is not None and addr not in self.bulk_failed:
+                    request["bulk"] = True
+                self.send([request], addr)
+        elif msg["type"] == "hello":
+            # Neuer Knoten: sofort unser Digest an ihn, er fragt dann nach den fehlenden Commits
+            if msg.get("from") != self.username:
+                self.send([{**digest(self.get_frontier_local()), "from": self.username}], addr)
+        elif msg["type"] == "frontier":
+            log.debug("[%s] Received frontier from %s: %s", self.username, msg["from"], msg["frontier"])
+            snapshot = None
+            partial = msg.get("partial", False)
+            if self.retention.behind(msg["frontier"], msg.get("buckets"), partial):
+                # Gelöschte Commits kann der Peer nicht mehr bekommen: Snapshot vorweg
+                log.info("[%s] Sending history snapshot to %s", self.username, addr)
+                snapshot = self.retention.snapshot()
+                self.send([{**snapshot, "from": self.username}], addr)
+            missing = self.get_missing_commits(msg["frontier"], msg.get("buckets"), partial)
+            if missing and self.bulk is not None and msg.get("bulk") and len(missing) >= self.bulk_threshold:
+                # Solange ein Angebot offen ist, holt der Peer das Packfile; nichts doppelt senden
+                offer = self.bulk.offer(addr, missing, snapshot)
+                if offer is not None:
+                    log.info("[%s] Offering %d missing commits as a pack to %s", self.username, len(missing), addr)
+                    self.send([{**offer, "from": self.username}], addr)
+            elif missing:
+                log.info("[%s] Serving %d missing commits to %s", self.username, len(missing), addr)
+                self.catchup.request(addr, missing, windowed=msg.get("acks", False))
+        elif msg["type"] == "ack":
+            self.catchup.ack(addr, msg["session"], msg.get("upto", 0), msg["ns"])
         elif msg["type"] == "commit":
-            print(f"[{self.username}] Received commit packet: {msg['message'][:40]} ({msg['author']})")  # DEBUG
+            log.debug("[%s] Received commit packet: %.40s (%s)", self.username, msg["message"], msg["author"])
+            if "session" in msg:
+                self.acks.received(addr, msg.pop("session"), msg.pop("n"))
             self.receive_commit(msg)
-
-
-    def get_missing_commits(self, remote_frontier):
+        elif msg["type"] == "snapshot":
+            self.receive_snapshot(msg)
+        elif msg["type"] == "bulk":
+            with self.lock:
+                busy = self.fetching
+                self.fetching = True
+            if busy:
+                # Schon ein Packfile unterwegs: Angebot zurückgeben, sonst hält der Peer
+                # bis OFFER_TIMEOUT jeden Catch-up an uns zurück
+                self.send([{"type": "decline", "token": msg["token"], "from": self.username}], addr)
+                return
+            threading.Thread(target=self.fetch_bulk, args=(msg, addr), daemon=True).start()
+        elif msg["type"] == "decline":
+            if self.bulk is not None:
+                self.bulk.release(addr, msg["token"])
+
+
+    def get_missing_commits(self, remote_frontier, buckets=None, partial=False):
         """
-        Determine which commits the peer is missing.
+        Determine which commits the peer is missing (parents before children).
+        Only chat authors (branches, see get_frontier_local) count, not the
+        authors of main/master history. With `buckets` the frontier is partial
+        and only authors in those buckets count; with `partial` (idle authors
+        left out) only the authors it names.
         """
-        try:
-            log_output = run([
-                "git", "log", "--all", "--topo-order",
-                "--pretty=format:%an;%H;%P;%s"
-            ])
-        except Exception as e:
-            print(f"[{self.username}] Failed to get commit log: {e}")
-            return []
-
-        commit_lines = log_output.splitlines()
-        gaps = {}
-        for line in commit_lines:
-            try:
-                author, commit_hash, parents_str, _ = line.split(';', 3)
-            except ValueError:
-                continue
-
-            peer_count = remote_frontier.get(author, 0)
-            local_count = self.frontier_cache.get(author, 0)
-            if author not in gaps:
-                # If we have more commits for that author than they do, calculate the gap.
-                if local_count > peer_count:
-                    gaps[author] = {
-                        "count": local_count - peer_count,
-                        "commits": []
-                    }
-
-            if author in gaps and gaps[author]["count"] > 0:
-                gaps[author]["commits"].append(commit_hash)
-                gaps[author]["count"] -= 1
-
-        # Flatten all missing commits from gaps
-        all_missing = []
-        for info in gaps.values():
-            # Ensure commits are sent oldest-to-newest
-            all_missing.extend(reversed(info["commits"]))
-        return all_missing
-
-
-    
-    #(base) MacBook-Pro-5:Silvan Lenny$ git log --author=Silvan --reverse --pretty=format:%H
-    #6961300e43a51412038e36511adbe765b0d2d229
-    #7f4a0a2f1b9c103736449f2439153a14b66f6f1a
-    #3f69f8593320603ff3fa35dcf894761f1df6a193
-    #67efd2e8b6dad0625e203228f2a21fded3bdb217
-    #485e687e1c57c397d9249129146f478e93ab8f35
-    #cd1bf3a407254d6eccd88ed25212677997d01bac
-    #4d5ac75c2d6df1c596cdb08fd6789cb1a9492eb3
-    #be721c213686d1d26e7e0f196f486ccf44632865
-    #90b387a53b2244773e2b626c441309decabd57ad
-    #da8330a7a422ae7db8f11ee43cb0abe72001340b
-    #97eb484df07236b08828a2997bea57bb49f40af9
-    #fad017f31c9846a9a9e7e27a6072c68907d32c73
-    #12bbf474363445d652d3bd6841b3bfbaa6a33fe4
+        # Aktuelle Tips statt frontier_cache: ein Hintergrund-Fetch kann neue Branches gebracht haben
+        branches = {ref.split("/")[-1] for ref in self.repo.tips()} - {"main", "master", "HEAD"}
+        if buckets is None and not partial:
+            return self.index.missing(remote_frontier, branches.__contains__)
+        wanted = set(buckets) if buckets is not None else None
+        return self.index.missing(remote_frontier, lambda author: author in branches
+                                  and (wanted is None or bucket_of(author) in wanted)
+                                  and (not partial or author in remote_frontier))
 
     def create_commit_packet(self, commit_hash):
-        print(f"[{self.username}] Creating packet for commit {commit_hash}")  # DEBUG
-        raw = run(["git", "cat-file", "-p", commit_hash])
-        lines = raw.splitlines()
-        tree = lines[0].split()[1]
-        parents = [line.split()[1] for line in lines if line.startswith("parent")]
-        author_line = [line for line in lines if line.startswith("author")][0]
-        author_parts = author_line.split()
-        author = author_parts[1]
-        author_time = " ".join(author_parts[2:])
-        msg_index = lines.index("") + 1
-        message = "\n".join(lines[msg_index:])
+        return self.packets.get(commit_hash)
+
+    def read_commit_packet(self, commit_hash):
+        log.debug("[%s] Creating packet for commit %s", self.username, commit_hash)
+        commit = self.repo.read_commit(commit_hash)
         return {
             "type": "commit",
-            "author": author,
-            "author_time": author_time,
-            "message": message,
-            "parents": parents,
-            "tree": tree
+            "author": commit["author"],
+            "author_time": commit["author_time"],
+            "message": commit["message"],
+            "parents": commit["parents"],
+            "tree": commit["tree"]
         }
 
     def receive_commit(self, payload):
+        # Jeder neue Commit gibt die Commits frei, die nur noch auf ihn gewartet haben
+        queue = [payload]
+        while queue:
+            commit_hash = self.apply_commit(queue.pop())
+            if commit_hash is not None:
+                queue.extend(self.pending.resolve(commit_hash))
+
+    def receive_snapshot(self, record):
+        # Zurückgestellte Commits, die nur auf gelöschte Eltern gewartet haben, anwenden
+        for sha in self.retention.adopt(record):
+            for payload in self.pending.resolve(sha):
+                self.receive_commit(payload)
+
+    def fetch_bulk(self, offer, addr):
+        try:
+            header = fetch_pack(self.repo.cwd, addr[0], offer["port"], offer["token"])
+            if "snapshot" in header:
+                self.receive_snapshot(header["snapshot"])
+            for sha in header["shallow"]:
+                self.retention.mark_shallow(sha)
+            self.apply_pack(header["tips"])
+            log.info("[%s] Received %d commits as a pack from %s", self.username, header["commits"], addr)
+        except Exception as e:
+            self.bulk_failed.add(addr)
+            log.warning("[%s] Bulk sync from %s failed, falling back to UDP: %s", self.username, addr, e)
+        finally:
+            with self.lock:
+                self.fetching = False
+
+    def apply_pack(self, tips):
+        """
+        Index the commits of a received pack and move the branches to its
+        newest commits in one ref transaction.
+        """
+        current = self.repo.tips()
+        updates = {}
+        seqs = {}
+        for author, sha in tips.items():
+            seq = self.index.seq(sha)  # indiziert dabei alle neuen Commits
+            ref = f"refs/heads/{author}"
+            if ref not in current or self.index.seq(current[ref]) < seq:
+                updates[ref] = sha
+                seqs[author] = seq
+        if updates:
+            self.repo.update_refs(updates)
+        self.history.sync(tips.values())
+        with self.lock:
+            self.frontier_cache = self.get_frontier_local()
+            self.save_frontier_to_disk(self.frontier_cache)
+        self.renderer.update(seqs)
+        # Zurückgestellte Commits, deren Eltern im Pack waren
+        for parent in self.pending.parents():
+            if self.repo.exists(parent):
+                for payload in self.pending.resolve(parent):
+                    self.receive_commit(payload)
+
+    def apply_commit(self, payload):
+        """
+        Create the commit, or defer it until its parents are there.
+        Returns the commit hash, or None if it was deferred or dropped.
+        """
         tree = payload["tree"]
         parents = payload["parents"]
         message = payload["message"]
         author = payload["author"]
         author_time = payload["author_time"]
 
-        try:
-            for parent in parents:
-                run(["git", "cat-file", "-e", parent])
-        except Exception:
-            print(f"[{self.username}] Missing parent(s) for commit from {author}, deferring...")
-            self.pending_commits.append(payload)
-            return
-
-        args = ["git", "commit-tree", tree] + sum([["-p", p] for p in parents], [])
-        commit_hash = run(args, env={
-            **os.environ,
-            "GIT_AUTHOR_NAME": author,
-            "GIT_AUTHOR_EMAIL": f"{author}@example.com",
-            "GIT_AUTHOR_DATE": author_time,
-            "GIT_COMMITTER_NAME": author,
-            "GIT_COMMITTER_EMAIL": f"{author}@example.com",
-            "GIT_COMMITTER_DATE": author_time
-        }, input=message)
-        print(f"[{self.username}] Applied commit from {author}: {message[:40]}")
-        print(f"[{self.username}] Created commit hash: {commit_hash}")
-
-        run(["git", "update-ref", f"refs/heads/{author}", commit_hash])
+        if not valid_branch(author):
+            # Ohne gültigen Branch-Namen gäbe es keinen Ref für den Commit
+            log.warning("[%s] Dropping commit from %r: not a valid branch name", self.username, author)
+            return None
+
+        # Gelöschte Eltern (Tombstones, siehe retention.py) zählen als vorhanden
+        missing = [parent for parent in parents if not self.index.pruned(parent) and not self.repo.exists(parent)]
+        if missing:
+            log.info("[%s] Missing parent(s) for commit from %s, deferring...", self.username, author)
+            self.pending.add(payload, missing)
+            return None
+
+        commit_hash = self.repo.create_commit(parents, message, author, author_time, tree=tree)
+        self.packets.put(commit_hash, payload)
+        head = self.index.heads.get(author, 0)
+        seq = self.index.add(commit_hash, author, parents)
+        if seq <= head:
+            # Schon bekannt (z.B. doppelt empfangen): Branch nicht zurücksetzen
+            return commit_hash
+        if any(self.index.pruned(parent) for parent in parents):
+            self.retention.mark_shallow(commit_hash)
+        self.history.add(commit_hash, author, author_time, message, parents)
+        log.info("[%s] Applied commit from %s: %.40s (%s)", self.username, author, message, commit_hash)
+
+        self.repo.update_ref(f"refs/heads/{author}", commit_hash)
 
         # Update and persist frontier
         self.frontier_cache = self.get_frontier_local()
         self.save_frontier_to_disk(self.frontier_cache)
+        self.renderer.update({author: seq})
+        return commit_hash
+
 
+    def post_message(self, msg):
+        self.post_messages([msg])
 
-    def retry_pending_commits(self):
+    def post_messages(self, msgs):
+        """
+        Commit the lines as one chain on top of all known branch tips and move
+        the own branch with a single ref update.
+        """
+        log.debug("[%s] Creating %d new commit(s): %s", self.username, len(msgs), msgs)
+        # Tips aus dem Speicher; Empfang und update_ref halten sie aktuell, Fetch läuft im Hintergrund
+        parents = list(self.repo.tips().values())
+
+        timestamp = "1715058000 +0000"
+        commits = []
+        for msg in msgs:
+            new_commit = self.repo.create_commit(parents, msg, self.username, timestamp)
+            self.index.add(new_commit, self.username, parents)
+            self.history.add(new_commit, self.username, timestamp, msg, parents)
+            self.packets.put(new_commit, {
+                "type": "commit",
+                "author": self.username,
+                "author_time": timestamp,
+                "message": msg,
+                "parents": parents,
+                "tree": EMPTY_TREE
+            })
+            commits.append(new_commit)
+            parents = [new_commit]
+        self.repo.update_ref(f"refs/heads/{self.username}", commits[-1])
+        self.renderer.update({self.username: self.index.seq(commits[-1])})
+        if self.gossip == "digest":
+            # Neue Commits sofort verteilen statt auf den nächsten Digest zu warten
+            self.send([self.create_commit_packet(c) for c in commits], self.topology.destination())
+        log.debug("[%s] Commit hash: %s", self.username, commits[-1])
+        for msg in msgs:
+            print(f"Message sent: {msg}")
+
+    def queue_message(self, msg):
+        self.outbox.put(msg)
+
+    def send_loop(self):
+        # Was während eines Commits eingegeben wurde, geht als eine Kette raus
         while self.running:
-            time.sleep(5)
-            for payload in self.pending_commits[:]:
+            msgs = [self.outbox.get()]
+            while len(msgs) < MAX_CHAIN:
                 try:
-                    for parent in payload["parents"]:
-                        run(["git", "cat-file", "-e", parent])
-                    self.receive_commit(payload)
-                    self.pending_commits.remove(payload)
-                except Exception as e:
-                    print(f"[{self.username}] Still missing parents for retry: {payload['message'][:30]} - {e}")
+                    msgs.append(self.outbox.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.post_messages(msgs)
+            except Exception as e:
+                log.error("[%s] Failed to send message(s): %s", self.username, e)
 
+    def sync_loop(self):
+        while self.running:
+            time.sleep(self.fetch_interval)
+            self.sync_refs()
+
+    def sync_refs(self):
+        """
+        Fetch from the remotes (if any) and reread the branch tips, so changes
+        made outside the chat are picked up.
+        """
+        try:
+            if run(["git", "remote"], cwd=self.repo.cwd):
+                run(["git", "fetch", "--all", "--quiet"], cwd=self.repo.cwd)
+            self.repo.refresh_tips()
+            self.renderer.update(self.get_frontier_local())
+            self.history.sync()
+        except Exception as e:
+            log.warning("[%s] Background fetch failed: %s", self.username, e)
 
-    def post_message(self, msg):
-        print(f"[{self.username}] Creating new commit with message: {msg}")  # DEBUG
-        run(["git", "fetch", "--all"])
-        refs = run(["git", "for-each-ref", "--format=%(refname)"]).splitlines()
-        parents = []
-        for ref in refs:
-            if ref.startswith("refs/heads/"):
-                commit = run(["git", "rev-parse", ref])
-                parents.append(commit)
-
-        empty_tree = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
-        timestamp = "1715058000 +0000"
-        args = ["git", "commit-tree", empty_tree] + sum([["-p", p] for p in parents], [])
-        new_commit = run(args, input=msg, env={
-            **os.environ,
-            "GIT_AUTHOR_NAME": self.username,
-            "GIT_AUTHOR_EMAIL": f"{self.username}@example.com",
-            "GIT_AUTHOR_DATE": timestamp,
-            "GIT_COMMITTER_NAME": self.username,
-            "GIT_COMMITTER_EMAIL": f"{self.username}@example.com",
-            "GIT_COMMITTER_DATE": timestamp
-        })
-        run(["git", "update-ref", f"refs/heads/{self.username}", new_commit])
-        print(f"[{self.username}] Commit hash: {new_commit}")  #DEBUG
-        print(f"Message sent: {msg}")
-    
     def load_frontier_disk(self):
-        frontier = {}
-        if not os.path.exists(self.frontier_path):
-            return frontier
-        for fname in os.listdir(self.frontier_path):
-            fpath = os.path.join(self.frontier_path, fname)
-            try:
-                with open(fpath, "r") as f:
-                    count = int(f.read().strip())
-                    frontier[fname] = count
-            except Exception:
-                continue
-        return frontier
+        # Write-ahead-Log + Snapshot (siehe frontier_store.py), alte Dateien werden übernommen
+        self.frontier_store = FrontierStore(self.frontier_path, group_commit=GROUP_COMMIT)
+        try:
+            return self.frontier_store.load()
+        except Exception as e:
+            log.error("[%s] Failed to load frontier: %s", self.username, e)
+            return {}
 
     def save_frontier_to_disk(self, frontier):
-        for user, count in frontier.items():
-            fpath = os.path.join(self.frontier_path, user)
-            try:
-                with open(fpath, "w") as f:
-                    f.write(str(count))
-            except Exception as e:
-                print(f"[{self.username}] Failed to write frontier for {user}: {e}")
+        try:
+            self.frontier_store.update(frontier)
+        except Exception as e:
+            log.error("[%s] Failed to write frontier: %s", self.username, e)
     
-    def print_frontier(self):
-        frontier = self.get_frontier_local()
-        print("\nMessages from other Users:")
-        for user, count in sorted(frontier.items()):
-            print(f" {user}: {count}")
-        print("Press Enter to send message.")
+    def pending_line(self):
+        stats = self.pending.stats()
+        if stats["depth"]:
+            return (f" (waiting for parents: {stats['depth']} commits, "
+                    f"longest wait {stats['wait_max']:.1f}s, evicted {stats['evicted']})")
+        return None
 
     def run(self):
         print(f"Git-based chat as '{self.username}' started.")
@@ -313,24 +527,55 @@ class GitbasedChat:
             while self.running:
                 msg = input()
                 if msg.strip():
-                    self.post_message(msg)
+                    self.queue_message(msg)
         except KeyboardInterrupt:
             self.running = False
             print("\nExiting...")
-            if self.temp:
-                print("Cleaning up temporary repo...")
-                self.temp_dir.cleanup()
+            self.close()
+
+    def close(self):
+        self.renderer.close()
+        self.catchup.close()
+        self.acks.close()
+        if self.bulk is not None:
+            self.bulk.close()
+        self.frontier_store.close()
+        self.history.close()
+        self.index.close()
+        self.repo.close()
+        if self.temp:
+            print("Cleaning up temporary repo...")
+            self.temp_dir.cleanup()
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python task3.py <username> <--temp>")
+    if len(sys.argv) < 3:
+        print("Usage: python task3.py <username> <--temp> [--asyncio] [--headless] [options, see --help after --temp]")
         sys.exit(1)
+    args = options(sys.argv[3:], history=True)
+    retention = RetentionPolicy(args.keep_age, args.keep_per_author, args.keep_bytes)
 
     username = sys.argv[1]
     if len(username) > 16:
         print("Username too long (max 16 characters)")
         sys.exit(1)
+    if not valid_branch(username):
+        print("Username must be a valid git branch name (no spaces, no ~^:?*[\\/)")
+        sys.exit(1)
 
     temp = sys.argv[2] == "--temp"
-    app = GitbasedChat(username, temp)
-    app.run()
+    topology = Topology.from_args(args, BROADCAST_PORT, "255.255.255.255")
+    chatlog.setup(args.log_level, args.log_rate, format=args.log_format)
+    if args.metrics:
+        metrics.start(args.metrics)
+    if args.asyncio:
+        app = GitbasedChat(username, temp, start=False, headless=args.headless, render_rate=args.render_rate,
+                           rcvbuf=args.rcvbuf, sndbuf=args.sndbuf, retention=retention, gc_interval=args.gc_interval,
+                           bulk_threshold=args.bulk_threshold, topology=topology, idle=args.idle)
+        print(f"Git-based chat as '{username}' started.")
+        print("Type messages and press ENTER to send.")
+        git_engine(app, BROADCAST_INTERVAL).run()
+    else:
+        app = GitbasedChat(username, temp, headless=args.headless, render_rate=args.render_rate,
+                           rcvbuf=args.rcvbuf, sndbuf=args.sndbuf, retention=retention, gc_interval=args.gc_interval,
+                           bulk_threshold=args.bulk_threshold, topology=topology, idle=args.idle)
+        app.run()
@@ -0,0 +1,60 @@
+"""
+Binary codec (codec.py): records come back unchanged, whether they fit the
+packed layouts or fall back to embedded JSON.
+"""
+import pytest
+
+import codec
+from codec import EncodedCommit
+
+TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+
+def commit(**fields):
+    return {"type": "commit", "author": "bob", "author_time": "1715058000 +0130",
+            "message": "hallo", "parents": ["a" * 40, "b" * 40], "tree": TREE, **fields}
+
+
+RECORDS = [
+    {"alice": 1, "bob": 300},
+    {},
+    {"type": "frontier", "from": "me", "frontier": {"a": 1, "ü": 70000}},
+    {"type": "frontier", "from": "me", "frontier": {}, "buckets": [1, 2, 70000], "acks": True},
+    commit(),
+    commit(author_time="17 -0000", message="é" * 300, parents=[]),
+    commit(session=3, n=9),
+    {"type": "ack", "session": 1, "upto": 5, "ns": [1, 2 ** 40]},
+    {"type": "digest", "version": 3, "buckets": [0, 2 ** 32 - 1]},
+    {"type": "delta", "state": {"a": 5}, "buckets": [3]},
+]
+
+# Passen nicht in die gepackten Layouts und gehen als JSON
+FALLBACK = [
+    {"a": -1},
+    {"a": 1.5},
+    {"a\0b": 1},
+    {"a": 2 ** 70},
+    {"type": "delta", "state": {"a": "5"}},
+    {"type": "digest", "from": "x", "version": 3, "buckets": [2 ** 33]},
+    commit(parents=["A" * 40]),
+    commit(parents=["a" * 39, "b" * 41]),
+    commit(author_time="yesterday"),
+    {"type": "other", "x": [1]},
+]
+
+
+@pytest.mark.parametrize("record", RECORDS + FALLBACK)
+def test_round_trip(record):
+    assert codec.decode_packet(codec.encode_packet([record])) == [record]
+
+
+def test_packet_with_many_records():
+    assert codec.decode_packet(codec.encode_packet(RECORDS + FALLBACK)) == RECORDS + FALLBACK
+
+
+def test_encoded_commit():
+    record = EncodedCommit(commit())
+    assert codec.encode_packet([record]) == codec.encode_packet([commit()])
+    # packet_cache.py: leere Felder für Commits, die nicht binär kodierbar sind
+    odd = commit(parents=["A" * 40])
+    assert codec.decode_packet(codec.encode_packet([EncodedCommit(odd, b"")])) == [odd]
@@ -0,0 +1,72 @@
+"""
+Frontier (frontier.py): merging, liveness and the archive of idle peers.
+"""
+import pytest
+
+from frontier import Frontier, ShardedFrontier
+
+IMPLEMENTATIONS = [Frontier, ShardedFrontier]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.parametrize("cls", IMPLEMENTATIONS)
+def test_merge_returns_what_grew(cls):
+    frontier = cls({"a": 1, "b": 5})
+    assert frontier.merge({"a": 3, "b": 2, "c": 0}) == {"a": 3, "c": 0}
+    assert dict(frontier.items()) == {"a": 3, "b": 5, "c": 0}
+
+
+@pytest.mark.parametrize("cls", IMPLEMENTATIONS)
+@pytest.mark.parametrize("value", [1.5, "2", 2 ** 70 * 0.5])
+def test_merge_rejects_bad_counts(cls, value):
+    with pytest.raises((ValueError, TypeError)):
+        cls().merge({"a": value})
+
+
+@pytest.mark.parametrize("cls", IMPLEMENTATIONS)
+def test_idle_peers_are_archived_and_come_back(cls):
+    clock = Clock()
+    frontier = cls({"me": 0, "quiet": 4, "talks": 1, "near": 2}, clock=clock)
+    clock.now = 100
+    frontier.merge({"talks": 2})
+    frontier.touch("near", ("10.0.0.3", 9999))
+    assert sorted(frontier.evict(50, keep=("me",))) == ["quiet"]
+    assert "quiet" not in frontier and dict(frontier.items()) == {"me": 0, "talks": 2, "near": 2}
+    assert frontier.peer("quiet") == (4, 0.0, None, True)
+    assert frontier.peer("near") == (2, 100, ("10.0.0.3", 9999), False)
+    # Ein alter Zähler holt den Peer nicht zurück, ein höherer schon
+    assert frontier.merge({"quiet": 4}) == {}
+    assert frontier.merge({"quiet": 5}) == {"quiet": 5}
+    assert frontier.peer("quiet") == (5, 100, None, False)
+
+
+@pytest.mark.parametrize("cls", IMPLEMENTATIONS)
+def test_restore_touch_and_increment(cls):
+    clock = Clock()
+    frontier = cls({"a": 3, "b": 1, "c": 7}, clock=clock)
+    clock.now = 100
+    frontier.evict(10)
+    assert len(frontier) == 0
+    assert frontier.restore("a") == 3
+    assert frontier.restore("x") is None
+    frontier.touch("b")
+    assert frontier.increment("c") == 8
+    assert dict(frontier.items()) == {"a": 3, "b": 1, "c": 8}
+
+
+def test_full_states_from_one_sender():
+    frontier = Frontier()
+    state = {f"peer{i}": i for i in range(1000)}
+    source = ("10.0.0.2", 9999)
+    assert frontier.merge(state, source) == state
+    assert frontier.merge(state, source) == {}
+    grown = {**state, "peer7": 100, "peer999": 1000}
+    assert frontier.merge(grown, source) == {"peer7": 100, "peer999": 1000}
+    assert dict(frontier.items()) == grown
@@ -0,0 +1,166 @@
+"""
+Packer and Reassembler (wire.py): round trips over localhost UDP, batching at
+the MTU, lost, reordered and malformed fragments, for both protocols.
+"""
+import json
+import random
+import socket
+
+import pytest
+
+import codec
+import wire
+from wire import Packer, Reassembler
+
+PROTOCOLS = [True, False]  # binär, JSON
+ADDR = ("127.0.0.1", 9999)
+
+
+def commit(i, size=40):
+    return {
+        "type": "commit",
+        "author": f"user{i % 7}",
+        "author_time": "1715058000 +0000",
+        "message": f"message {i} " + "x" * size,
+        "parents": [f"{i:040x}"],
+        "tree": "4b825dc642cb6eb9a060e54bf8d69288fbee4904",
+    }
+
+
+def feed_all(reassembler, datagrams, addr=ADDR):
+    records = []
+    for datagram in datagrams:
+        records.extend(reassembler.feed(datagram, addr))
+    return records
+
+
+@pytest.fixture
+def udp_pair():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(2)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    yield sender, receiver
+    sender.close()
+    receiver.close()
+
+
+@pytest.mark.parametrize("binary", PROTOCOLS)
+def test_localhost_round_trip(udp_pair, binary):
+    sender, receiver = udp_pair
+    packer = Packer(576, binary=binary)
+    # Kleine Records (gebündelt) und einer, der nur fragmentiert passt
+    records = [commit(i) for i in range(300)] + [commit(300, size=5000)]
+    datagrams = packer.pack(records)
+    for datagram in datagrams:
+        sender.sendto(datagram, receiver.getsockname())
+    reassembler = Reassembler()
+    received = []
+    for _ in datagrams:
+        data, addr = receiver.recvfrom(wire.RECV_BUFFER)
+        received.extend(reassembler.feed(data, addr))
+    assert received == records
+    assert not reassembler.partial
+
+
+@pytest.mark.parametrize("binary", PROTOCOLS)
+@pytest.mark.parametrize("mtu", [576, 1400, 8192])
+def test_batches_split_at_mtu(binary, mtu):
+    records = [commit(i) for i in range(200)]
+    datagrams = Packer(mtu, binary=binary).pack(records)
+    assert all(len(datagram) <= mtu for datagram in datagrams)
+    assert 1 < len(datagrams) < len(records)  # gebündelt, aber nicht alles in einem
+    assert feed_all(Reassembler(), datagrams) == records
+
+
+@pytest.mark.parametrize("binary", PROTOCOLS)
+def test_large_record_fragments(binary):
+    record = commit(1, size=4000)
+    datagrams = Packer(576, binary=binary).pack([record])
+    assert len(datagrams) > 1
+    assert all(len(datagram) <= 576 for datagram in datagrams)
+    assert feed_all(Reassembler(), datagrams) == [record]
+
+
+@pytest.mark.parametrize("binary", PROTOCOLS)
+def test_reordered_fragments(binary):
+    record = commit(2, size=4000)
+    datagrams = Packer(576, binary=binary).pack([record])
+    random.Random(1).shuffle(datagrams)
+    reassembler = Reassembler()
+    assert feed_all(reassembler, datagrams[:-1]) == []
+    assert feed_all(reassembler, datagrams[-1:]) == [record]
+
+
+@pytest.mark.parametrize("binary", PROTOCOLS)
+def test_lost_fragment_expires(binary):
+    datagrams = Packer(576, binary=binary).pack([commit(3, size=4000)])
+    reassembler = Reassembler()
+    assert feed_all(reassembler, datagrams[1:]) == []
+    assert len(reassembler.partial) == 1
+    # Das nächste Fragment nach dem Timeout räumt die unvollständige Nachricht ab
+    reassembler.timeout = 0
+    later = Packer(576, binary=binary).pack([commit(4, size=4000)])
+    reassembler.feed(later[0], ADDR)
+    assert len(reassembler.partial) == 1
+    assert reassembler.expired == 1
+
+
+@pytest.mark.parametrize("binary", PROTOCOLS)
+def test_duplicate_fragments(binary):
+    record = commit(5, size=3000)
+    datagrams = Packer(576, binary=binary).pack([record])
+    assert feed_all(Reassembler(), datagrams[:1] + datagrams) == [record]
+
+
+def test_fragments_from_different_senders_stay_apart():
+    packer = Packer(576)
+    first, second = commit(6, size=3000), commit(7, size=3000)
+    a, b = packer.pack([first]), packer.pack([second])
+    reassembler = Reassembler()
+    received = []
+    for x, y in zip(a, b):
+        received.extend(reassembler.feed(x, ("10.0.0.1", 1)))
+        received.extend(reassembler.feed(y, ("10.0.0.2", 1)))
+    assert sorted(received, key=lambda r: r["message"]) == [first, second]
+
+
+def json_fragment(**fields):
+    return json.dumps({"type": "frag", "v": wire.PROTOCOL_VERSION, **fields}).encode("utf-8")
+
+
+@pytest.mark.parametrize("fields", [
+    {"id": 1, "seq": 2, "total": 2, "data": "x"},  # seq außerhalb
+    {"id": 1, "seq": -1, "total": 2, "data": "x"},
+    {"id": 1, "seq": 0, "total": 0, "data": "x"},
+    {"id": 1, "seq": "0", "total": 2, "data": "x"},
+    {"id": 1, "seq": 0, "data": "x"},  # ohne total
+    {"id": 1},
+    {"id": 1, "seq": 0, "total": 2, "data": 5},
+])
+def test_malformed_json_fragment_is_dropped(fields):
+    reassembler = Reassembler()
+    assert reassembler.feed(json_fragment(**fields), ADDR) == []
+    assert not reassembler.partial
+
+
+def test_malformed_fragment_does_not_spoil_the_message():
+    text = json.dumps(commit(8))
+    half = len(text) // 2
+    reassembler = Reassembler()
+    assert reassembler.feed(json_fragment(id=7, seq=0, total=2, data=text[:half]), ADDR) == []
+    # Anderes total, anderer Datentyp: verworfen, die Nachricht bleibt offen
+    assert reassembler.feed(json_fragment(id=7, seq=1, total=3, data=text[half:]), ADDR) == []
+    binary = codec.encode_fragment(7, 1, 2, text[half:].encode("utf-8"))
+    assert reassembler.feed(binary, ADDR) == []
+    assert reassembler.feed(json_fragment(id=7, seq=1, total=2, data=text[half:]), ADDR) == [commit(8)]
+
+
+def test_malformed_binary_fragment_is_dropped():
+    datagrams = Packer(576).pack([commit(9, size=3000)])
+    reassembler = Reassembler()
+    assert reassembler.feed(codec.encode_fragment(1, 5, 2, b"junk"), ADDR) == []
+    assert reassembler.feed(codec.encode_fragment(1, 0, 0, b"junk"), ADDR) == []
+    assert not reassembler.partial
+    assert feed_all(reassembler, datagrams) == [commit(9, size=3000)]
@@ -0,0 +1,112 @@
+import ipaddress
+import threading
+
+from gossip import bucket_of
+
+BROADCAST = "<broadcast>"
+ANY_INTERFACE = "0.0.0.0"
+
+
+def is_multicast(host):
+    try:
+        return ipaddress.ip_address(host).is_multicast
+    except ValueError:
+        return False
+
+
+def group_for(user, groups):
+    """
+    Spread users evenly over `groups` (e.g. to pick --group for a node).
+    """
+    return groups[bucket_of(user, len(groups))]
+
+
+class Topology:
+    """
+    Where a chat node sends its gossip and which multicast groups it joins.
+
+    Without a group everything goes to the broadcast address, as before, so
+    every node handles every packet and nothing leaves the subnet. With `group`
+    the node joins that multicast group and sends there; nodes in other groups
+    do not hear it (multicast crosses routers if the TTL allows).
+
+    With `relay_group` as well, the node is a member of a relayed topology: it
+    sends deltas to `relay_group`, which only relays join, and does not
+    broadcast periodically. A relay (`relay=True`) joins `relay_group`, merges
+    what members and other relays send, and once per interval sends one merged
+    delta of everything that changed plus its digest to each group in `serve`
+    and to the other relays. Members answer the digest as usual (differing
+    buckets to the relay, which replies with what they lack), so a member
+    handles a few packets per interval and group instead of one per peer.
+    """
+
+    def __init__(self, port, broadcast=BROADCAST, group=None, relay_group=None, relay=False, serve=(),
+                 interface=ANY_INTERFACE, ttl=1):
+        for address in (group, relay_group, *serve):
+            if address is not None and not is_multicast(address):
+                raise ValueError(f"{address} is not a multicast group")
+        if relay and relay_group is None:
+            raise ValueError("a relay needs a relay group")
+        self.port = port
+        self.broadcast = broadcast
+        self.group = group
+        self.relay_group = relay_group
+        self.relay = relay
+        self.serve = list(serve) or ([group] if relay and group else [])
+        self.interface = interface
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.changes = {}  # Relay: seit dem letzten Intervall geänderte Einträge
+
+    @property
+    def member(self):
+        return self.relay_group is not None and not self.relay
+
+    def groups(self):
+        """
+        Multicast groups to join.
+        """
+        if self.relay:
+            return [self.relay_group]
+        return [self.group] if self.group else []
+
+    def destination(self):
+        """
+        Address for deltas and, without relays, the periodic broadcast.
+        """
+        return (self.relay_group or self.group or self.broadcast, self.port)
+
+    def fanout(self):
+        """
+        Addresses the periodic broadcast goes to.
+        """
+        if self.relay:
+            return [(group, self.port) for group in self.serve] + [(self.relay_group, self.port)]
+        return [] if self.member else [self.destination()]
+
+    def note(self, changed):
+        """
+        Remember entries that grew, for the relay's next merged delta.
+        """
+        if not self.relay or not changed:
+            return
+        with self.lock:
+            changes = self.changes
+            for user, count in changed.items():
+                if count > changes.get(user, -1):
+                    changes[user] = count
+
+    def take(self):
+        with self.lock:
+            changes, self.changes = self.changes, {}
+        return changes
+
+    @classmethod
+    def from_args(cls, args, port, broadcast=BROADCAST):
+        """
+        Topology from the flags of utils.topology_arguments().
+        """
+        serve = getattr(args, "serve", None)
+        return cls(port, broadcast, group=args.group, relay_group=getattr(args, "relay_group", None),
+                   relay=getattr(args, "relay", False), serve=serve.split(",") if serve else (),
+                   interface=args.multicast_if, ttl=args.ttl)
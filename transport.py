@@ -0,0 +1,149 @@
+import errno
+import socket
+import sys
+
+from metrics import PACKETS_DROPPED
+from wire import RECV_BUFFER
+
+RCVBUF = 4 * 1024 * 1024  # Kernelpuffer für Bursts; der Kernel begrenzt auf net.core.rmem_max
+SNDBUF = 1024 * 1024
+BATCH = 32  # höchstens so viele Datagramme pro receive()
+
+# Zähler verworfener Datagramme als Zusatzdaten von recvmsg (Linux)
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40 if sys.platform.startswith("linux") else None)
+# 0: nur Multicast der selbst beigetretenen Gruppen empfangen, nicht die aller Sockets auf dem Port (Linux)
+IP_MULTICAST_ALL = getattr(socket, "IP_MULTICAST_ALL", 49 if sys.platform.startswith("linux") else None)
+
+
+class Transport:
+    """
+    UDP socket of a chat node with batched receiving.
+
+    receive() blocks for one datagram and then takes whatever else is already
+    queued in the kernel (up to `batch`) without blocking, so a burst is handled
+    in one pass. Python has no recvmmsg/sendmmsg, so this is still one syscall
+    per datagram; plain recvfrom is the cheapest of them (recvfrom_into with a
+    memoryview per datagram costs more than the bytes object it saves).
+    Where the kernel supports SO_RXQ_OVFL, the first read of a batch uses
+    recvmsg and `kernel_drops` counts datagrams dropped because the receive
+    buffer was full.
+
+    `groups` are multicast groups to join on `interface` (see topology.py);
+    multicast is sent from that interface with `ttl` and looped back, so nodes
+    on the same machine (e.g. over 127.0.0.1) hear each other.
+    """
+
+    def __init__(self, port, host="", reuse_port=False, rcvbuf=RCVBUF, sndbuf=SNDBUF,
+                 batch=BATCH, bufsize=RECV_BUFFER, groups=(), interface="0.0.0.0", ttl=1):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        if reuse_port and hasattr(socket, "SO_REUSEPORT"):
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        else:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.rcvbuf = self._buffer(socket.SO_RCVBUF, rcvbuf)
+        self.sndbuf = self._buffer(socket.SO_SNDBUF, sndbuf)
+        self.overflow = False
+        if SO_RXQ_OVFL is not None:
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                self.overflow = True
+            except OSError:
+                pass
+        self.sock.bind((host, port))
+        self.interface = interface
+        self.groups = []
+        if groups or interface != "0.0.0.0":
+            self._multicast(ttl)
+        for group in groups:
+            self.join(group)
+        self.batch = batch
+        self.bufsize = bufsize
+        self.ancsize = socket.CMSG_SPACE(4) if self.overflow else 0
+        # Metriken
+        self.received = 0
+        self.bytes = 0
+        self.batches = 0
+        self.kernel_drops = 0
+
+    def _buffer(self, option, size):
+        if size:
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, option, size)
+            except OSError:
+                pass
+        return self.sock.getsockopt(socket.SOL_SOCKET, option)
+
+    def _multicast(self, ttl):
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        if self.interface != "0.0.0.0":
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+        if IP_MULTICAST_ALL is not None:
+            try:
+                self.sock.setsockopt(socket.IPPROTO_IP, IP_MULTICAST_ALL, 0)
+            except OSError:
+                pass
+
+    def join(self, group):
+        """
+        Join a multicast group; datagrams sent to it arrive from then on.
+        """
+        membership = socket.inet_aton(group) + socket.inet_aton(self.interface)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        self.groups.append(group)
+
+    def receive(self):
+        """
+        Wait for datagrams; returns [(bytes, addr), ...].
+        """
+        batch = [self._recv()]
+        recvfrom = self.sock.recvfrom
+        bufsize = self.bufsize
+        for _ in range(self.batch - 1):
+            try:
+                data, addr = recvfrom(bufsize, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            batch.append((data, addr))
+            self.bytes += len(data)
+        self.received += len(batch)
+        self.batches += 1
+        return batch
+
+    def _recv(self):
+        if not self.overflow:
+            data, addr = self.sock.recvfrom(self.bufsize)
+            self.bytes += len(data)
+            return data, addr
+        # Der Drop-Zähler ist kumulativ, einmal pro Batch lesen genügt
+        data, ancdata, _, addr = self.sock.recvmsg(self.bufsize, self.ancsize)
+        for level, kind, value in ancdata:
+            if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL and len(value) >= 4:
+                drops = int.from_bytes(value[:4], sys.byteorder)
+                if drops > self.kernel_drops:
+                    PACKETS_DROPPED.inc(drops - self.kernel_drops, "kernel_buffer")
+                    self.kernel_drops = drops
+        self.bytes += len(data)
+        return data, addr
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "bytes": self.bytes,
+            "batches": self.batches,
+            "kernel_drops": self.kernel_drops,
+            "rcvbuf": self.rcvbuf,
+            "sndbuf": self.sndbuf,
+            "groups": list(self.groups),
+        }
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        self.sock.close()
@@ -1,7 +1,31 @@
 import argparse
 import os
-import socket
 import subprocess
+import sys
+import time
+from urllib.parse import unquote
+
+from chatlog import FORMATS, LEVELS, LOG_LEVEL, LOG_RATE
+from metrics import GIT_SECONDS
+from transport import RCVBUF, SNDBUF
+
+
+def quote_name(name):
+    """
+    A user name as one field of a space-separated line; unquote_name() reverses it.
+    """
+    return name.replace("%", "%25").replace(" ", "%20").replace("\n", "%0A")
+
+
+def unquote_name(field):
+    return unquote(field)
+
+
+def non_negative(value):
+    number = float(value)
+    if not number >= 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more: {value}")
+    return number
 
 
 def cli():
@@ -30,6 +54,32 @@ def cli():
         default="<broadcast>",
         help="IPv4 address or hostname of this client",
     )
+    parser.add_argument(
+        "-m",
+        "--mtu",
+        nargs="?",
+        default=576,
+        type=int,
+        help="Largest datagram in bytes this client sends",
+    )
+    parser.add_argument(
+        "-g",
+        "--gossip",
+        choices=["digest", "full"],
+        default="digest",
+        help="Broadcast a digest and exchange only differing entries, or the full state",
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        choices=["threads", "asyncio"],
+        default="threads",
+        help="Run receive/broadcast in threads or on one asyncio event loop",
+    )
+    runtime_arguments(parser)
+    receivers_argument(parser)
+    idle_argument(parser)
+    topology_arguments(parser, relays=True)
     # Can be ignored in task01
     parser.add_argument(
         "-t",
@@ -37,24 +87,185 @@ def cli():
         action="store_true",
         help="If set, a temporary replica is created",
     )
-    args = parser.parse_args()
-    return args.username, args.port, args.host, args.interval, args.temp
+    return parser.parse_args()
+
+
+def runtime_arguments(parser):
+    """
+    Flags shared by all three chats (output, metrics, logging).
+    """
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Do not print the frontier (servers without a terminal)",
+    )
+    parser.add_argument(
+        "-r",
+        "--render-rate",
+        nargs="?",
+        default=4,
+        type=non_negative,
+        help="Most frontier redraws per second, 0 to redraw on every update",
+    )
+    parser.add_argument(
+        "--metrics",
+        help="Enable metrics: a port serves http://127.0.0.1:PORT/metrics, a path is rewritten periodically",
+    )
+    parser.add_argument(
+        "--rcvbuf",
+        default=RCVBUF,
+        type=int,
+        help="Socket receive buffer in bytes (capped by net.core.rmem_max)",
+    )
+    parser.add_argument(
+        "--sndbuf",
+        default=SNDBUF,
+        type=int,
+        help="Socket send buffer in bytes (capped by net.core.wmem_max)",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=LEVELS,
+        default=LOG_LEVEL,
+        help="Least severe log records that are written (to stderr)",
+    )
+    parser.add_argument(
+        "--log-rate",
+        default=LOG_RATE,
+        type=int,
+        help="Most log lines per second and message, 0 for no limit",
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=FORMATS,
+        default="text",
+        help="Log lines as text or as one JSON object per line",
+    )
+
+
+def receivers_argument(parser):
+    parser.add_argument(
+        "--receivers",
+        default=1,
+        type=int,
+        help="Receiver threads on the socket; more than one shards the frontier",
+    )
 
 
-def run(command: list[str], env=None, input=None):
-    return subprocess.run(
-        command,
-        input=input,
-        check=True,
-        text=True,
-        stdout=subprocess.PIPE,
-        env=env if env else os.environ,
-    ).stdout.strip()
+def idle_argument(parser):
+    parser.add_argument(
+        "--idle",
+        type=int,
+        help="Leave peers idle for this many seconds out of broadcasts (archived, they return when heard from)",
+    )
+
+
+def topology_arguments(parser, relays=False):
+    """
+    Multicast instead of broadcast and, with `relays`, the relayed topology
+    of the frontier chats (see topology.py).
+    """
+    parser.add_argument(
+        "--group",
+        help="Multicast group to join and send to instead of broadcasting, e.g. 239.255.69.1",
+    )
+    parser.add_argument(
+        "--multicast-if",
+        default="0.0.0.0",
+        help="Local address of the interface for multicast, 127.0.0.1 for nodes on one machine",
+    )
+    parser.add_argument(
+        "--ttl",
+        default=1,
+        type=int,
+        help="Multicast TTL; above 1 routers forward the gossip to other subnets",
+    )
+    if not relays:
+        return
+    parser.add_argument(
+        "--relay-group",
+        help="Multicast group of the relays: deltas go there, relays answer through --group",
+    )
+    parser.add_argument(
+        "--relay",
+        action="store_true",
+        help="Act as relay: merge what is sent to --relay-group and send it on to the --serve groups",
+    )
+    parser.add_argument(
+        "--serve",
+        help="Comma-separated groups a relay sends the merged frontier to (default: --group)",
+    )
+
+
+def history_arguments(parser):
+    """
+    History limits (see retention.py; without any, nothing is pruned) and bulk
+    sync (see bulk.py) of task3.py.
+    """
+    parser.add_argument(
+        "--keep-age",
+        type=int,
+        help="Prune chat commits received or created more than this many seconds ago",
+    )
+    parser.add_argument(
+        "--keep-per-author",
+        type=int,
+        help="Keep at most this many commits per author",
+    )
+    parser.add_argument(
+        "--keep-bytes",
+        type=int,
+        help="Keep at most this many bytes of commit objects, the oldest are pruned first",
+    )
+    parser.add_argument(
+        "--gc-interval",
+        default=600,
+        type=int,
+        help="Seconds between background pruning and git gc runs",
+    )
+    parser.add_argument(
+        "--bulk-threshold",
+        default=500,
+        type=int,
+        help="Missing commits from which a peer is sent one packfile over TCP instead of UDP packets, 0 for never",
+    )
+
+
+def options(argv, receivers=False, history=False, relays=False):
+    """
+    Flags of task2.py/task3.py after <username> <--temp>; exits with a usage
+    message on unknown flags. `receivers` adds --receivers (task2.py),
+    `history` the history limits and bulk sync (task3.py), `relays` the
+    relay flags (task2.py).
+    """
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]) + " <username> <--temp>")
+    parser.add_argument(
+        "--asyncio",
+        action="store_true",
+        help="Run receive/broadcast on one asyncio event loop",
+    )
+    runtime_arguments(parser)
+    if receivers:
+        receivers_argument(parser)
+    idle_argument(parser)
+    topology_arguments(parser, relays)
+    if history:
+        history_arguments(parser)
+    return parser.parse_args(argv)
+
 
+def run(command: list[str], env=None, input=None, cwd=None):
+    start = time.perf_counter()
+    try:
+        return subprocess.run(
+            command,
+            input=input,
+            check=True,
+            text=True,
+            stdout=subprocess.PIPE,
+            env=env if env else os.environ,
+            cwd=cwd,
+        ).stdout.strip()
+    finally:
+        GIT_SECONDS.observe(time.perf_counter() - start, command[1] if len(command) > 1 else command[0])
 
-def setup_socket(host: str, port: int):
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    client_socket.bind((host, port))
-    return client_socket
@@ -0,0 +1,197 @@
+import itertools
+import json
+import os
+import threading
+import time
+
+import codec
+from metrics import PACKETS_DROPPED
+
+DEFAULT_MTU = 576  # größtes Datagramm, das wir selbst verschicken
+RECV_BUFFER = 65535  # Empfangspuffer: nie abschneiden, auch wenn der Sender eine größere MTU nutzt
+PROTOCOL_VERSION = 2
+FRAGMENT_TIMEOUT = 30  # Sekunden, danach werden unvollständige Nachrichten verworfen
+MAX_PARTIAL = 1024  # maximal gleichzeitig offene fragmentierte Nachrichten
+
+
+def encode(obj):
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+class Packer:
+    """
+    Packs records (dicts) into as few datagrams of at most `mtu` bytes as possible.
+
+    By default records are written with the binary codec (codec.py): a datagram
+    is one packet holding as many records as fit, and a packet larger than the MTU
+    is split into numbered fragments. With binary=False the JSON protocol is used:
+    a record that fits alone is sent unchanged, several records share a
+    {"type": "batch"} envelope and larger records become {"type": "frag"} datagrams.
+    """
+
+    def __init__(self, mtu=DEFAULT_MTU, binary=True):
+        self.mtu = mtu
+        self.binary = binary
+        self.sender_id = int.from_bytes(os.urandom(4), "big")
+        self.ids = itertools.count()  # next() ist atomar, pack() läuft in mehreren Threads
+
+    def _msg_id(self):
+        return (self.sender_id << 32) | (next(self.ids) & 0xFFFFFFFF)
+
+    def pack(self, records):
+        if self.binary:
+            return self.pack_binary(records)
+        datagrams = []
+        batch = []
+        for record in records:
+            data = encode(record)
+            if len(data) > self.mtu:
+                # Reihenfolge erhalten (Eltern vor Kindern): offenen Batch zuerst senden
+                if batch:
+                    datagrams.append(self._flush(batch))
+                    batch = []
+                datagrams.extend(self.fragment(data))
+                continue
+            if batch and self._batch_size(batch + [data]) > self.mtu:
+                datagrams.append(self._flush(batch))
+                batch = []
+            batch.append(data)
+        if batch:
+            datagrams.append(self._flush(batch))
+        return datagrams
+
+    def pack_binary(self, records):
+        datagrams = []
+        builder = codec.PacketBuilder()
+        for record in records:
+            if not builder.add(record, self.mtu):
+                datagrams.append(builder.packet())
+                builder = codec.PacketBuilder()
+                builder.add(record, self.mtu)
+            if builder.size() > self.mtu:
+                # Passt allein nicht: fragmentieren, Reihenfolge bleibt erhalten
+                datagrams.extend(self.fragment_binary(builder.packet()))
+                builder = codec.PacketBuilder()
+        if builder.count:
+            datagrams.append(builder.packet())
+        return datagrams
+
+    def fragment_binary(self, packet):
+        budget = self.mtu - codec.FRAGMENT_HEADER
+        if budget <= 0:
+            raise ValueError(f"MTU {self.mtu} too small for fragments")
+        msg_id = self._msg_id()
+        chunks = [packet[pos:pos + budget] for pos in range(0, len(packet), budget)]
+        return [codec.encode_fragment(msg_id, seq, len(chunks), chunk)
+                for seq, chunk in enumerate(chunks)]
+
+    def _batch_size(self, batch):
+        # {"type":"batch","v":2,"records":[a,b,...]}
+        return len(self._envelope(b"")) + sum(len(r) for r in batch) + len(batch) - 1
+
+    def _envelope(self, body):
+        return b'{"type":"batch","v":%d,"records":[' % PROTOCOL_VERSION + body + b"]}"
+
+    def _flush(self, batch):
+        if len(batch) == 1:
+            return batch[0]
+        return self._envelope(b",".join(batch))
+
+    def fragment(self, data):
+        text = data.decode("utf-8")
+        msg_id = self._msg_id()
+        header = len(encode({"type": "frag", "v": PROTOCOL_VERSION, "id": msg_id,
+                             "seq": 999999, "total": 999999, "data": ""}))
+        budget = self.mtu - header
+        if budget <= 0:
+            raise ValueError(f"MTU {self.mtu} too small for fragments")
+        chunks = []
+        pos = 0
+        while pos < len(text):
+            size = budget
+            # Escaping im JSON kann den Chunk vergrößern -> so lange kürzen bis er passt
+            excess = len(encode(text[pos:pos + size])) - 2 - budget
+            while excess > 0:
+                size = max(1, size - excess)
+                excess = len(encode(text[pos:pos + size])) - 2 - budget
+            chunks.append(text[pos:pos + size])
+            pos += size
+        return [
+            encode({"type": "frag", "v": PROTOCOL_VERSION, "id": msg_id,
+                    "seq": seq, "total": len(chunks), "data": chunk})
+            for seq, chunk in enumerate(chunks)
+        ]
+
+
+class Reassembler:
+    """
+    Turns received datagrams back into records, whatever envelope they came in.
+    Binary packets, JSON batches and plain JSON records from older peers are all accepted.
+    """
+
+    def __init__(self, timeout=FRAGMENT_TIMEOUT, max_partial=MAX_PARTIAL):
+        self.timeout = timeout
+        self.max_partial = max_partial
+        self.partial = {}  # (addr, id) -> (first seen, {seq: chunk}, total, leeres bytes/str)
+        self.expired = 0
+        self.lock = threading.Lock()  # mehrere Empfänger-Threads teilen sich die Fragmente
+
+    def feed(self, data, addr=None):
+        if codec.is_binary(data):
+            records = codec.decode_packet(data)
+            if records and records[0].get("type") == "frag" and isinstance(records[0]["data"], bytes):
+                return self._fragment(records[0], addr)
+            return records
+        message = json.loads(str(data, "utf-8"))  # bytes oder memoryview
+        if not isinstance(message, dict) or message.get("v") != PROTOCOL_VERSION:
+            return [message]
+        kind = message.get("type")
+        if kind == "batch":
+            return message["records"]
+        if kind == "frag":
+            return self._fragment(message, addr)
+        return [message]
+
+    def _fragment(self, message, addr):
+        with self.lock:
+            data = self._collect(message, addr)
+        if data is None:
+            return []
+        if isinstance(data, bytes):
+            return codec.decode_packet(data)
+        return [json.loads(data)]
+
+    def _collect(self, message, addr):
+        """
+        Store one fragment; returns the joined message once all are there.
+        """
+        now = time.monotonic()
+        self._expire(now)
+        key = (addr, message.get("id"))
+        seq, total, data = message.get("seq"), message.get("total"), message.get("data")
+        partial = self.partial.get(key)
+        # Kaputte Fragmente verwerfen, statt die Empfangsschleife mit KeyError/TypeError zu beenden
+        if not (isinstance(seq, int) and isinstance(total, int) and 0 <= seq < total
+                and isinstance(data, (bytes, str))) \
+                or partial is not None and (partial[2] != total or not isinstance(data, type(partial[3]))):
+            PACKETS_DROPPED.inc(1, "fragments_malformed")
+            return None
+        if partial is None:
+            if len(self.partial) >= self.max_partial:
+                oldest = min(self.partial, key=lambda k: self.partial[k][0])
+                del self.partial[oldest]
+                self.expired += 1
+                PACKETS_DROPPED.inc(1, "fragments_evicted")
+            partial = self.partial[key] = (now, {}, total, data[:0])
+        chunks = partial[1]
+        chunks[seq] = data
+        if len(chunks) < total:
+            return None
+        del self.partial[key]
+        return partial[3].join(chunks[i] for i in range(total))
+
+    def _expire(self, now):
+        for key in [k for k, v in self.partial.items() if now - v[0] > self.timeout]:
+            del self.partial[key]
+            self.expired += 1
+            PACKETS_DROPPED.inc(1, "fragments_expired")